@@ -0,0 +1,272 @@
+import os
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from model.scheduler import QueueFullError
+from model.telemetry import CONTENT_TYPE, ERRORS, HTTP_REQUEST_SECONDS, METRICS, get_logger
+# The model, scheduler and job setup (and its NUTRIMIND_* configuration) is shared with the Flask server
+from server import (generator, jobs, plan_writer, registry, archived_plan, find_plans, format_sse, job_status,
+                    parse_output_format, parse_plan_request, plan_response, readiness, speculative_status,
+                    validate_plan)
+
+logger = get_logger("asgi")
+
+# Model calls block for seconds to minutes, so they run on their own threads instead of the
+# event loop's default executor; NUTRIMIND_INFERENCE_THREADS bounds how many wait at once
+inference_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('NUTRIMIND_INFERENCE_THREADS', 8)),
+    thread_name_prefix='asgi-inference'
+)
+
+# Marks the end of a stream_meal_plan iterator pulled through the executor
+_STREAM_END = object()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    # Threads still generating see their cancel events and finish quickly
+    inference_executor.shutdown(wait=False, cancel_futures=True)
+    plan_writer.flush(timeout=10)
+
+
+app = FastAPI(title='NutriMind', lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])
+
+
+async def run_inference(func, *args, **kwargs):
+    """Run a blocking model call on the inference executor without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(inference_executor, partial(func, *args, **kwargs))
+
+
+async def cancel_on_disconnect(request, cancel_event):
+    """Set ``cancel_event`` once the client disconnects; runs until cancelled otherwise."""
+    while True:
+        message = await request.receive()
+        if message['type'] == 'http.disconnect':
+            logger.info("⚠️ Client disconnected; cancelling its meal plan")
+            cancel_event.set()
+            return
+
+
+async def read_json(request):
+    """Parse the request body as a JSON object, or return None if it is not one."""
+    try:
+        data = await request.json()
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def error_response(message, status_code):
+    return JSONResponse({'status': 'error', 'message': message}, status_code=status_code)
+
+
+@app.middleware('http')
+async def record_request_latency(request, call_next):
+    """Observe request latency per route; streamed responses are timed until their first byte."""
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get('route')
+    HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start,
+                                 endpoint=route.path if route is not None else 'unmatched',
+                                 method=request.method, status=response.status_code)
+    return response
+
+
+@app.post('/generate_meal_plan')
+async def generate_meal_plan(request: Request):
+    """
+    Endpoint to generate a meal plan based on user input.
+    Accepts the same JSON payload and returns the same responses as the Flask server's
+    /generate_meal_plan. Generation runs on the inference executor and is cancelled
+    when the client disconnects before the plan is ready.
+    """
+    data = await read_json(request)
+    if data is None:
+        return error_response('Request body must be a JSON object', 400)
+    try:
+        plan_kwargs = parse_plan_request(data)
+        structured = parse_output_format(data)
+    except ValueError as e:
+        return error_response(str(e), 400)
+
+    cancel_event = threading.Event()
+    if data.get('stream', False):
+        events = registry.stream_meal_plan(trace=bool(data.get('trace', False)), structured=structured,
+                                           cancel_event=cancel_event, **plan_kwargs)
+        return StreamingResponse(
+            stream_events(events, cancel_event),
+            media_type='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+
+    watcher = asyncio.create_task(cancel_on_disconnect(request, cancel_event))
+    try:
+        result = await run_inference(registry.generate_meal_plan,
+                                     use_cache=bool(data.get('use_cache', True)),
+                                     trace=bool(data.get('trace', False)),
+                                     from_index=bool(data.get('from_index', False)),
+                                     structured=structured, cancel_event=cancel_event, **plan_kwargs)
+    except asyncio.CancelledError:
+        # The server is dropping this request; let the model thread stop too
+        cancel_event.set()
+        raise
+    except Exception as e:
+        ERRORS.inc(type=type(e).__name__)
+        return error_response(f'An error occurred: {str(e)}', 500)
+    finally:
+        watcher.cancel()
+
+    response, status = plan_response(result, structured)
+    return JSONResponse(response, status_code=status)
+
+
+async def stream_events(events, cancel_event):
+    """
+    Relay stream_meal_plan events as server-sent events, pulling each one on the inference executor.
+    The response stops iterating when the client disconnects, which sets ``cancel_event``; the
+    event generator is then closed so its cleanup (the registry lease, its scheduler prompts)
+    runs right away instead of whenever it is garbage-collected.
+    """
+    # A pull may still be running on the executor when the response stops; close only after it
+    pulling = threading.Lock()
+
+    def pull():
+        with pulling:
+            return next(events, _STREAM_END)
+
+    def close():
+        with pulling:
+            events.close()
+
+    try:
+        while True:
+            event = await run_inference(pull)
+            if event is _STREAM_END:
+                return
+            yield format_sse(event)
+    finally:
+        cancel_event.set()
+        try:
+            inference_executor.submit(close)
+        except RuntimeError:
+            # The executor is shut down along with the server; the process is exiting
+            pass
+
+
+@app.post('/jobs', status_code=202)
+async def submit_job(request: Request):
+    """
+    Queue a meal plan for background generation and return its job id immediately.
+    Accepts the same JSON payload as /generate_meal_plan (except stream).
+    """
+    data = await read_json(request)
+    if data is None:
+        return error_response('Request body must be a JSON object', 400)
+    try:
+        plan_kwargs = parse_plan_request(data)
+    except ValueError as e:
+        return error_response(str(e), 400)
+    try:
+        job_id = jobs.submit(use_cache=bool(data.get('use_cache', True)),
+                             from_index=bool(data.get('from_index', False)), **plan_kwargs)
+    except QueueFullError as e:
+        return error_response(str(e), 429)
+    return {'status': 'queued', 'job_id': job_id, 'status_url': f'/jobs/{job_id}'}
+
+
+@app.get('/jobs/{job_id}')
+async def get_job(job_id: str):
+    """Return a job's status, per-day progress and, once finished, its result."""
+    job = jobs.get(job_id)
+    if job is None:
+        return error_response(f'Unknown or expired job {job_id}', 404)
+    return job_status(job)
+
+
+@app.get('/metrics')
+async def metrics():
+    """Prometheus scrape endpoint."""
+    return Response(METRICS.render(), media_type=CONTENT_TYPE)
+
+
+@app.get('/healthz')
+async def healthz():
+    """Liveness probe: the event loop is up and serving HTTP."""
+    return {'status': 'ok'}
+
+
+@app.get('/readyz')
+async def readyz():
+    """Readiness probe: 200 once the model is loaded, 503 while loading or after a failed load."""
+    response, status = readiness()
+    return JSONResponse(response, status_code=status)
+
+
+@app.get('/scheduler')
+async def scheduler_stats():
+    """Report inference queue depth and batching statistics."""
+    return generator.scheduler.stats()
+
+
+@app.get('/workers')
+async def worker_stats():
+    """Report model worker process readiness and load."""
+    if generator.worker_pool is None:
+        return {'workers': 0}
+    return generator.worker_pool.stats()
+
+
+@app.post('/validate_meal_plan')
+async def validate_meal_plan(request: Request):
+    """Recompute nutrition totals of a structured plan and check them against a calorie target."""
+    response, status = validate_plan(await read_json(request) or {})
+    return JSONResponse(response, status_code=status)
+
+
+@app.get('/models')
+async def model_stats():
+    """Report the models requests may choose, which are loaded, their memory and load/evict counts."""
+    return registry.stats()
+
+
+@app.get('/recipe_index')
+async def recipe_index_stats():
+    """Report how many meals from saved plans are indexed, per slot and cuisine."""
+    if generator.recipe_index is None:
+        return {'records': 0}
+    return generator.recipe_index.stats()
+
+
+@app.get('/plans')
+async def list_plans(request: Request):
+    """Find archived plans by metadata, newest first, and report plan writer statistics."""
+    response, status = find_plans(request.query_params)
+    return JSONResponse(response, status_code=status)
+
+
+@app.get('/plans/{plan_id}')
+async def get_plan(plan_id: str):
+    """Return an archived plan's text and metadata."""
+    response, status = archived_plan(plan_id)
+    return JSONResponse(response, status_code=status)
+
+
+@app.get('/speculative')
+async def speculative_stats():
+    """Report draft model acceptance rate, measured speedup and whether it is in use."""
+    return speculative_status()
+
+
+if __name__ == '__main__':
+    # Equivalent to `uvicorn asgi:app --host 0.0.0.0 --port 5000` from backend/
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
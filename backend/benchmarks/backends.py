@@ -0,0 +1,113 @@
+"""
+Compare the eager and compiled inference backends for output parity and throughput.
+
+Each backend runs in its own subprocess so compilation in one cannot warm the
+other. Both decode the same prompts greedily (the draft profile), so the
+compiled backend must reproduce the eager text exactly; any difference is
+reported as a parity failure and makes the script exit non-zero.
+
+Usage (from backend/):
+    python benchmarks/backends.py --model TinyLlama/TinyLlama-1.1B-Chat-v1.0 --runs 3
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+BENCH_PROMPTS = [
+    "Create a one-day vegetarian Indian meal plan for weight loss with breakfast, lunch and dinner.",
+    "Suggest a high-protein South Indian breakfast for a diabetic adult with portion sizes."
+]
+
+
+def run_backend(model_name: str, backend: str, precision: str, runs: int, cache_dir: str) -> dict:
+    """Load the model with one inference backend, record its greedy outputs and time generation."""
+    from model.meal_planner import MealPlanGenerator
+
+    generator = MealPlanGenerator(model_name=model_name, precision=precision, inference_backend=backend,
+                                  cache_dir=cache_dir, prefix_cache_mb=0, result_cache_size=0)
+    generator.load_model()
+
+    # The first call per batch shape compiles (or loads kernels from the cache dir)
+    warmup_start = time.perf_counter()
+    texts = [generator._generate([prompt], profile="draft")[0][0] for prompt in BENCH_PROMPTS]
+    warmup_seconds = time.perf_counter() - warmup_start
+
+    tokens = 0
+    seconds = 0.0
+    for _ in range(runs):
+        for prompt in BENCH_PROMPTS:
+            _, stats = generator._generate([prompt], profile="draft")
+            tokens += stats["generated_tokens"]
+            seconds += stats["seconds"]
+
+    return {
+        "backend": backend if generator.compiled is not None or backend == "eager" else f"{backend} (fell back to eager)",
+        "precision": generator.active_precision,
+        "warmup_seconds": round(warmup_seconds, 2),
+        "generated_tokens": tokens,
+        "tokens_per_sec": round(tokens / seconds, 2) if seconds > 0 else 0.0,
+        "texts": texts
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check parity and benchmark MealPlanGenerator inference backends")
+    parser.add_argument("--model", type=str, default="TinyLlama/TinyLlama-1.1B-Chat-v1.0")
+    parser.add_argument("--precision", type=str, default="fp32")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--cache-dir", type=str, default=None,
+                        help="Model cache directory; compiled kernels are kept in its compiled/ subdirectory")
+    parser.add_argument("--output", type=str, default=None, help="Write results as JSON to this file")
+    parser.add_argument("--worker", type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = run_backend(args.model, args.worker, args.precision, args.runs, args.cache_dir)
+        # Last stdout line is the machine-readable result for the parent
+        print(json.dumps(result))
+        return
+
+    results = {}
+    for backend in ("eager", "compile"):
+        print(f"🔄 Benchmarking {backend}...")
+        command = [sys.executable, os.path.abspath(__file__), "--worker", backend, "--model", args.model,
+                   "--precision", args.precision, "--runs", str(args.runs)]
+        if args.cache_dir:
+            command += ["--cache-dir", args.cache_dir]
+        completed = subprocess.run(command, capture_output=True, text=True)
+        if completed.returncode != 0:
+            print(f"❌ {backend} failed:\n{completed.stderr[-2000:]}")
+            sys.exit(1)
+        results[backend] = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    mismatches = [index for index, (eager, compiled) in
+                  enumerate(zip(results["eager"]["texts"], results["compile"]["texts"])) if eager != compiled]
+
+    print(f"\n{'backend':<10}{'warm-up s':>12}{'tokens/s':>12}")
+    for r in results.values():
+        print(f"{r['backend']:<10}{r['warmup_seconds']:>12}{r['tokens_per_sec']:>12}")
+    eager_rate = results["eager"]["tokens_per_sec"]
+    if eager_rate:
+        print(f"\nSpeedup: {results['compile']['tokens_per_sec'] / eager_rate:.2f}x")
+    if mismatches:
+        print(f"❌ Greedy outputs differ for prompts {mismatches}")
+    else:
+        print(f"✅ Greedy outputs identical for all {len(BENCH_PROMPTS)} prompts")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"model": args.model, "precision": args.precision, "parity": not mismatches,
+                       "results": list(results.values())}, f, indent=2)
+        print(f"\n✅ Results saved to {args.output}")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""
+Load-test /generate_meal_plan with a configurable request mix and concurrency.
+
+By default the Flask app is started in this process on a local port with the
+fake backend (``NUTRIMIND_BACKEND=fake``), so the run needs no model weights
+and no network. The fake backend's decoding speed, latency distribution,
+concurrency and error rate are set from the command line, which makes it
+possible to capacity-plan the service around a model's measured numbers
+(e.g. tokens/sec from benchmarks/suite.py). ``--url`` points the driver at a
+server that is already running instead, with whatever backend it uses.
+
+Requests are sent closed-loop by ``--concurrency`` clients, or open-loop at
+``--rate`` requests per second (Poisson arrivals, at most ``--concurrency``
+in flight). The report covers throughput, p50/p95/p99 latency overall and
+per request type, status codes and error rate, and the scheduler queue
+depth sampled during the run.
+
+Usage (from backend/):
+    python benchmarks/loadtest.py --requests 200 --concurrency 16 --tokens-per-sec 40 --latency-ms 300
+    python benchmarks/loadtest.py --rate 5 --requests 100 --mix my_mix.json --output load.json
+    python benchmarks/loadtest.py --url http://127.0.0.1:5000 --requests 50
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import tempfile
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Default request mix: mostly short plans, some long ones and some structured output.
+# A --mix file has the same shape: a list of {"name", "weight", "payload"} objects.
+MIX = [
+    {"name": "1d-vegetarian-indian", "weight": 5,
+     "payload": {"goal": "weight loss", "days": 1, "dietary_preference": "vegetarian", "cuisine_style": "indian",
+                 "calories": "1600-1800"}},
+    {"name": "3d-non-vegetarian-mediterranean", "weight": 3,
+     "payload": {"goal": "muscle gain", "days": 3, "dietary_preference": "non-vegetarian",
+                 "cuisine_style": "mediterranean", "calories": "2800-3200"}},
+    {"name": "7d-vegan-asian", "weight": 1,
+     "payload": {"goal": "maintenance", "days": 7, "dietary_preference": "vegan", "cuisine_style": "asian",
+                 "calories": "2000-2200"}},
+    {"name": "1d-json-pescatarian", "weight": 1,
+     "payload": {"goal": "weight loss", "days": 1, "dietary_preference": "pescatarian",
+                 "cuisine_style": "mediterranean", "calories": "1800-2000", "format": "json"}}
+]
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values: list, q: float) -> float:
+    """Nearest-rank percentile of ``values`` (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), round(q / 100 * len(ordered) + 0.5)))
+    return ordered[rank - 1]
+
+
+def latency_summary(latencies: list) -> dict:
+    summary = {f"p{q}": round(percentile(latencies, q), 3) for q in PERCENTILES}
+    summary["mean"] = round(sum(latencies) / len(latencies), 3) if latencies else 0.0
+    summary["max"] = round(max(latencies), 3) if latencies else 0.0
+    return summary
+
+
+def get_json(url: str) -> dict:
+    with urllib.request.urlopen(url, timeout=10) as response:
+        return json.loads(response.read())
+
+
+def send(url: str, entry: dict, use_cache: bool, timeout: float) -> dict:
+    """POST one request and record its latency, status and generated tokens."""
+    payload = dict(entry["payload"], use_cache=use_cache)
+    request = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    tokens = 0
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            body = json.loads(response.read())
+            status = response.status
+        tokens = body.get("metadata", {}).get("generated_tokens", 0)
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except Exception as e:
+        status = type(e).__name__
+    return {"name": entry["name"], "status": status, "seconds": time.perf_counter() - start, "tokens": tokens}
+
+
+class QueueSampler:
+    """Poll /scheduler in the background and keep the queue depths seen."""
+
+    def __init__(self, base_url: str, interval: float):
+        self.base_url = base_url
+        self.interval = interval
+        self.depths = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> dict:
+        """Stop sampling and return queue depth statistics plus the final scheduler counters."""
+        self._stop.set()
+        self._thread.join()
+        try:
+            final = get_json(f"{self.base_url}/scheduler")
+        except Exception:
+            final = {}
+        return {
+            "samples": len(self.depths),
+            "mean_depth": round(sum(self.depths) / len(self.depths), 2) if self.depths else 0.0,
+            "p95_depth": percentile(self.depths, 95),
+            "max_depth": max(self.depths, default=0),
+            "scheduler": final
+        }
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.depths.append(get_json(f"{self.base_url}/scheduler")["queue_depth"])
+            except Exception:
+                pass
+
+
+def start_local_server(args: argparse.Namespace) -> tuple:
+    """Start the Flask app with the fake backend on a free local port; returns (base URL, http server)."""
+    os.environ.update({
+        "NUTRIMIND_MODEL": "fake",
+        "NUTRIMIND_BACKEND": "fake",
+        "NUTRIMIND_FAKE_TOKENS_PER_SEC": str(args.tokens_per_sec),
+        "NUTRIMIND_FAKE_LATENCY_MS": str(args.latency_ms),
+        "NUTRIMIND_FAKE_LATENCY_SIGMA": str(args.latency_sigma),
+        "NUTRIMIND_FAKE_CONCURRENCY": str(args.fake_concurrency),
+        "NUTRIMIND_FAKE_ERROR_RATE": str(args.error_rate),
+        "NUTRIMIND_LOG_LEVEL": os.environ.get("NUTRIMIND_LOG_LEVEL", "off")
+    })
+    # Saved plans, caches and the recipe index go to a scratch directory
+    os.chdir(tempfile.mkdtemp(prefix="nutrimind-load-"))
+    import server
+    from werkzeug.serving import make_server
+
+    # One access log line per request would drown the report
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    http_server = make_server("127.0.0.1", 0, server.app, threaded=True)
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{http_server.server_port}", http_server
+
+
+def run(args: argparse.Namespace, base_url: str, mix: list) -> dict:
+    """Send the requests and aggregate the results."""
+    rng = random.Random(args.seed)
+    entries = rng.choices(mix, weights=[entry.get("weight", 1) for entry in mix], k=args.requests)
+    url = f"{base_url}/generate_meal_plan"
+    sampler = QueueSampler(base_url, args.sample_interval)
+    sampler.start()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = []
+        next_arrival = start
+        for entry in entries:
+            if args.rate:
+                # Open loop: Poisson arrivals, independent of how fast responses come back
+                next_arrival += rng.expovariate(args.rate)
+                time.sleep(max(0.0, next_arrival - time.perf_counter()))
+            futures.append(executor.submit(send, url, entry, args.use_cache, args.timeout))
+        results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+    queue = sampler.stop()
+
+    statuses = {}
+    for result in results:
+        statuses[str(result["status"])] = statuses.get(str(result["status"]), 0) + 1
+    ok = [r for r in results if r["status"] == 200]
+    by_type = {}
+    for entry in mix:
+        matching = [r for r in results if r["name"] == entry["name"]]
+        if matching:
+            by_type[entry["name"]] = {
+                "requests": len(matching),
+                "errors": sum(1 for r in matching if r["status"] != 200),
+                "latency": latency_summary([r["seconds"] for r in matching if r["status"] == 200])
+            }
+    tokens = sum(r["tokens"] for r in ok)
+    return {
+        "requests": len(results),
+        "concurrency": args.concurrency,
+        "rate": args.rate,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(ok) / elapsed, 3) if elapsed > 0 else 0.0,
+        "tokens_per_sec": round(tokens / elapsed, 2) if elapsed > 0 else 0.0,
+        "error_rate": round(1 - len(ok) / len(results), 4) if results else 0.0,
+        "statuses": statuses,
+        "latency": latency_summary([r["seconds"] for r in ok]),
+        "by_type": by_type,
+        "queue": queue
+    }
+
+
+def print_report(report: dict) -> None:
+    print(f"\n{report['requests']} requests in {report['seconds']}s "
+          f"({report['throughput_rps']} req/s ok, {report['tokens_per_sec']} tokens/s)")
+    print(f"Error rate: {report['error_rate']:.2%}  statuses: {report['statuses']}")
+    print(f"\n{'type':<34}{'n':>6}{'err':>6}{'p50 s':>9}{'p95 s':>9}{'p99 s':>9}")
+    rows = list(report["by_type"].items()) + [("all", {"requests": report["requests"],
+                                                        "errors": sum(t["errors"] for t in report["by_type"].values()),
+                                                        "latency": report["latency"]})]
+    for name, stats in rows:
+        latency = stats["latency"]
+        print(f"{name:<34}{stats['requests']:>6}{stats['errors']:>6}"
+              f"{latency['p50']:>9}{latency['p95']:>9}{latency['p99']:>9}")
+    queue = report["queue"]
+    scheduler = queue["scheduler"]
+    print(f"\nScheduler queue: mean depth {queue['mean_depth']}, p95 {queue['p95_depth']}, max {queue['max_depth']}"
+          f" | batches {scheduler.get('batches', 'n/a')}, average batch {scheduler.get('average_batch_size', 'n/a')},"
+          f" rejected {scheduler.get('rejected', 'n/a')}, timed out {scheduler.get('timed_out', 'n/a')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the meal plan service")
+    parser.add_argument("--url", type=str, default=None,
+                        help="Base URL of a running server; by default the Flask app runs here with the fake backend")
+    parser.add_argument("--requests", type=int, default=100, help="Total requests to send")
+    parser.add_argument("--concurrency", type=int, default=8, help="Most requests in flight at once")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="Open-loop arrival rate in requests/sec (default: closed loop)")
+    parser.add_argument("--mix", type=str, default=None, help="JSON file with the request mix (see MIX)")
+    parser.add_argument("--use-cache", action="store_true",
+                        help="Let the server answer repeated requests from its result cache")
+    parser.add_argument("--timeout", type=float, default=600, help="Client timeout per request in seconds")
+    parser.add_argument("--sample-interval", type=float, default=0.1, help="Seconds between queue depth samples")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the request order and arrival times")
+    fake = parser.add_argument_group("fake backend (local server only)")
+    fake.add_argument("--tokens-per-sec", type=float, default=200.0, help="Decoding speed per row")
+    fake.add_argument("--latency-ms", type=float, default=50.0, help="Median first-token latency per model call")
+    fake.add_argument("--latency-sigma", type=float, default=0.25, help="Log-normal spread of the latency")
+    fake.add_argument("--fake-concurrency", type=int, default=1, help="Model calls that run at the same time")
+    fake.add_argument("--error-rate", type=float, default=0.0, help="Fraction of model calls that fail")
+    parser.add_argument("--output", type=str, default=None, help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    if args.output:
+        # The local server runs from a scratch directory
+        args.output = os.path.abspath(args.output)
+    mix = MIX
+    if args.mix:
+        with open(args.mix, "r", encoding="utf-8") as f:
+            mix = json.load(f)
+
+    http_server = None
+    if args.url:
+        base_url = args.url.rstrip("/")
+    else:
+        base_url, http_server = start_local_server(args)
+    print(f"🔄 Sending {args.requests} requests to {base_url} "
+          f"({'rate ' + str(args.rate) + '/s' if args.rate else 'closed loop'}, concurrency {args.concurrency})...")
+
+    report = run(args, base_url, mix)
+    if http_server is not None:
+        report["fake_backend"] = {"tokens_per_sec": args.tokens_per_sec, "latency_ms": args.latency_ms,
+                                  "latency_sigma": args.latency_sigma, "concurrency": args.fake_concurrency,
+                                  "error_rate": args.error_rate}
+        http_server.shutdown()
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✅ Report saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Compare generation throughput and memory across precision modes.
+
+Each mode runs in its own subprocess so peak RSS reflects that mode alone.
+
+Usage (from backend/):
+    python benchmarks/precision.py --model TinyLlama/TinyLlama-1.1B-Chat-v1.0 --modes fp32 bf16 int8
+"""
+import os
+import sys
+import json
+import time
+import resource
+import argparse
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+BENCH_PROMPT = "Create a one-day vegetarian Indian meal plan for weight loss with breakfast, lunch and dinner."
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_mode(model_name: str, precision: str, profile: str, runs: int, mmap_weights: bool) -> dict:
+    """Load the model in one precision mode and time text generation."""
+    from model.meal_planner import MealPlanGenerator
+
+    load_start = time.perf_counter()
+    generator = MealPlanGenerator(model_name=model_name, precision=precision, mmap_weights=mmap_weights,
+                                  prefix_cache_mb=0, result_cache_size=0)
+    load_seconds = time.perf_counter() - load_start
+
+    # Warm-up call so one-time kernel setup is not measured
+    generator._generate([BENCH_PROMPT], profile=profile)
+    tokens = 0
+    seconds = 0.0
+    for _ in range(runs):
+        _, stats = generator._generate([BENCH_PROMPT], profile=profile)
+        tokens += stats["generated_tokens"]
+        seconds += stats["seconds"]
+
+    return {
+        "precision": generator.active_precision,
+        "requested": precision,
+        "load_seconds": round(load_seconds, 2),
+        "generated_tokens": tokens,
+        "tokens_per_sec": round(tokens / seconds, 2) if seconds > 0 else 0.0,
+        "peak_rss_mb": round(peak_rss_mb(), 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MealPlanGenerator precision modes")
+    parser.add_argument("--model", type=str, default="TinyLlama/TinyLlama-1.1B-Chat-v1.0")
+    parser.add_argument("--modes", type=str, nargs="+", default=["fp32", "bf16", "int8"])
+    parser.add_argument("--profile", type=str, default="draft", help="Decoding profile to time")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--mmap-weights", action="store_true")
+    parser.add_argument("--output", type=str, default=None, help="Write results as JSON to this file")
+    parser.add_argument("--worker", type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = run_mode(args.model, args.worker, args.profile, args.runs, args.mmap_weights)
+        # Last stdout line is the machine-readable result for the parent
+        print(json.dumps(result))
+        return
+
+    results = []
+    for mode in args.modes:
+        print(f"🔄 Benchmarking {mode}...")
+        command = [sys.executable, os.path.abspath(__file__), "--worker", mode, "--model", args.model,
+                   "--profile", args.profile, "--runs", str(args.runs)]
+        if args.mmap_weights:
+            command.append("--mmap-weights")
+        completed = subprocess.run(command, capture_output=True, text=True)
+        if completed.returncode != 0:
+            print(f"❌ {mode} failed:\n{completed.stderr[-2000:]}")
+            continue
+        results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    print(f"\n{'mode':<8}{'load s':>10}{'tokens/s':>12}{'peak RSS MB':>14}")
+    for r in results:
+        print(f"{r['precision']:<8}{r['load_seconds']:>10}{r['tokens_per_sec']:>12}{r['peak_rss_mb']:>14}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"model": args.model, "profile": args.profile, "results": results}, f, indent=2)
+        print(f"\n✅ Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Benchmark the meal plan pipeline over a fixed matrix of requests.
+
+Each target runs in its own subprocess so load time and peak RSS reflect that
+target alone:
+
+- ``library``: calls ``MealPlanGenerator.generate_meal_plan`` directly
+- ``server``: starts the Flask app on a local port and POSTs to /generate_meal_plan
+
+For every request in ``MATRIX`` the suite records end-to-end latency, prefill
+and decode time, generated tokens and tokens/sec, plus model load time and
+peak RSS per target. Results are written as JSON, and two result files can be
+compared with ``--compare``.
+
+Usage (from backend/):
+    python benchmarks/suite.py --tiny --output baseline.json
+    python benchmarks/suite.py --tiny --output candidate.json
+    python benchmarks/suite.py --compare baseline.json candidate.json
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import argparse
+import threading
+import subprocess
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from precision import peak_rss_mb
+from tiny_model import ensure_tiny_model
+
+# Fixed request matrix; keep it stable so results stay comparable across runs
+MATRIX = [
+    {"goal": "weight loss", "dietary_preference": "vegetarian", "cuisine_style": "indian",
+     "days": 1, "calories": "1600-1800"},
+    {"goal": "muscle gain", "dietary_preference": "non-vegetarian", "cuisine_style": "mediterranean",
+     "days": 3, "calories": "2800-3200"},
+    {"goal": "maintenance", "dietary_preference": "vegan", "cuisine_style": "asian",
+     "days": 2, "calories": "2000-2200"},
+    {"goal": "weight loss", "dietary_preference": "pescatarian", "cuisine_style": "mediterranean",
+     "days": 5, "calories": "1800-2000"}
+]
+
+TARGETS = ("library", "server")
+
+
+def case_name(case: dict) -> str:
+    """Short stable identifier for a matrix entry."""
+    return f"{case['days']}d-{case['goal']}-{case['dietary_preference']}-{case['cuisine_style']}".replace(" ", "_")
+
+
+def case_result(case: dict, seconds: float, metadata: dict) -> dict:
+    """Collect the measurements for one generated plan."""
+    return {
+        "case": case_name(case),
+        "e2e_seconds": round(seconds, 3),
+        "prefill_seconds": metadata.get("prefill_seconds", 0.0),
+        "decode_seconds": metadata.get("decode_seconds", 0.0),
+        "generated_tokens": metadata.get("generated_tokens", 0),
+        "tokens_per_sec": metadata.get("tokens_per_sec", 0.0)
+    }
+
+
+def summarize(cases: list) -> dict:
+    """Aggregate per-case measurements into run totals."""
+    e2e = sum(c["e2e_seconds"] for c in cases)
+    tokens = sum(c["generated_tokens"] for c in cases)
+    return {
+        "e2e_seconds": round(e2e, 3),
+        "prefill_seconds": round(sum(c["prefill_seconds"] for c in cases), 3),
+        "decode_seconds": round(sum(c["decode_seconds"] for c in cases), 3),
+        "generated_tokens": tokens,
+        "tokens_per_sec": round(tokens / e2e, 2) if e2e > 0 else 0.0
+    }
+
+
+def run_library(args: argparse.Namespace) -> dict:
+    """Time model load and every matrix request through the Python API."""
+    from model.meal_planner import MealPlanGenerator
+
+    load_start = time.perf_counter()
+    generator = MealPlanGenerator(model_name=args.model, precision=args.precision,
+                                  decoding_profile=args.profile, result_cache_size=0)
+    load_seconds = time.perf_counter() - load_start
+
+    # Warm-up call so one-time kernel setup is not measured
+    generator.generate_text("Warm up", max_tokens=64)
+    cases = []
+    for _ in range(args.repeat):
+        for case in MATRIX:
+            start = time.perf_counter()
+            result = generator.generate_meal_plan(batch_size=args.batch_size, use_cache=False, **case)
+            seconds = time.perf_counter() - start
+            if result["status"] != "success":
+                raise RuntimeError(f"{case_name(case)} failed: {result['error']}")
+            cases.append(case_result(case, seconds, result["metadata"]))
+
+    return {"load_seconds": round(load_seconds, 2), "precision": generator.active_precision, "cases": cases}
+
+
+def post_json(url: str, payload: dict) -> dict:
+    """POST a JSON payload and decode the JSON response."""
+    request = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def run_server(args: argparse.Namespace) -> dict:
+    """Time readiness and every matrix request through the Flask endpoint."""
+    os.environ["NUTRIMIND_MODEL"] = args.model
+    os.environ["NUTRIMIND_PRECISION"] = args.precision
+    load_start = time.perf_counter()
+    import server
+    from werkzeug.serving import make_server
+
+    http_server = make_server("127.0.0.1", 0, server.app, threaded=True)
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{http_server.server_port}"
+
+    while not server.generator.is_ready:
+        if server.generator.load_error is not None:
+            raise RuntimeError(f"Model failed to load: {server.generator.load_error}")
+        time.sleep(0.05)
+    load_seconds = time.perf_counter() - load_start
+
+    server.generator.generate_text("Warm up", max_tokens=64)
+    cases = []
+    for _ in range(args.repeat):
+        for case in MATRIX:
+            payload = dict(case, decoding_profile=args.profile, use_cache=False)
+            start = time.perf_counter()
+            result = post_json(f"{base_url}/generate_meal_plan", payload)
+            seconds = time.perf_counter() - start
+            cases.append(case_result(case, seconds, result["metadata"]))
+
+    http_server.shutdown()
+    return {"load_seconds": round(load_seconds, 2), "precision": server.generator.active_precision, "cases": cases}
+
+
+def run_target(args: argparse.Namespace) -> dict:
+    """Benchmark one target in this process, writing plans to a scratch directory."""
+    os.chdir(tempfile.mkdtemp(prefix="nutrimind-bench-"))
+    result = run_library(args) if args.worker == "library" else run_server(args)
+    result.update({
+        "target": args.worker,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "totals": summarize(result["cases"])
+    })
+    return result
+
+
+def percent_change(old: float, new: float) -> str:
+    if not old:
+        return "n/a"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def compare(old_path: str, new_path: str) -> None:
+    """Print how each metric changed between two result files."""
+    with open(old_path, "r", encoding="utf-8") as f:
+        old = {r["target"]: r for r in json.load(f)["results"]}
+    with open(new_path, "r", encoding="utf-8") as f:
+        new = {r["target"]: r for r in json.load(f)["results"]}
+
+    print(f"{'target':<10}{'metric':<52}{'old':>12}{'new':>12}{'change':>10}")
+    for target in [t for t in TARGETS if t in old and t in new]:
+        rows = [(metric, old[target][metric], new[target][metric]) for metric in ("load_seconds", "peak_rss_mb")]
+        rows += [(f"total {metric}", old[target]["totals"][metric], new[target]["totals"][metric])
+                 for metric in ("e2e_seconds", "prefill_seconds", "decode_seconds", "tokens_per_sec")]
+        old_cases = {c["case"]: c for c in old[target]["cases"]}
+        for case in new[target]["cases"]:
+            if case["case"] in old_cases:
+                rows.append((f"{case['case']} e2e", old_cases[case["case"]]["e2e_seconds"], case["e2e_seconds"]))
+        for metric, old_value, new_value in rows:
+            print(f"{target:<10}{metric:<52}{old_value:>12}{new_value:>12}{percent_change(old_value, new_value):>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the meal plan generation pipeline")
+    parser.add_argument("--model", type=str, default="TinyLlama/TinyLlama-1.1B-Chat-v1.0")
+    parser.add_argument("--tiny", action="store_true",
+                        help="Use a tiny randomly initialized local model (no network access needed)")
+    parser.add_argument("--tiny-dir", type=str, default=os.path.join(tempfile.gettempdir(), "nutrimind-tiny-model"),
+                        help="Where to build or reuse the tiny model")
+    parser.add_argument("--targets", type=str, nargs="+", default=list(TARGETS), choices=list(TARGETS))
+    parser.add_argument("--profile", type=str, default="draft", help="Decoding profile to time")
+    parser.add_argument("--precision", type=str, default="auto")
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=1, help="Times to run the whole matrix")
+    parser.add_argument("--output", type=str, default=None, help="Write results as JSON to this file")
+    parser.add_argument("--compare", type=str, nargs=2, metavar=("OLD", "NEW"),
+                        help="Compare two result files instead of running")
+    parser.add_argument("--worker", type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    if args.worker:
+        # Last stdout line is the machine-readable result for the parent
+        print(json.dumps(run_target(args)))
+        return
+
+    if args.tiny:
+        args.model = ensure_tiny_model(args.tiny_dir)
+
+    results = []
+    for target in args.targets:
+        print(f"🔄 Benchmarking {target}...")
+        command = [sys.executable, os.path.abspath(__file__), "--worker", target, "--model", args.model,
+                   "--profile", args.profile, "--precision", args.precision,
+                   "--batch-size", str(args.batch_size), "--repeat", str(args.repeat)]
+        completed = subprocess.run(command, capture_output=True, text=True)
+        if completed.returncode != 0:
+            print(f"❌ {target} failed:\n{completed.stderr[-2000:]}")
+            continue
+        results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    print(f"\n{'target':<10}{'load s':>8}{'e2e s':>10}{'prefill s':>11}{'decode s':>10}{'tokens/s':>10}{'peak RSS MB':>13}")
+    for r in results:
+        t = r["totals"]
+        print(f"{r['target']:<10}{r['load_seconds']:>8}{t['e2e_seconds']:>10}{t['prefill_seconds']:>11}"
+              f"{t['decode_seconds']:>10}{t['tokens_per_sec']:>10}{r['peak_rss_mb']:>13}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"model": args.model, "profile": args.profile, "matrix": MATRIX, "results": results}, f, indent=2)
+        print(f"\n✅ Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Build a tiny randomly initialized chat model for offline benchmarking.
+
+The model has the same architecture family as TinyLlama but only a few
+thousand parameters per layer, and its byte-level BPE tokenizer is trained
+on this repository's own source so prompts tokenize to realistic lengths.
+Its output is gibberish; it exists so the benchmark suite can exercise the
+whole pipeline on a CPU box without network access.
+
+Usage (from backend/):
+    python benchmarks/tiny_model.py --output /tmp/nutrimind-tiny
+"""
+import os
+import glob
+import argparse
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SPECIAL_TOKENS = ["<unk>", "<s>", "</s>", "<|system|>", "<|user|>", "<|assistant|>"]
+
+
+def build_tiny_model(output_dir: str, vocab_size: int = 1000, hidden_size: int = 64,
+                     num_layers: int = 2, seed: int = 0) -> str:
+    """
+    Train a tokenizer and save a randomly initialized Llama model.
+
+    Args:
+        output_dir: Directory to write the model and tokenizer to
+        vocab_size: Tokenizer vocabulary size
+        hidden_size: Model hidden size
+        num_layers: Number of transformer layers
+        seed: Seed for the random weights, so every build is identical
+
+    Returns:
+        The output directory
+    """
+    import torch
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+    from transformers import LlamaConfig, LlamaForCausalLM, PreTrainedTokenizerFast
+
+    corpus = []
+    for path in sorted(glob.glob(os.path.join(BACKEND_DIR, "model", "*.py"))):
+        with open(path, "r", encoding="utf-8") as f:
+            corpus.append(f.read())
+
+    tokenizer = Tokenizer(models.BPE(unk_token="<unk>"))
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    trainer = trainers.BpeTrainer(vocab_size=vocab_size, special_tokens=SPECIAL_TOKENS,
+                                  initial_alphabet=pre_tokenizers.ByteLevel.alphabet())
+    tokenizer.train_from_iterator(corpus, trainer)
+    fast_tokenizer = PreTrainedTokenizerFast(tokenizer_object=tokenizer, unk_token="<unk>", bos_token="<s>",
+                                             eos_token="</s>", pad_token="</s>")
+    fast_tokenizer.save_pretrained(output_dir)
+
+    torch.manual_seed(seed)
+    config = LlamaConfig(
+        vocab_size=len(fast_tokenizer),
+        hidden_size=hidden_size,
+        intermediate_size=hidden_size * 2,
+        num_hidden_layers=num_layers,
+        num_attention_heads=4,
+        num_key_value_heads=4,
+        max_position_embeddings=4096,
+        bos_token_id=fast_tokenizer.bos_token_id,
+        eos_token_id=fast_tokenizer.eos_token_id
+    )
+    LlamaForCausalLM(config).save_pretrained(output_dir)
+    return output_dir
+
+
+def ensure_tiny_model(output_dir: str) -> str:
+    """Build the tiny model into ``output_dir`` unless it is already there."""
+    if not os.path.exists(os.path.join(output_dir, "config.json")):
+        print(f"🔄 Building tiny benchmark model in {output_dir}...")
+        build_tiny_model(output_dir)
+    return output_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a tiny random model for offline benchmarks")
+    parser.add_argument("--output", type=str, required=True, help="Directory to write the model to")
+    parser.add_argument("--hidden-size", type=int, default=64)
+    parser.add_argument("--layers", type=int, default=2)
+    args = parser.parse_args()
+
+    build_tiny_model(args.output, hidden_size=args.hidden_size, num_layers=args.layers)
+    print(f"✅ Tiny model saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
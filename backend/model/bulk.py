@@ -0,0 +1,236 @@
+import os
+import re
+import json
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+try:
+    from .scheduler import InferenceScheduler
+    from .telemetry import get_logger
+except ImportError:
+    # Running as a script from inside model/
+    from scheduler import InferenceScheduler
+    from telemetry import get_logger
+
+logger = get_logger("bulk")
+
+# Request fields passed through to generate_meal_plan
+PLAN_FIELDS = ("goal", "days", "dietary_preference", "cuisine_style", "allergies", "calories",
+               "max_tokens", "decoding_profile")
+# Most sections a single plan can queue at once (14 days + guidance)
+MAX_SECTIONS_PER_PLAN = 15
+
+
+def _percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def read_requests(input_path: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Yield ``(request id, plan kwargs)`` pairs from a JSONL file.
+
+    Each non-empty line is a JSON object with any of ``PLAN_FIELDS`` and an
+    optional ``id``; lines without an id are named after their line number.
+
+    Raises:
+        ValueError: For lines that are not JSON objects or have unknown fields
+    """
+    with open(input_path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{input_path}:{line_number}: invalid JSON ({e})")
+            if not isinstance(data, dict):
+                raise ValueError(f"{input_path}:{line_number}: expected a JSON object")
+            request_id = str(data.pop("id", f"line-{line_number}"))
+            unknown = set(data) - set(PLAN_FIELDS)
+            if unknown:
+                raise ValueError(f"{input_path}:{line_number}: unknown fields {sorted(unknown)}")
+            yield request_id, data
+
+
+def load_checkpoint(output_path: str) -> Set[str]:
+    """
+    Return the ids already written successfully to ``output_path``.
+
+    A record cut off by a crash is dropped from the end of the file so the
+    run can append after it; failed records are retried.
+    """
+    if not os.path.exists(output_path):
+        return set()
+    with open(output_path, "rb") as f:
+        content = f.read()
+    if content and not content.endswith(b"\n"):
+        with open(output_path, "wb") as f:
+            f.write(content[:content.rfind(b"\n") + 1])
+        logger.warning(f"⚠️ Dropped a partially written record from {output_path}")
+
+    done = set()
+    for line in content.splitlines():
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if record.get("status") == "success":
+            done.add(record["id"])
+    return done
+
+
+class BulkRunner:
+    """
+    Generate many meal plans from a JSONL file with one loaded ``MealPlanGenerator``.
+
+    Up to ``concurrency`` plans are in flight at once, and their sections are
+    micro-batched together by an ``InferenceScheduler`` so the model runs
+    full batches across plans. Each finished plan is appended to the output
+    JSONL and flushed straight away, with its markdown written to
+    ``markdown_dir``; the output file doubles as the checkpoint, so a rerun
+    skips every request that already succeeded.
+    """
+
+    def __init__(self, generator: Any, concurrency: int = 4, batch_size: int = 8,
+                 markdown_dir: Optional[str] = None, use_cache: bool = True,
+                 timeout: float = 3600.0):
+        """
+        Args:
+            generator: The ``MealPlanGenerator`` that runs every plan
+            concurrency: Plans generated at the same time
+            batch_size: Maximum sections per batched model call
+            markdown_dir: Directory for the markdown plans (defaults to
+                ``<output name>_plans`` next to the output file)
+            use_cache: Reuse and record sections in the result cache
+            timeout: Seconds a plan may wait for its sections
+        """
+        self.generator = generator
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size)
+        self.markdown_dir = markdown_dir
+        self.use_cache = use_cache
+        self.timeout = timeout
+
+    def run(self, input_path: str, output_path: str, resume: bool = True) -> Dict[str, Any]:
+        """
+        Generate every request in ``input_path`` not already in ``output_path``.
+
+        Args:
+            input_path: JSONL file of plan requests
+            output_path: JSONL file results are appended to
+            resume: Skip requests that already succeeded in ``output_path``;
+                otherwise start the output over
+
+        Returns:
+            Throughput summary of this run
+        """
+        if not resume and os.path.exists(output_path):
+            os.remove(output_path)
+        done = load_checkpoint(output_path)
+        if done:
+            logger.info(f"♻️ Resuming: {len(done)} plans already in {output_path}")
+
+        markdown_dir = self.markdown_dir or os.path.splitext(output_path)[0] + "_plans"
+        os.makedirs(markdown_dir, exist_ok=True)
+
+        owns_scheduler = self.generator.scheduler is None
+        if owns_scheduler:
+            self.generator.scheduler = InferenceScheduler(
+                self.generator,
+                max_batch_size=self.batch_size,
+                max_queue_size=self.concurrency * MAX_SECTIONS_PER_PLAN,
+                timeout=self.timeout,
+                max_concurrent_batches=self.generator.worker_pool.num_workers if self.generator.worker_pool else 1
+            )
+
+        summary = {"succeeded": 0, "failed": 0, "skipped": 0, "generated_tokens": 0}
+        latencies = []
+        start = time.perf_counter()
+        try:
+            with open(output_path, "a", encoding="utf-8") as output, \
+                    ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="bulk-plan") as executor:
+                in_flight: Set[Future] = set()
+                for request_id, plan_kwargs in read_requests(input_path):
+                    if request_id in done:
+                        summary["skipped"] += 1
+                        continue
+                    # Read ahead only as far as there are free slots
+                    if len(in_flight) >= self.concurrency:
+                        finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        self._record(finished, output, summary, latencies)
+                    in_flight.add(executor.submit(self._generate_one, request_id, plan_kwargs, markdown_dir))
+                    # Generate duplicate ids only once
+                    done.add(request_id)
+                self._record(wait(in_flight).done, output, summary, latencies)
+        finally:
+            if owns_scheduler:
+                self.generator.scheduler.shutdown()
+                self.generator.scheduler = None
+
+        seconds = time.perf_counter() - start
+        summary.update({
+            "output": output_path,
+            "markdown_dir": markdown_dir,
+            "seconds": round(seconds, 2),
+            "plans_per_minute": round(summary["succeeded"] / seconds * 60, 2) if seconds > 0 else 0.0,
+            "tokens_per_sec": round(summary["generated_tokens"] / seconds, 2) if seconds > 0 else 0.0,
+            "p50_plan_seconds": round(_percentile(latencies, 50), 2),
+            "p95_plan_seconds": round(_percentile(latencies, 95), 2)
+        })
+        return summary
+
+    def _generate_one(self, request_id: str, plan_kwargs: Dict[str, Any], markdown_dir: str) -> Dict[str, Any]:
+        """Generate one plan and build its output record."""
+        safe_id = re.sub(r"[^A-Za-z0-9_.-]+", "_", request_id)
+        start = time.perf_counter()
+        try:
+            result = self.generator.generate_meal_plan(
+                use_cache=self.use_cache, parallel_sections=1,
+                output_file=os.path.join(markdown_dir, f"{safe_id}.md"), **plan_kwargs
+            )
+        except Exception as e:
+            result = {"status": "error", "error": str(e), "error_type": type(e).__name__}
+        if result["status"] == "success":
+            # Plans are saved in the background; the checkpoint line may only name a file that exists
+            file_path = self.generator.plan_writer.wait(result["file_path"])
+            if file_path is None:
+                result = {"status": "error", "error": f"Could not save the plan to {result['file_path']}"}
+            else:
+                result["file_path"] = file_path
+        record = {
+            "id": request_id,
+            "status": result["status"],
+            "request": plan_kwargs,
+            "seconds": round(time.perf_counter() - start, 3)
+        }
+        if result["status"] == "success":
+            record.update({
+                "file_path": result["file_path"],
+                "metadata": result["metadata"],
+                "cache": result["cache"],
+                "meal_plan": result["meal_plan"]
+            })
+        else:
+            record["error"] = result.get("error", "Failed to generate meal plan")
+        return record
+
+    def _record(self, finished: Set[Future], output: Any, summary: Dict[str, Any], latencies: list) -> None:
+        """Append finished plans to the output and fold them into the summary."""
+        for future in finished:
+            record = future.result()
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+            os.fsync(output.fileno())
+            if record["status"] == "success":
+                summary["succeeded"] += 1
+                summary["generated_tokens"] += record["metadata"].get("generated_tokens", 0)
+                latencies.append(record["seconds"])
+                logger.info(f"✅ {record['id']} done in {record['seconds']:.1f}s")
+            else:
+                summary["failed"] += 1
+                logger.error(f"❌ {record['id']} failed: {record['error']}")
@@ -0,0 +1,101 @@
+import os
+import threading
+import torch
+from typing import Any, Dict, Optional
+from transformers import CompileConfig
+
+try:
+    from .prompt_compiler import MAX_PROMPT_TOKENS
+    from .stopping import MAX_SECTION_TOKENS
+    from .telemetry import get_logger
+except ImportError:
+    # Running as a script from inside model/
+    from prompt_compiler import MAX_PROMPT_TOKENS
+    from stopping import MAX_SECTION_TOKENS
+    from telemetry import get_logger
+
+logger = get_logger("compiled")
+
+# "fake" skips the model entirely and answers from fake_backend.FakeBackend
+INFERENCE_BACKENDS = ("eager", "compile", "fake")
+# Every prompt plus its continuation fits in this many tokens: the longest prompt the
+# prompt budgets allow still leaves room for the longest section's token budget
+MAX_CONTEXT_TOKENS = MAX_PROMPT_TOKENS + MAX_SECTION_TOKENS
+
+
+def compiled_cache_dir(cache_dir: Optional[str] = None) -> str:
+    """
+    Directory for compiled kernels: ``compiled/`` inside the model cache directory.
+
+    Args:
+        cache_dir: The generator's model cache directory, if any
+
+    Returns:
+        Path of the compiled artifact directory
+    """
+    base = cache_dir or os.path.join(os.path.expanduser("~"), ".cache", "nutrimind")
+    return os.path.join(base, "compiled")
+
+
+class CompiledDecoder:
+    """
+    Decoding through a ``torch.compile``d forward pass over a static KV cache.
+
+    Eager ``generate`` spends much of every decoded token on Python dispatch,
+    which dominates for small models on CPU. Here the per-token forward pass
+    is traced once per batch shape and runs as generated C++ kernels. The KV
+    cache is allocated at the full context length, so its shape, and with it
+    the compiled graph, stays the same across prompts; only a new number of
+    rows (prompts x beams) compiles again. Inductor stores the compiled
+    kernels under ``artifact_dir``, so later processes load them instead of
+    compiling from scratch.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_cache_len: int = MAX_CONTEXT_TOKENS):
+        """
+        Args:
+            cache_dir: The generator's model cache directory; kernels go to its ``compiled/``
+            max_cache_len: Static KV cache length in tokens
+        """
+        self.artifact_dir = compiled_cache_dir(cache_dir)
+        self.max_cache_len = max_cache_len
+        os.makedirs(self.artifact_dir, exist_ok=True)
+        # Inductor reads this when it first compiles; an explicit setting wins
+        os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", self.artifact_dir)
+        self.compile_config = CompileConfig(fullgraph=False, dynamic=False)
+        # transformers only compiles on accelerators unless told otherwise
+        self.compile_config._compile_all_devices = True
+        self._lock = threading.Lock()
+        self._compiled_rows: set = set()
+
+    def generation_kwargs(self) -> Dict[str, Any]:
+        """Extra ``model.generate`` arguments that decode through the compiled graph."""
+        return {
+            "cache_implementation": "static",
+            "max_cache_len": self.max_cache_len,
+            "compile_config": self.compile_config
+        }
+
+    def generate(self, model: Any, inputs: Dict[str, torch.Tensor], generation_kwargs: Dict[str, Any]) -> torch.Tensor:
+        """
+        Run ``model.generate`` through the compiled graph.
+
+        The first call for a batch shape compiles (or loads compiled kernels
+        from disk) while holding a lock, so concurrent callers never trace the
+        same graph twice; calls with known shapes run concurrently.
+
+        Returns:
+            Generated token ids including the prompt
+        """
+        rows = inputs["input_ids"].shape[0] * generation_kwargs.get("num_beams", 1)
+        kwargs = dict(generation_kwargs, **self.generation_kwargs())
+        if rows in self._compiled_rows:
+            with torch.no_grad():
+                return model.generate(**inputs, **kwargs)
+        with self._lock:
+            if rows not in self._compiled_rows:
+                logger.info(f"🔄 Compiling the decoding graph for {rows} rows (cached in {self.artifact_dir})...")
+            with torch.no_grad():
+                outputs = model.generate(**inputs, **kwargs)
+            self._compiled_rows.add(rows)
+        return outputs
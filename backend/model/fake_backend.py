@@ -0,0 +1,252 @@
+import os
+import re
+import math
+import time
+import random
+import hashlib
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from .stopping import DAY_SECTIONS, GUIDANCE_SECTIONS, SectionSpec
+except ImportError:
+    # Running as a script from inside model/
+    from stopping import DAY_SECTIONS, GUIDANCE_SECTIONS, SectionSpec
+
+# Share of the daily calories each meal of ``DAY_SECTIONS`` gets
+MEAL_CALORIE_SHARES = (0.25, 0.1, 0.3, 0.1, 0.25)
+# Seconds between cancellation checks and streamed chunks while "decoding"
+STEP_SECONDS = 0.05
+# Where fake plans are saved, away from the real plans, their archive and the recipe index
+FAKE_PLANS_DIR = os.path.join(tempfile.gettempdir(), "nutrimind_fake_plans")
+
+_SLOT_ONLY = re.compile(r"Provide only the (.+?) for this day")
+_DAY = re.compile(r"Meal Plan for Day (\d+)|for Day (\d+)")
+_CALORIES = re.compile(r"Daily Calories\**:.*?(\d{3,5})")
+_CUISINE = re.compile(r"Cuisine Style\**:\s*([^\n]+)")
+_DIET = re.compile(r"Diet Type\**:\s*([^\n]+)")
+
+_DISHES = ("Bowl", "Salad", "Curry", "Wrap", "Stew", "Skillet", "Porridge", "Stir-Fry", "Soup", "Toast")
+_BASES = ("Lentil", "Chickpea", "Quinoa", "Oats", "Brown Rice", "Tofu", "Millet", "Spinach", "Sweet Potato", "Barley")
+_INGREDIENTS = ("onion", "tomato", "garlic", "ginger", "olive oil", "lemon juice", "bell pepper", "carrot",
+                "cucumber", "fresh herbs", "spinach", "chickpeas", "lentils", "rolled oats", "brown rice",
+                "sweet potato", "mushrooms", "zucchini", "green peas", "low-fat yogurt")
+
+
+class FakeBackend:
+    """
+    Deterministic stand-in for the model, for load tests and offline development.
+
+    Produces well-formed plan markdown (meal headings, recipe names, macros,
+    ingredient lists and guidance sections) that the stop rules, structured
+    parser and recipe index all accept, without any weights. The same prompt
+    always yields the same text. Timing follows a model: every call waits a
+    first-token latency drawn from a log-normal distribution around
+    ``latency_ms``, then decodes the longest row at ``tokens_per_sec``; rows of
+    a batch decode side by side, so batching pays off as it does on a real
+    model. ``max_concurrency`` calls run at once and later callers wait, like
+    requests sharing one model. A "token" is one whitespace-separated word.
+    """
+
+    def __init__(self, tokens_per_sec: float = 200.0, latency_ms: float = 50.0, latency_sigma: float = 0.25,
+                 max_concurrency: int = 1, error_rate: float = 0.0, seed: int = 0):
+        """
+        Args:
+            tokens_per_sec: Decoding speed of each row
+            latency_ms: Median first-token (prefill) latency per call
+            latency_sigma: Spread of the log-normal latency distribution (0 for a fixed latency)
+            max_concurrency: Calls that may decode at the same time
+            error_rate: Fraction of calls that fail with a RuntimeError, to exercise error paths
+            seed: Seed of the text, latency and error draws
+        """
+        if tokens_per_sec <= 0:
+            raise ValueError("tokens_per_sec must be positive")
+        self.tokens_per_sec = tokens_per_sec
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.max_concurrency = max(1, max_concurrency)
+        self.error_rate = error_rate
+        self.seed = seed
+        self._init_runtime()
+
+    def _init_runtime(self) -> None:
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._rng = random.Random(self.seed)
+        self._rng_lock = threading.Lock()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Spawned worker processes get the settings, not the locks
+        return {key: value for key, value in self.__dict__.items() if not key.startswith("_")}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._init_runtime()
+
+    def settings(self) -> Dict[str, Any]:
+        """Return the timing and error settings."""
+        return self.__getstate__()
+
+    def text_for(self, prompt: str) -> str:
+        """Deterministic response to a plan, meal or guidance prompt."""
+        rng = random.Random(f"{self.seed}:{hashlib.sha1(prompt.encode('utf-8')).hexdigest()}")
+        cuisine = (_CUISINE.search(prompt).group(1).strip() if _CUISINE.search(prompt) else "Seasonal")
+        diet = (_DIET.search(prompt).group(1).strip() if _DIET.search(prompt) else "Balanced")
+        calories = _CALORIES.search(prompt)
+        daily_calories = int(calories.group(1)) if calories else 2000
+
+        if GUIDANCE_SECTIONS[0] in prompt and "Meal Plan for Day" not in prompt:
+            return self._guidance_text(rng, cuisine)
+        slot_only = _SLOT_ONLY.search(prompt)
+        slots = [slot_only.group(1)] if slot_only else list(DAY_SECTIONS)
+        day = _DAY.search(prompt)
+        day_number = next((int(group) for group in day.groups() if group), 1) if day else 1
+        lines = [] if slot_only else [f"Here is a balanced {cuisine} {diet} plan for day {day_number}.", ""]
+        for slot in slots:
+            share = MEAL_CALORIE_SHARES[DAY_SECTIONS.index(slot)] if slot in DAY_SECTIONS else 0.2
+            lines.extend(self._meal_text(rng, slot, cuisine, round(daily_calories * share)))
+        return "\n".join(lines).strip()
+
+    @staticmethod
+    def _meal_text(rng: random.Random, slot: str, cuisine: str, calories: int) -> List[str]:
+        name = f"{cuisine.title()} {rng.choice(_BASES)} {rng.choice(_DISHES)}"
+        ingredients = rng.sample(_INGREDIENTS, 5)
+        protein = round(calories * rng.uniform(0.2, 0.3) / 4)
+        carbs = round(calories * rng.uniform(0.4, 0.5) / 4)
+        fats = round(calories * rng.uniform(0.2, 0.3) / 9)
+        lines = [f"### {slot}", "",
+                 f"**Recipe Name:** {name}", "",
+                 "**Nutrition (per serving)**",
+                 f"- Calories: {calories}",
+                 f"- Protein: {protein}g",
+                 f"- Carbs: {carbs}g",
+                 f"- Fats: {fats}g",
+                 f"- Fiber: {rng.randint(3, 12)}g", "",
+                 "**Ingredients List**"]
+        lines += [f"- {rng.randint(1, 3) * 50}g {item}" for item in ingredients]
+        lines += ["", "**Preparation Steps**",
+                  f"1. Prepare the {ingredients[0]} and {ingredients[1]}.",
+                  f"2. Cook with the {ingredients[2]} for {rng.randint(5, 20)} minutes.",
+                  "3. Season, plate and serve warm.", ""]
+        return lines
+
+    @staticmethod
+    def _guidance_text(rng: random.Random, cuisine: str) -> str:
+        lines = []
+        for number, section in enumerate(GUIDANCE_SECTIONS, start=1):
+            items = rng.sample(_INGREDIENTS, 4)
+            lines += [f"{number}. **{section}**"]
+            lines += [f"   - Plan {rng.randint(2, 6)} portions of {item} for {cuisine.lower()} dishes" for item in items]
+            lines.append("")
+        return "\n".join(lines).strip()
+
+    def _latency(self) -> float:
+        with self._rng_lock:
+            if self.latency_sigma > 0:
+                return self.latency_ms / 1000 * math.exp(self._rng.gauss(0.0, self.latency_sigma))
+            return self.latency_ms / 1000
+
+    def _fails(self) -> bool:
+        with self._rng_lock:
+            return self.error_rate > 0 and self._rng.random() < self.error_rate
+
+    def generate(self, prompts: List[str], max_new_tokens: int, profile: str,
+                 streamer: Optional[Any] = None,
+                 stop_specs: Optional[List[Optional[SectionSpec]]] = None,
+                 cancel_events: Optional[List[Optional[threading.Event]]] = None) -> Tuple[List[str], Dict[str, Any]]:
+        """
+        Produce texts for a batch of prompts with ``MealPlanGenerator._generate``'s stats.
+
+        Args:
+            prompts: Raw prompts, decoded together as one batch
+            max_new_tokens: Cap on tokens per row
+            profile: Decoding profile name reported in the stats
+            streamer: ``TextIteratorStreamer``-style object fed the first row's text as it "decodes"
+            stop_specs: One ``SectionSpec`` (or None) per prompt
+            cancel_events: One ``threading.Event`` (or None) per prompt
+
+        Returns:
+            Tuple of (texts in prompt order, generation stats)
+        """
+        specs = stop_specs or [None] * len(prompts)
+        events = cancel_events or [None] * len(prompts)
+        rows = []
+        for prompt, spec in zip(prompts, specs):
+            words = self.text_for(prompt).split(" ")
+            budget = min(max_new_tokens, spec.token_budget) if spec is not None else max_new_tokens
+            rows.append((words[:budget], len(words) > budget, spec))
+
+        start = time.perf_counter()
+        with self._slots:
+            queued = time.perf_counter() - start
+            if self._fails():
+                raise RuntimeError("Simulated model failure")
+            latency = self._latency()
+            self._sleep(latency, events)
+            prefill_end = time.perf_counter()
+            longest = max((len(words) for words, _, _ in rows), default=0)
+            sent = 0
+            while True:
+                elapsed = time.perf_counter() - prefill_end
+                decoded = min(longest, int(elapsed * self.tokens_per_sec))
+                if streamer is not None and rows and decoded > sent:
+                    chunk = " ".join(rows[0][0][sent:decoded])
+                    streamer.on_finalized_text(chunk if sent == 0 else " " + chunk)
+                    sent = decoded
+                if decoded >= longest or all(event is not None and event.is_set() for event in events):
+                    break
+                time.sleep(min(STEP_SECONDS, (longest - decoded) / self.tokens_per_sec))
+            if streamer is not None:
+                streamer.end()
+        end = time.perf_counter()
+
+        texts, row_tokens, stop_reasons = [], [], []
+        for (words, truncated, spec), event in zip(rows, events):
+            if event is not None and event.is_set():
+                words = words[:decoded]
+            text = " ".join(words)
+            reason = None
+            if spec is not None:
+                text, reason = spec.scan(text)
+            if event is not None and event.is_set():
+                reason = "cancelled"
+            elif reason is None:
+                if truncated:
+                    reason = "token_budget" if spec is not None and spec.token_budget <= max_new_tokens else "max_tokens"
+                else:
+                    reason = "eos"
+            texts.append(text)
+            row_tokens.append(len(words))
+            stop_reasons.append(reason)
+
+        generated_tokens = sum(row_tokens)
+        elapsed = end - start
+        return texts, {
+            "profile": profile,
+            "generated_tokens": generated_tokens,
+            "row_tokens": row_tokens,
+            "stop_reasons": stop_reasons,
+            "prompt_tokens": sum(len(prompt.split()) for prompt in prompts),
+            "row_prompt_tokens": [len(prompt.split()) for prompt in prompts],
+            # Fake prompts are not tokenized, so there are no segments to count
+            "row_prompt_segments": [{} for _ in prompts],
+            "seconds": round(elapsed, 3),
+            "tokenize_seconds": 0.0,
+            "prefill_seconds": round(queued + latency, 3),
+            "decode_seconds": round(end - prefill_end, 3),
+            "tokens_per_sec": round(generated_tokens / elapsed, 2) if elapsed > 0 else 0.0,
+            "draft_calls": 0,
+            "draft_proposed": 0,
+            "draft_accepted": 0,
+            "draft_speedup": None
+        }
+
+    @staticmethod
+    def _sleep(seconds: float, events: List[Optional[threading.Event]]) -> None:
+        """Sleep, waking early once every prompt of the batch is cancelled."""
+        deadline = time.perf_counter() + seconds
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0 or all(event is not None and event.is_set() for event in events):
+                return
+            time.sleep(min(STEP_SECONDS, remaining))
@@ -0,0 +1,145 @@
+import copy
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+try:
+    from .scheduler import QueueFullError
+except ImportError:
+    # Running as a script from inside model/
+    from scheduler import QueueFullError
+
+
+class JobManager:
+    """
+    Background meal plan jobs that clients submit now and poll later.
+
+    Jobs run ``MealPlanGenerator.generate_meal_plan`` on a small worker pool
+    and record per-day progress as sections finish. Failed jobs keep the
+    error message and its ``error_type``, as ``generate_meal_plan`` reports
+    them. Finished jobs are kept for ``result_ttl`` seconds and then forgotten.
+    """
+
+    def __init__(self, generator: Any, max_workers: int = 2, result_ttl: float = 3600.0,
+                 max_pending: int = 100):
+        """
+        Initialize the worker pool and job table.
+
+        Args:
+            generator: The ``MealPlanGenerator`` used to run jobs
+            max_workers: Number of jobs that may generate concurrently
+            result_ttl: Seconds a finished job's result is kept
+            max_pending: Maximum jobs queued or running at once
+        """
+        self.generator = generator
+        self.result_ttl = result_ttl
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="meal-plan-job")
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, **plan_kwargs: Any) -> str:
+        """
+        Queue a meal plan job.
+
+        Args:
+            **plan_kwargs: Keyword arguments for ``generate_meal_plan``
+
+        Returns:
+            The new job's id
+
+        Raises:
+            QueueFullError: If ``max_pending`` jobs are already queued or running
+        """
+        self._purge_expired()
+        days = max(1, min(14, plan_kwargs.get("days", 3)))
+        job_id = uuid.uuid4().hex
+
+        with self._lock:
+            pending = sum(1 for job in self._jobs.values() if job["status"] in ("queued", "running"))
+            if pending >= self.max_pending:
+                raise QueueFullError(f"Too many pending jobs ({pending})")
+            self._jobs[job_id] = {
+                "id": job_id,
+                "status": "queued",
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "progress": {
+                    "completed_days": 0,
+                    "total_days": days,
+                    "completed_sections": 0,
+                    "total_sections": days + 1
+                },
+                "request": plan_kwargs,
+                "result": None,
+                "error": None,
+                "error_type": None
+            }
+
+        self._executor.submit(self._run, job_id, plan_kwargs)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Return a snapshot of a job, or None if it is unknown or expired.
+
+        Args:
+            job_id: Id returned by ``submit``
+        """
+        self._purge_expired()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return copy.deepcopy(job) if job is not None else None
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of known jobs in each status."""
+        with self._lock:
+            counts = {"queued": 0, "running": 0, "completed": 0, "failed": 0}
+            for job in self._jobs.values():
+                counts[job["status"]] += 1
+            return counts
+
+    def shutdown(self) -> None:
+        """Wait for running jobs and stop the worker pool."""
+        self._executor.shutdown(wait=True)
+
+    def _run(self, job_id: str, plan_kwargs: Dict[str, Any]) -> None:
+        """Worker entry point: generate the plan and record the outcome."""
+        self._update(job_id, status="running", started_at=time.time())
+
+        def on_progress(completed: int, total: int) -> None:
+            with self._lock:
+                progress = self._jobs[job_id]["progress"]
+                progress["completed_sections"] = completed
+                progress["total_sections"] = total
+                # The guidance section is generated last
+                progress["completed_days"] = min(completed, total - 1)
+
+        try:
+            result = self.generator.generate_meal_plan(progress_callback=on_progress, **plan_kwargs)
+        except Exception as e:
+            result = {"status": "error", "error": str(e), "error_type": type(e).__name__}
+
+        if result["status"] == "success":
+            self._update(job_id, status="completed", finished_at=time.time(), result=result)
+        else:
+            self._update(job_id, status="failed", finished_at=time.time(),
+                         error=result.get("error", "Failed to generate meal plan"),
+                         error_type=result.get("error_type"))
+
+    def _update(self, job_id: str, **fields: Any) -> None:
+        """Apply field updates to a job under the lock."""
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def _purge_expired(self) -> None:
+        """Forget finished jobs older than the result TTL."""
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job["finished_at"] is not None and job["finished_at"] < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
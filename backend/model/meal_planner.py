@@ -1,54 +1,465 @@
+import gc
 import os
 import sys
+import copy
 import json
+import time
 import torch
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from transformers import AutoTokenizer, AutoModelForCausalLM
-from typing import List, Dict, Any, Optional, Union
+from transformers import (AutoTokenizer, AutoModelForCausalLM, DynamicCache, LogitsProcessor,
+                          LogitsProcessorList, StoppingCriteriaList, TextIteratorStreamer)
+from typing import List, Dict, Any, Callable, Generator, Iterator, Optional, Tuple, Union
+
+try:
+    from .prefix_cache import PrefixCache
+    from .result_cache import ResultCache
+    from .weights import PRECISIONS, load_model_mmap, quantize_dynamic_int8, resolve_precision
+    from .worker_pool import ModelWorkerPool
+    from .stopping import (DAY_SECTIONS, CancellationStoppingCriteria, SectionSpec, SectionStoppingCriteria,
+                           raise_if_cancelled)
+    from .bulk import BulkRunner
+    from .speculative import SpeculativeDecoder
+    from .compiled import INFERENCE_BACKENDS, MAX_CONTEXT_TOKENS, CompiledDecoder
+    from .recipe_index import GUIDANCE_SLOT, RecipeIndex, unmapped_allergies
+    from .persistence import PlanArchive, PlanWriter
+    from .prompt_compiler import CompiledPrompt, PromptCompiler, segment_lines
+    from .fake_backend import FAKE_PLANS_DIR, FakeBackend
+    from .structured import PlanParser, nutrition_totals, parse_days
+    from .telemetry import (CACHE_LOOKUPS, ERRORS, PLAN_SECONDS, STAGE_SECONDS, Trace,
+                            configure_logging, get_logger, record_generation)
+except ImportError:
+    # Running as a script from inside model/
+    from prefix_cache import PrefixCache
+    from result_cache import ResultCache
+    from weights import PRECISIONS, load_model_mmap, quantize_dynamic_int8, resolve_precision
+    from worker_pool import ModelWorkerPool
+    from stopping import (DAY_SECTIONS, CancellationStoppingCriteria, SectionSpec, SectionStoppingCriteria,
+                          raise_if_cancelled)
+    from bulk import BulkRunner
+    from speculative import SpeculativeDecoder
+    from compiled import INFERENCE_BACKENDS, MAX_CONTEXT_TOKENS, CompiledDecoder
+    from recipe_index import GUIDANCE_SLOT, RecipeIndex, unmapped_allergies
+    from persistence import PlanArchive, PlanWriter
+    from prompt_compiler import CompiledPrompt, PromptCompiler, segment_lines
+    from fake_backend import FAKE_PLANS_DIR, FakeBackend
+    from structured import PlanParser, nutrition_totals, parse_days
+    from telemetry import (CACHE_LOOKUPS, ERRORS, PLAN_SECONDS, STAGE_SECONDS, Trace,
+                           configure_logging, get_logger, record_generation)
+
+logger = get_logger("meal_planner")
+
+# Seconds the current thread spent computing prefix caches during input preparation
+_prefix_timing = threading.local()
+# Prompts the current thread compiled during input preparation, for token usage stats
+_prompt_usage = threading.local()
+
+# Named decoding strategies. "quality" is the original beam-sampling setup;
+# the others trade some output quality for far fewer forward passes.
+DECODING_PROFILES: Dict[str, Dict[str, Any]] = {
+    "quality": {
+        "num_beams": 5,
+        "do_sample": True,
+        "temperature": 0.8,
+        "top_p": 0.95,
+        "top_k": 100,
+        "repetition_penalty": 1.3,
+        "no_repeat_ngram_size": 3,
+        "length_penalty": 1.2,
+        "max_new_tokens": 1500
+    },
+    "fast": {
+        "num_beams": 1,
+        "do_sample": True,
+        "temperature": 0.7,
+        "top_p": 0.9,
+        "top_k": 50,
+        "repetition_penalty": 1.15,
+        "no_repeat_ngram_size": 0,
+        "length_penalty": 1.0,
+        "max_new_tokens": 1200
+    },
+    "draft": {
+        "num_beams": 1,
+        "do_sample": False,
+        "temperature": 1.0,
+        "top_p": 1.0,
+        "top_k": 0,
+        "repetition_penalty": 1.2,
+        "no_repeat_ngram_size": 0,
+        "length_penalty": 1.0,
+        "max_new_tokens": 600
+    }
+}
+
+# Details requested for every meal, in day prompts and single-meal prompts
+MEAL_DETAILS = """1. 🍽️ **Recipe Name & Description**
+2. ⚖️ **Exact Portions & Measurements**
+3. 📊 **Complete Nutritional Breakdown**
+   - Calories: exact kcal
+   - Protein: g
+   - Carbs: g
+   - Fats: g
+   - Fiber: g
+4. 🥘 **Ingredients List**
+5. 👩‍🍳 **Preparation Steps** (step-by-step with precise cooking times and techniques)
+6. ⌚ **Timing Guidelines**
+7. 💡 **Tips & Substitutions**
+"""
+
+# Meals requested for every day, ahead of the details of each meal
+DAY_MEAL_STRUCTURE = """Provide the following meals with complete details:
+
+1. **Breakfast** (Morning Energy Boost)
+   - Main dish with protein source
+   - Side items and beverages
+   - Timing: Early morning meal
+   
+2. **Mid-Morning Snack**
+   - Light, nutritious options
+   - Protein or fruit-based choices
+   
+3. **Lunch** (Mid-day Fuel)
+   - Complete main course
+   - Side dishes and accompaniments
+   - Recommended beverages
+   
+4. **Evening Snack**
+   - Energy-sustaining options
+   - Small but satisfying portions
+   
+5. **Dinner** (Evening Nourishment)
+   - Full main course
+   - Balanced side dishes
+   - Light beverage options
+
+For each meal, include:
+""" + MEAL_DETAILS
+
+# Guidance sections requested once per plan
+GUIDANCE_STRUCTURE = """1. **Weekly Shopping List**
+   - Organize by food category (produce, proteins, pantry items, etc.)
+   - Include exact quantities needed for the full plan
+   - Note shelf-stable vs fresh items
+   - Suggest budget-friendly alternatives
+
+2. **Meal Prep Strategy**
+   - Provide a detailed weekly meal prep timeline
+   - Identify which components can be prepared in advance
+   - Include storage instructions and shelf life information
+   - Batch cooking recommendations
+
+3. **Portion Control & Scaling**
+   - Guidelines for adjusting portions based on individual needs
+   - How to scale recipes up or down
+   - Visual portion size references
+
+4. **Progress Tracking & Adjustments**
+   - Signs that the meal plan is working for the stated goal
+   - Common issues and how to troubleshoot them
+   - When and how to make adjustments
+"""
+
+# Used when no guidelines are known for a cuisine and diet
+DEFAULT_GUIDELINES = "Default guidelines - adapt recipes to meet nutritional requirements for the specified goal."
+
+# Chat markup around every prompt
+CHAT_HEAD = ("<|system|>You are a professional nutritionist and chef. Your goal is to create detailed, "
+             "healthy, and practical meal plans.</s><|user|>")
+CHAT_TAIL = "</s><|assistant|>"
+
+
+class _FirstStepTimer(LogitsProcessor):
+    """Records when ``generate`` first scores next-token logits, i.e. when prefill ends."""
+
+    def __init__(self):
+        self.first_step: Optional[float] = None
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
+        if self.first_step is None:
+            self.first_step = time.perf_counter()
+        return scores
+
 
 class MealPlanGenerator:
     """A class to generate personalized meal plans using a language model."""
     
-    def __init__(self, model_name: str = "TinyLlama/TinyLlama-1.1B-Chat-v1.0", cache_dir: Optional[str] = None):
+    def __init__(self, model_name: str = "TinyLlama/TinyLlama-1.1B-Chat-v1.0", cache_dir: Optional[str] = None,
+                 prefix_cache_mb: int = 256, decoding_profile: str = "quality",
+                 result_cache_size: int = 256, lazy_load: bool = False,
+                 mmap_weights: bool = False, precision: str = "auto", section_stopping: bool = True,
+                 draft_model: Optional[str] = None,
+                 recipe_index_dir: Optional[str] = os.path.join("meal_plans", "recipe_index"),
+                 inference_backend: str = "eager",
+                 plan_writer: Optional[PlanWriter] = None,
+                 fake_backend: Optional[FakeBackend] = None):
         """
         Initialize the meal plan generator with a specified language model.
         
         Args:
             model_name: The name or path of the model to use
             cache_dir: Optional directory to cache the downloaded model
+            prefix_cache_mb: Memory budget for cached prompt prefixes (0 disables the cache)
+            decoding_profile: Default decoding profile from ``DECODING_PROFILES``
+            result_cache_size: Request profiles kept in the in-memory result cache
+                (0 disables result caching)
+            lazy_load: Defer loading the model until ``load_model`` or first use
+            mmap_weights: Memory-map safetensors weights so processes share page cache
+            precision: One of ``PRECISIONS``: "auto" (fp16 on GPU, bf16 or fp32 on CPU),
+                "fp32", "fp16", "bf16" or "int8" (dynamic quantization, CPU only)
+            section_stopping: End plan sections early at section boundaries, repeated
+                sections or their per-section token budget instead of the profile's hard cap
+            draft_model: Optional name or path of a small model that drafts tokens for
+                assisted generation; used for single-beam, single-prompt calls while it
+                measurably speeds up decoding
+            recipe_index_dir: Directory of the index of meals from saved plans used by
+                ``generate_meal_plan(from_index=True)`` (None disables the index)
+            inference_backend: One of ``INFERENCE_BACKENDS``: "eager" runs ``model.generate``
+                as is; "compile" decodes through a ``torch.compile``d graph with a static KV
+                cache, with the compiled kernels cached in ``compiled/`` under ``cache_dir``;
+                "fake" loads no model and answers from ``fake_backend``, for load tests; its
+                plans go to ``FAKE_PLANS_DIR`` (unless a call names its own file), are not
+                indexed and are only cached in memory
+            plan_writer: Background writer that saves generated plans (default: files in meal_plans/);
+                generators may share one
+            fake_backend: Timing settings of the "fake" backend (default: ``FakeBackend()``)
         """
+        if decoding_profile not in DECODING_PROFILES:
+            raise ValueError(f"Unknown decoding profile '{decoding_profile}'. "
+                             f"Choose from: {', '.join(DECODING_PROFILES)}")
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision '{precision}'. Choose from: {', '.join(PRECISIONS)}")
+        if inference_backend not in INFERENCE_BACKENDS:
+            raise ValueError(f"Unknown inference backend '{inference_backend}'. "
+                             f"Choose from: {', '.join(INFERENCE_BACKENDS)}")
         self.model_name = model_name
-        print(f"🔄 Loading model {model_name}...")
+        self.decoding_profile = decoding_profile
+        # Optional InferenceScheduler; when set, plan prompts are queued and
+        # micro-batched with prompts from other concurrent requests
+        self.scheduler = None
+        # Optional ModelWorkerPool; when set, model calls run in its worker
+        # processes instead of this one (streaming still runs locally)
+        self.worker_pool = None
+        self.prefix_cache = PrefixCache(prefix_cache_mb * 1024 * 1024) if prefix_cache_mb > 0 else None
+        self.result_cache = ResultCache(max_entries=result_cache_size) if result_cache_size > 0 else None
+        self.cache_dir = cache_dir
+        self.mmap_weights = mmap_weights
+        self.precision = precision
+        self.section_stopping = section_stopping
+        self.draft_model_name = draft_model
+        self.speculative = SpeculativeDecoder(draft_model, cache_dir) if draft_model else None
+        self.recipe_index = RecipeIndex(recipe_index_dir) if recipe_index_dir else None
+        self.inference_backend = inference_backend
+        self.plan_writer = plan_writer if plan_writer is not None else PlanWriter()
+        self.fake = (fake_backend or FakeBackend()) if inference_backend == "fake" else None
+        if self.fake is not None:
+            # Fake text must never be served or indexed as a real plan
+            self.plan_writer = PlanWriter(output_dir=FAKE_PLANS_DIR)
+            self.recipe_index = None
+            if self.result_cache is not None:
+                self.result_cache = ResultCache(max_entries=result_cache_size, disk_dir=None)
+        # CompiledDecoder once loaded with the "compile" backend
+        self.compiled: Optional[CompiledDecoder] = None
+        # PromptCompiler holding the pre-tokenized template segments once the tokenizer is loaded
+        self.prompt_compiler: Optional[PromptCompiler] = None
+        # Precision actually in use once loaded ("auto" resolved per device)
+        self.active_precision: Optional[str] = None
+        self.tokenizer = None
+        self.model = None
+        self.device = None
+        self.load_error: Optional[Exception] = None
+        self._load_lock = threading.Lock()
         
-        # Model initialization with error handling
-        try:
-            model_kwargs = {"torch_dtype": torch.float16, "low_cpu_mem_usage": True}
-            if cache_dir:
-                model_kwargs["cache_dir"] = cache_dir
-                
-            self.tokenizer = AutoTokenizer.from_pretrained(model_name, cache_dir=cache_dir)
-            self.model = AutoModelForCausalLM.from_pretrained(model_name, **model_kwargs)
+        # Load cuisine guidelines from external file if available
+        self.cuisine_guidelines = self._load_cuisine_guidelines()
+        
+        if not lazy_load:
+            self.load_model()
+        
+    @property
+    def is_ready(self) -> bool:
+        """Whether the tokenizer and model are loaded and ready to generate."""
+        return self.model is not None
+
+    def load_model(self) -> None:
+        """
+        Load the tokenizer and model weights if they are not loaded yet.
+        
+        Safe to call from several threads; callers arriving while another
+        thread is loading wait for it to finish. A tokenizer already set on
+        the generator (kept by ``unload_model``, or shared by a ``ModelRegistry``)
+        is reused instead of loading another.
+        """
+        if self.model is not None:
+            return
+        with self._load_lock:
+            if self.model is not None:
+                return
+            if self.fake is not None:
+                # Nothing to load; the fake backend stands in for the model
+                logger.info(f"✅ Using the fake backend ({self.fake.tokens_per_sec:g} tokens/sec, "
+                            f"{self.fake.latency_ms:g} ms median latency)")
+                self.active_precision = "fake"
+                self.model = self.fake
+                self.load_error = None
+                return
+            model_name = self.model_name
+            cache_dir = self.cache_dir
+            logger.info(f"🔄 Loading model {model_name}...")
+            load_start = time.perf_counter()
             
-            # Device selection with fallback options
+            # Model initialization with error handling
+            try:
+                # Device selection with fallback options
+                if torch.cuda.is_available():
+                    device = torch.device("cuda")
+                    logger.info("✅ Using GPU acceleration (CUDA)")
+                elif hasattr(torch.backends, 'mps') and torch.backends.mps.is_available():
+                    device = torch.device("mps")
+                    logger.info("✅ Using Apple Silicon acceleration (MPS)")
+                else:
+                    device = torch.device("cpu")
+                    logger.warning("⚠️ Using CPU (GPU not available)")
+                    
+                precision, torch_dtype = resolve_precision(self.precision, device)
+                model_kwargs = {"torch_dtype": torch_dtype, "low_cpu_mem_usage": True}
+                if cache_dir:
+                    model_kwargs["cache_dir"] = cache_dir
+                    
+                tokenizer = self.tokenizer or AutoTokenizer.from_pretrained(model_name, cache_dir=cache_dir)
+                # Decoder-only models need left padding so batched prompts end where generation starts
+                tokenizer.padding_side = "left"
+                if tokenizer.pad_token is None:
+                    tokenizer.pad_token = tokenizer.eos_token
+                    
+                model = None
+                if self.mmap_weights:
+                    try:
+                        model = load_model_mmap(model_name, cache_dir, torch_dtype=torch_dtype)
+                        logger.info("✅ Memory-mapped safetensors weights")
+                    except Exception as e:
+                        logger.warning(f"⚠️ Could not memory-map weights, loading normally: {str(e)}")
+                if model is None:
+                    model = AutoModelForCausalLM.from_pretrained(model_name, **model_kwargs)
+                    
+                model = model.to(device)
+                if precision == "int8":
+                    model = quantize_dynamic_int8(model)
+                logger.info(f"✅ Running in {precision} precision")
+                
+                compiled = None
+                if self.inference_backend == "compile":
+                    if precision == "int8":
+                        logger.warning("⚠️ Dynamically quantized int8 layers cannot be compiled; decoding eagerly")
+                    else:
+                        compiled = CompiledDecoder(cache_dir)
+                    
+                if self.speculative is not None:
+                    try:
+                        self.speculative.load(model, device, torch_dtype, quantize=precision == "int8")
+                    except Exception as e:
+                        logger.warning(f"⚠️ Could not load draft model, decoding without it: {str(e)}")
+                        self.speculative = None
+                    
+                if self.prompt_compiler is None or self.prompt_compiler.tokenizer is not tokenizer:
+                    self.prompt_compiler = self._build_prompt_compiler(tokenizer)
+                    
+                self.tokenizer = tokenizer
+                self.device = device
+                self.active_precision = precision
+                self.compiled = compiled
+                self.model = model
+                self.load_error = None
+                logger.info(f"✅ Model loaded in {time.perf_counter() - load_start:.1f}s")
+                
+            except Exception as e:
+                self.load_error = e
+                logger.error(f"❌ Error loading model: {str(e)}")
+                raise
+
+    def unload_model(self) -> None:
+        """
+        Free the model weights, the draft model and cached prompt prefixes.
+        
+        The tokenizer is kept; the next generation call loads the weights again.
+        Callers must make sure no generation is running on this generator.
+        """
+        with self._load_lock:
+            if self.model is None:
+                return
+            self.model = None
+            # The compiled graph belongs to the unloaded model; its kernels stay on disk
+            self.compiled = None
+            if self.speculative is not None:
+                self.speculative.model = None
+            if self.prefix_cache is not None:
+                # Cached attention states belong to the unloaded weights
+                self.prefix_cache.clear()
+            gc.collect()
             if torch.cuda.is_available():
-                self.device = torch.device("cuda")
-                print("✅ Using GPU acceleration (CUDA)")
-            elif hasattr(torch.backends, 'mps') and torch.backends.mps.is_available():
-                self.device = torch.device("mps")
-                print("✅ Using Apple Silicon acceleration (MPS)")
-            else:
-                self.device = torch.device("cpu")
-                print("⚠️ Using CPU (GPU not available)")
+                torch.cuda.empty_cache()
+            logger.info(f"♻️ Unloaded model {self.model_name}")
+
+    def start_background_load(self) -> threading.Thread:
+        """
+        Load the model in a daemon thread so callers (e.g. a web server) can start immediately.
+        
+        Failures are recorded in ``load_error``; generation calls retry the load.
+        
+        Returns:
+            The loading thread
+        """
+        def run():
+            try:
+                self.load_model()
+            except Exception:
+                pass  # recorded in self.load_error by load_model
                 
-            self.model = self.model.to(self.device)
-            
-        except Exception as e:
-            print(f"❌ Error loading model: {str(e)}")
-            raise
+        thread = threading.Thread(target=run, name="model-loader", daemon=True)
+        thread.start()
+        return thread
+        
+    def _build_prompt_compiler(self, tokenizer: Any) -> PromptCompiler:
+        """
+        Pre-tokenize the static prompt segments for ``tokenizer``.
+        
+        Registers the chat markup, the day, meal and guidance structures and
+        every cuisine guideline, then checks sample prompts assemble to the
+        same ids as whole-prompt tokenization. Guidelines over their token
+        budget are shortened (with a warning) in ``cuisine_guidelines`` too,
+        so prompts stay within budget instead of failing the load.
+        """
+        start = time.perf_counter()
+        compiler = PromptCompiler(tokenizer, CHAT_HEAD)
+        compiler.register("chat", CHAT_TAIL, ends_prompt=True)
+        for structure in (DAY_MEAL_STRUCTURE, MEAL_DETAILS, GUIDANCE_STRUCTURE):
+            compiler.register("structure", structure)
+        guidelines = {DEFAULT_GUIDELINES}
+        guidelines.update(text for diets in self.cuisine_guidelines.values() for text in diets.values())
+        shortened = {}
+        for text in sorted(guidelines):
+            registered = compiler.register("guidelines", text)
+            if registered != segment_lines(text):
+                shortened[text] = text[:text.find(registered) + len(registered)]
+        if shortened:
+            self.cuisine_guidelines = {
+                cuisine: {diet: shortened.get(text, text) for diet, text in diets.items()}
+                for cuisine, diets in self.cuisine_guidelines.items()
+            }
             
-        # Load cuisine guidelines from external file if available
-        self.cuisine_guidelines = self._load_cuisine_guidelines()
+        cuisine = next(iter(self.cuisine_guidelines), "indian")
+        diet = next(iter(self.cuisine_guidelines.get(cuisine, {})), "vegetarian")
+        sample = self.build_plan_prompts("weight loss", 1, diet, cuisine, ["peanuts"], "1800 kcal")
+        samples = sample["day_prompts"] + [sample["guidance_prompt"],
+                                           self.build_meal_prompt(sample["shared_prefix"], 1, DAY_SECTIONS[0])]
+        compiler.verify([self.format_prompt(prompt) for prompt in samples])
         
+        stats = compiler.stats()
+        logger.info(f"✅ Pre-tokenized {stats['segments']} prompt segments ({stats['segment_tokens']} tokens) "
+                    f"in {time.perf_counter() - start:.2f}s")
+        return compiler
+
     def _load_cuisine_guidelines(self) -> Dict[str, Dict[str, str]]:
         """Load cuisine guidelines from a JSON file if available, otherwise use defaults."""
         try:
@@ -56,7 +467,7 @@ class MealPlanGenerator:
                 with open("cuisine_guidelines.json", "r", encoding="utf-8") as f:
                     return json.load(f)
         except Exception as e:
-            print(f"⚠️ Could not load cuisine guidelines: {str(e)}")
+            logger.warning(f"⚠️ Could not load cuisine guidelines: {str(e)}")
             
         # Default guidelines if file not available
         return {
@@ -134,8 +545,7 @@ class MealPlanGenerator:
             String containing guidelines or default text if not found
         """
         return self.cuisine_guidelines.get(cuisine_style.lower(), {}).get(
-            dietary_preference.lower(), 
-            "Default guidelines - adapt recipes to meet nutritional requirements for the specified goal."
+            dietary_preference.lower(), DEFAULT_GUIDELINES
         )
 
     def format_prompt(self, prompt: str) -> str:
@@ -148,126 +558,500 @@ class MealPlanGenerator:
         Returns:
             Formatted prompt ready for the model
         """
-        return f"<|system|>You are a professional nutritionist and chef. Your goal is to create detailed, healthy, and practical meal plans.</s><|user|>{prompt}</s><|assistant|>"
+        return f"{CHAT_HEAD}{prompt}{CHAT_TAIL}"
 
     def generate_text(self, prompt: str, max_tokens: int = 2048, 
-                     temperature: float = 0.8, top_p: float = 0.95) -> str:
+                     temperature: Optional[float] = None, top_p: Optional[float] = None,
+                     prefix: Optional[str] = None, profile: Optional[str] = None,
+                     streamer: Optional[Any] = None) -> str:
         """
         Generate text using the language model.
         
         Args:
             prompt: The prompt to send to the model
             max_tokens: Maximum number of tokens to generate
-            temperature: Controls randomness (lower is more deterministic)
-            top_p: Nucleus sampling parameter
+            temperature: Controls randomness (defaults to the profile's value)
+            top_p: Nucleus sampling parameter (defaults to the profile's value)
+            prefix: Optional leading part of ``prompt`` shared with other calls,
+                whose attention state is cached and reused
+            profile: Name of a decoding profile in ``DECODING_PROFILES``
+            streamer: Optional ``TextIteratorStreamer``-style object that receives
+                tokens as they are generated (single-beam profiles only)
             
         Returns:
             Generated text response
         """
-        formatted_prompt = self.format_prompt(prompt)
+        texts, _ = self._generate([prompt], max_tokens, temperature, top_p,
+                                  batch_size=1, prefix=prefix, profile=profile,
+                                  streamer=streamer)
+        return texts[0]
+
+    def generate_texts(self, prompts: List[str], max_tokens: int = 2048,
+                       temperature: Optional[float] = None, top_p: Optional[float] = None,
+                       batch_size: int = 4, prefix: Optional[str] = None,
+                       profile: Optional[str] = None) -> List[str]:
+        """
+        Generate text for several prompts using batched model calls.
         
-        try:
-            inputs = self.tokenizer(formatted_prompt, return_tensors="pt", 
-                                   padding=True, truncation=True, max_length=2048)
-            input_length = inputs['input_ids'].shape[1]
-            inputs = {k: v.to(self.device) for k, v in inputs.items()}
-            
-            # Calculate available token space
-            max_new_tokens = min(1500, 2048 - input_length)
-            
-            # Generation with progress indicator
-            print(f"🔄 Generating content (max {max_new_tokens} new tokens)...")
-            
-            with torch.no_grad():
-                outputs = self.model.generate(
-                    **inputs,
-                    max_new_tokens=max_new_tokens,
-                    temperature=temperature,
-                    top_p=top_p,
-                    top_k=100,
-                    repetition_penalty=1.3,
-                    no_repeat_ngram_size=3,
-                    num_beams=5,
-                    length_penalty=1.2,
-                    do_sample=True,
-                    pad_token_id=self.tokenizer.eos_token_id
-                )
-            
-            generated_tokens = outputs[0][input_length:]
-            return self.tokenizer.decode(generated_tokens, skip_special_tokens=True)
+        Prompts are left-padded and run through ``model.generate`` in chunks of
+        ``batch_size``, so N prompts cost ceil(N / batch_size) generate calls
+        instead of N.
+        
+        Args:
+            prompts: The prompts to send to the model
+            max_tokens: Maximum number of tokens to generate
+            temperature: Controls randomness (defaults to the profile's value)
+            top_p: Nucleus sampling parameter (defaults to the profile's value)
+            batch_size: Number of prompts per ``model.generate`` call
+            prefix: Optional leading part shared by all ``prompts``, whose
+                attention state is cached and reused
+            profile: Name of a decoding profile in ``DECODING_PROFILES``
             
+        Returns:
+            Generated text responses, in the same order as ``prompts``
+        """
+        texts, _ = self._generate(prompts, max_tokens, temperature, top_p,
+                                  batch_size=batch_size, prefix=prefix, profile=profile)
+        return texts
+
+    def _generate(self, prompts: List[str], max_tokens: int = 2048,
+                  temperature: Optional[float] = None, top_p: Optional[float] = None,
+                  batch_size: int = 1, prefix: Optional[str] = None,
+                  profile: Optional[str] = None,
+                  streamer: Optional[Any] = None,
+                  progress_callback: Optional[Callable[[int], None]] = None,
+                  stop_specs: Optional[List[Optional[SectionSpec]]] = None,
+                  cancel_events: Optional[List[Optional[threading.Event]]] = None) -> Tuple[List[str], Dict[str, Any]]:
+        """
+        Run prompts through the model and measure decoding throughput.
+        
+        ``progress_callback``, if given, is called with the number of prompts
+        finished so far after each batch. ``stop_specs``, if given, holds one
+        ``SectionSpec`` (or None) per prompt; matching rows stop at section
+        boundaries, repeated sections or their token budget, and their text is
+        cut where the section should have ended. ``cancel_events``, if given,
+        holds one ``threading.Event`` (or None) per prompt; once it is set the
+        prompt's rows stop at the next token (or are skipped if not started yet)
+        with the stop reason "cancelled". Worker processes cannot see the
+        events, so with a worker pool a call is only skipped, raising
+        ``GenerationCancelled``, when all of its prompts were cancelled before
+        it was sent. Single-prompt, single-beam chunks use the draft
+        model, if one is loaded and currently faster; other chunks decode
+        through the compiled graph with the "compile" backend.
+        
+        Returns:
+            Tuple of (generated texts in prompt order, generation stats with
+            the profile used, generated token counts, prompt tokens and their
+            segment usage (in total and per prompt), stop reasons, seconds,
+            tokens/sec and draft tokens proposed and accepted)
+        """
+        profile = profile or self.decoding_profile
+        if profile not in DECODING_PROFILES:
+            raise ValueError(f"Unknown decoding profile '{profile}'. "
+                             f"Choose from: {', '.join(DECODING_PROFILES)}")
+        if self.worker_pool is not None and streamer is None:
+            if cancel_events and all(event is not None and event.is_set() for event in cancel_events):
+                raise_if_cancelled(cancel_events[0])
+            results, stats = self.worker_pool.generate(prompts, max_tokens, temperature, top_p,
+                                                       batch_size, prefix, profile, stop_specs)
+            record_generation(stats)
+            if progress_callback is not None:
+                progress_callback(len(results))
+            return results, stats
+        self.load_model()
+        batch_size = max(1, batch_size)
+        if self.fake is not None:
+            return self._generate_fake(prompts, max_tokens, batch_size, profile, streamer,
+                                       progress_callback, stop_specs, cancel_events)
+        results = []
+        row_tokens = []
+        stop_reasons = []
+        row_prompt_tokens: List[int] = []
+        row_prompt_segments: List[Dict[str, int]] = []
+        tokenize_seconds = 0.0
+        prefill_seconds = 0.0
+        decode_seconds = 0.0
+        draft_calls = draft_proposed = draft_accepted = 0
+        start_time = time.perf_counter()
+        
+        try:
+            for start in range(0, len(prompts), batch_size):
+                chunk = prompts[start:start + batch_size]
+                chunk_specs = stop_specs[start:start + batch_size] if stop_specs else [None] * len(chunk)
+                chunk_events = cancel_events[start:start + batch_size] if cancel_events else [None] * len(chunk)
+                if all(event is not None and event.is_set() for event in chunk_events):
+                    # Nobody is waiting for these prompts any more
+                    row_tokens.extend([0] * len(chunk))
+                    row_prompt_tokens.extend([0] * len(chunk))
+                    row_prompt_segments.extend({} for _ in chunk)
+                    stop_reasons.extend(["cancelled"] * len(chunk))
+                    results.extend([""] * len(chunk))
+                    continue
+                chunk_start = time.perf_counter()
+                # Assisted generation drafts for one single-beam sequence at a time
+                speculative = (self.speculative if self.speculative is not None and len(chunk) == 1
+                               and DECODING_PROFILES[profile]["num_beams"] == 1 else None)
+                assisted = speculative is not None and speculative.choose()
+                compiled = self.compiled is not None and not assisted
+                _prefix_timing.seconds = 0.0
+                _prompt_usage.prompts = []
+                # The draft model has no cache for the shared prefix, and the compiled graph decodes
+                # into its own static cache, so those calls encode the prefix in full
+                inputs, past_key_values = self._prepare_inputs(chunk, None if assisted or compiled else prefix)
+                prepared = time.perf_counter()
+                # Building a missing prefix cache is a forward pass, so it counts as prefill
+                tokenize_seconds += prepared - chunk_start - _prefix_timing.seconds
+                prefill_seconds += _prefix_timing.seconds
+                row_prompt_tokens.extend(int(tokens) for tokens in inputs["attention_mask"].sum(dim=1))
+                # A prefix that turns out not to be shared compiles the chunk a second time
+                row_prompt_segments.extend(dict(compiled_prompt.usage)
+                                           for compiled_prompt in _prompt_usage.prompts[-len(chunk):])
+                # Every row's continuation starts at the same offset
+                input_length = inputs['input_ids'].shape[1]
+                
+                # Calculate available token space; max_tokens caps every profile
+                max_new_tokens = min(DECODING_PROFILES[profile]["max_new_tokens"], max_tokens,
+                                     MAX_CONTEXT_TOKENS - input_length)
+                if all(spec is not None for spec in chunk_specs):
+                    max_new_tokens = min(max_new_tokens, max(spec.token_budget for spec in chunk_specs))
+                
+                # Generation with progress indicator
+                if len(chunk) == 1:
+                    logger.info(f"🔄 Generating content with '{profile}' profile (max {max_new_tokens} new tokens)...")
+                else:
+                    logger.info(f"🔄 Generating batch of {len(chunk)} with '{profile}' profile (max {max_new_tokens} new tokens)...")
+                
+                generation_kwargs = self._generation_kwargs(profile, max_new_tokens, temperature, top_p)
+                if streamer is not None:
+                    generation_kwargs["streamer"] = streamer
+                # Prefill runs until the first next-token scores; everything after is decode
+                step_timer = _FirstStepTimer()
+                generation_kwargs["logits_processor"] = LogitsProcessorList([step_timer])
+                stopping_criteria = StoppingCriteriaList()
+                if any(spec is not None for spec in chunk_specs):
+                    stopping_criteria.append(SectionStoppingCriteria(self.tokenizer, chunk_specs, input_length))
+                if any(event is not None for event in chunk_events):
+                    stopping_criteria.append(CancellationStoppingCriteria(chunk_events))
+                if stopping_criteria:
+                    generation_kwargs["stopping_criteria"] = stopping_criteria
+                if assisted:
+                    generation_kwargs.update(speculative.generation_kwargs(self.tokenizer))
+                if speculative is not None:
+                    speculative.begin()
+                outputs = self._run_generate(inputs, past_key_values, generation_kwargs, compiled)
+                chunk_end = time.perf_counter()
+                prefill_end = step_timer.first_step or chunk_end
+                prefill_seconds += prefill_end - prepared
+                decode_seconds += chunk_end - prefill_end
+                
+                for row, spec, event in zip(outputs, chunk_specs, chunk_events):
+                    new_tokens = row[input_length:]
+                    token_count = int((new_tokens != self.tokenizer.pad_token_id).sum())
+                    text = self.tokenizer.decode(new_tokens, skip_special_tokens=True)
+                    reason = None
+                    if spec is not None:
+                        text, reason = spec.scan(text)
+                    if event is not None and event.is_set():
+                        reason = "cancelled"
+                    elif reason is None:
+                        if spec is not None and token_count >= spec.token_budget:
+                            reason = "token_budget"
+                        elif token_count >= max_new_tokens:
+                            reason = "max_tokens"
+                        else:
+                            reason = "eos"
+                    row_tokens.append(token_count)
+                    stop_reasons.append(reason)
+                    results.append(text)
+                    
+                if speculative is not None:
+                    # Decode time only: plain calls reuse the prefix cache, assisted calls encode the whole prompt
+                    proposed, accepted = speculative.finish(assisted, row_tokens[-1], chunk_end - prefill_end)
+                    draft_calls += int(assisted)
+                    draft_proposed += proposed
+                    draft_accepted += accepted
+                    
+                if progress_callback is not None:
+                    progress_callback(len(results))
+                    
         except Exception as e:
-            print(f"❌ Error during text generation: {str(e)}")
+            logger.error(f"❌ Error during text generation: {str(e)}", extra={"error_type": type(e).__name__})
             raise
+            
+        elapsed = time.perf_counter() - start_time
+        generated_tokens = sum(row_tokens)
+        prompt_segments: Dict[str, int] = {}
+        for usage in row_prompt_segments:
+            for kind, tokens in usage.items():
+                prompt_segments[kind] = prompt_segments.get(kind, 0) + tokens
+        stats = {
+            "profile": profile,
+            "generated_tokens": generated_tokens,
+            "row_tokens": row_tokens,
+            "stop_reasons": stop_reasons,
+            "prompt_tokens": sum(row_prompt_tokens),
+            "prompt_segments": prompt_segments,
+            "row_prompt_tokens": row_prompt_tokens,
+            "row_prompt_segments": row_prompt_segments,
+            "seconds": round(elapsed, 3),
+            "tokenize_seconds": round(tokenize_seconds, 3),
+            "prefill_seconds": round(prefill_seconds, 3),
+            "decode_seconds": round(decode_seconds, 3),
+            "tokens_per_sec": round(generated_tokens / elapsed, 2) if elapsed > 0 else 0.0,
+            "draft_calls": draft_calls,
+            "draft_proposed": draft_proposed,
+            "draft_accepted": draft_accepted,
+            "draft_speedup": self.speculative.speedup if self.speculative is not None else None
+        }
+        logger.info(f"✅ Generated {generated_tokens} tokens in {elapsed:.1f}s ({stats['tokens_per_sec']} tokens/sec)",
+                    extra={k: v for k, v in stats.items()
+                           if k not in ("row_tokens", "stop_reasons", "prompt_segments", "row_prompt_tokens",
+                                        "row_prompt_segments")})
+        record_generation(stats)
+        return results, stats
+
+    def _generate_fake(self, prompts: List[str], max_tokens: int, batch_size: int, profile: str,
+                       streamer: Optional[Any], progress_callback: Optional[Callable[[int], None]],
+                       stop_specs: Optional[List[Optional[SectionSpec]]],
+                       cancel_events: Optional[List[Optional[threading.Event]]]) -> Tuple[List[str], Dict[str, Any]]:
+        """Run prompts through the fake backend in ``batch_size`` chunks; same contract as ``_generate``."""
+        results: List[str] = []
+        call_stats = []
+        max_new_tokens = min(DECODING_PROFILES[profile]["max_new_tokens"], max_tokens)
+        for start in range(0, len(prompts), batch_size):
+            chunk = slice(start, start + batch_size)
+            texts, stats = self.fake.generate(prompts[chunk], max_new_tokens, profile, streamer=streamer,
+                                              stop_specs=stop_specs[chunk] if stop_specs else None,
+                                              cancel_events=cancel_events[chunk] if cancel_events else None)
+            results.extend(texts)
+            call_stats.append(stats)
+            if progress_callback is not None:
+                progress_callback(len(results))
+        
+        stats = dict(call_stats[0]) if call_stats else {"profile": profile, "draft_speedup": None}
+        for key in ("generated_tokens", "prompt_tokens", "draft_calls", "draft_proposed", "draft_accepted"):
+            stats[key] = sum(s[key] for s in call_stats)
+        for key in ("seconds", "tokenize_seconds", "prefill_seconds", "decode_seconds"):
+            stats[key] = round(sum(s[key] for s in call_stats), 3)
+        for key in ("row_tokens", "stop_reasons", "row_prompt_tokens", "row_prompt_segments"):
+            stats[key] = [row for s in call_stats for row in s[key]]
+        stats["tokens_per_sec"] = round(stats["generated_tokens"] / stats["seconds"], 2) if stats["seconds"] > 0 else 0.0
+        record_generation(stats)
+        return results, stats
+
+    def _prepare_inputs(self, prompts: List[str],
+                        prefix: Optional[str] = None) -> Tuple[Dict[str, torch.Tensor], Optional[Any]]:
+        """
+        Tokenize prompts for generation, reusing a cached prefix when possible.
+        
+        Token ids are assembled from the pre-tokenized template segments by
+        the ``PromptCompiler``, within its per-segment token budgets; prompts
+        whose request text is over budget raise ``PromptTooLongError``.
+        
+        Args:
+            prompts: Raw prompts to format and tokenize
+            prefix: Optional leading text shared by all prompts
+            
+        Returns:
+            Tuple of (model inputs on the target device, past_key_values or None)
+        """
+        formatted_prompts = [self.format_prompt(p) for p in prompts]
+        
+        if prefix and self.prefix_cache is not None and all(p.startswith(prefix) for p in prompts):
+            prepared = self._prepare_inputs_with_prefix(formatted_prompts, prefix)
+            if prepared is not None:
+                return prepared
+                
+        rows = [self._compile_prompt(text).input_ids for text in formatted_prompts]
+        width = max(len(row) for row in rows)
+        pad_id = self.tokenizer.pad_token_id
+        inputs = {
+            "input_ids": torch.tensor([[pad_id] * (width - len(row)) + row for row in rows], device=self.device),
+            "attention_mask": torch.tensor([[0] * (width - len(row)) + [1] * len(row) for row in rows],
+                                           device=self.device)
+        }
+        return inputs, None
+
+    def _compile_prompt(self, formatted_prompt: str) -> CompiledPrompt:
+        """Assemble a formatted prompt's token ids, noting its segment usage for this thread's stats."""
+        compiled_prompt = self.prompt_compiler.compile(formatted_prompt)
+        if hasattr(_prompt_usage, "prompts"):
+            _prompt_usage.prompts.append(compiled_prompt)
+        return compiled_prompt
+
+    def _prepare_inputs_with_prefix(self, formatted_prompts: List[str],
+                                    prefix: str) -> Optional[Tuple[Dict[str, torch.Tensor], Any]]:
+        """
+        Build inputs whose leading tokens are covered by a cached prefix.
+        
+        Rows are laid out as ``[prefix | padding | suffix]`` so the shared prefix
+        sits at the same positions in every row and one cached attention state
+        serves the whole batch.
+        
+        Args:
+            formatted_prompts: Prompts already wrapped by ``format_prompt``
+            prefix: Raw prefix text shared by all prompts
+            
+        Returns:
+            Tuple of (model inputs, copied past_key_values) or None if the
+            tokenized prompts do not share enough of the cached prefix
+        """
+        first = formatted_prompts[0]
+        formatted_prefix = first[:first.index(prefix) + len(prefix)]
+        prefix_ids, cached = self._get_prefix_cache(formatted_prefix)
+        
+        rows = [self._compile_prompt(text).input_ids for text in formatted_prompts]
+        
+        # Token merges at the prefix boundary can differ from the standalone
+        # prefix encoding, so only reuse the positions where every row agrees
+        common = len(prefix_ids)
+        for row in rows:
+            matched = 0
+            for a, b in zip(prefix_ids, row):
+                if a != b:
+                    break
+                matched += 1
+            common = min(common, matched, len(row) - 1)
+        if common <= 0:
+            return None
+            
+        pad_id = self.tokenizer.pad_token_id
+        suffixes = [row[common:] for row in rows]
+        width = max(len(suffix) for suffix in suffixes)
+        input_ids = [prefix_ids[:common] + [pad_id] * (width - len(suffix)) + suffix for suffix in suffixes]
+        attention_mask = [[1] * common + [0] * (width - len(suffix)) + [1] * len(suffix) for suffix in suffixes]
+        
+        # generate() extends the cache in place, so hand it a private copy
+        past_key_values = copy.deepcopy(cached)
+        if common < len(prefix_ids):
+            past_key_values.crop(common - len(prefix_ids))
+            
+        inputs = {
+            "input_ids": torch.tensor(input_ids, device=self.device),
+            "attention_mask": torch.tensor(attention_mask, device=self.device)
+        }
+        return inputs, past_key_values
+
+    def _get_prefix_cache(self, formatted_prefix: str) -> Tuple[List[int], Any]:
+        """
+        Return the cached attention state for a prefix, computing it on a miss.
+        
+        Args:
+            formatted_prefix: The leading part of a formatted prompt
+            
+        Returns:
+            Tuple of (prefix token ids, past_key_values)
+        """
+        entry = self.prefix_cache.get(formatted_prefix)
+        if entry is not None:
+            CACHE_LOOKUPS.inc(cache="prefix", outcome="hit")
+            return entry
+        CACHE_LOOKUPS.inc(cache="prefix", outcome="miss")
+            
+        start = time.perf_counter()
+        prefix_ids = self.prompt_compiler.compile(formatted_prefix).input_ids
+        with torch.no_grad():
+            outputs = self.model(
+                input_ids=torch.tensor([prefix_ids], device=self.device),
+                past_key_values=DynamicCache(),
+                use_cache=True
+            )
+        self.prefix_cache.put(formatted_prefix, prefix_ids, outputs.past_key_values)
+        _prefix_timing.seconds = getattr(_prefix_timing, "seconds", 0.0) + time.perf_counter() - start
+        return prefix_ids, outputs.past_key_values
+
+    def _run_generate(self, inputs: Dict[str, torch.Tensor], past_key_values: Optional[Any],
+                      generation_kwargs: Dict[str, Any], compiled: bool = False) -> torch.Tensor:
+        """
+        Call ``model.generate``, expanding a reused prefix cache to the batch.
+        
+        Args:
+            inputs: Tokenized model inputs
+            past_key_values: Optional prefilled cache with batch size 1
+            generation_kwargs: Keyword arguments for ``model.generate``
+            compiled: Decode through the compiled graph (needs ``past_key_values`` None)
+            
+        Returns:
+            Generated token ids including the prompt
+        """
+        if compiled:
+            return self.compiled.generate(self.model, inputs, generation_kwargs)
+        if past_key_values is not None:
+            # generate() does not expand caches it is handed, so match rows x beams here
+            expand = inputs["input_ids"].shape[0] * generation_kwargs.get("num_beams", 1)
+            if expand > 1:
+                past_key_values.batch_repeat_interleave(expand)
+            generation_kwargs = dict(generation_kwargs, past_key_values=past_key_values)
+            
+        with torch.no_grad():
+            return self.model.generate(**inputs, **generation_kwargs)
+
+    def _generation_kwargs(self, profile: str, max_new_tokens: int,
+                           temperature: Optional[float] = None,
+                           top_p: Optional[float] = None) -> Dict[str, Any]:
+        """Build the keyword arguments passed to ``model.generate`` for a decoding profile."""
+        settings = DECODING_PROFILES[profile]
+        kwargs = {
+            "max_new_tokens": max_new_tokens,
+            "num_beams": settings["num_beams"],
+            "do_sample": settings["do_sample"],
+            "repetition_penalty": settings["repetition_penalty"],
+            "no_repeat_ngram_size": settings["no_repeat_ngram_size"],
+            "pad_token_id": self.tokenizer.pad_token_id
+        }
+        if settings["num_beams"] > 1:
+            kwargs["length_penalty"] = settings["length_penalty"]
+        if settings["do_sample"]:
+            kwargs["temperature"] = temperature if temperature is not None else settings["temperature"]
+            kwargs["top_p"] = top_p if top_p is not None else settings["top_p"]
+            kwargs["top_k"] = settings["top_k"]
+        return kwargs
 
     def save_meal_plan_to_file(self, meal_plan: str, filename: Optional[str] = None, 
                               metadata: Optional[Dict[str, Any]] = None) -> str:
         """
         Save the generated meal plan to a file.
         
+        The plan is handed to ``plan_writer``, which writes it in the
+        background; the file appears shortly after the path is returned
+        (``plan_writer.wait(path)`` waits for it and reports where it ended up).
+        
         Args:
             meal_plan: The generated meal plan text
-            filename: Optional custom filename, otherwise auto-generated
+            filename: Optional custom filename, otherwise named after the content hash
             metadata: Optional metadata to include in the saved file
             
         Returns:
-            Path to the saved file
+            Path the plan is saved to
         """
+        save_start = time.perf_counter()
         try:
-            # Create output directory if it doesn't exist
-            output_dir = "meal_plans"
-            os.makedirs(output_dir, exist_ok=True)
-            
-            # Generate filename if not provided
-            if not filename:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                goal = metadata.get("goal", "custom").lower().replace(" ", "_") if metadata else "plan"
-                cuisine = metadata.get("cuisine_style", "").lower() if metadata else ""
-                filename = f"{output_dir}/meal_plan_{cuisine}_{goal}_{timestamp}.md"
-            elif not os.path.dirname(filename):
-                # If only filename provided without path, put in output directory
-                filename = f"{output_dir}/{filename}"
-                
-            # Add markdown frontmatter with metadata if available
-            final_content = meal_plan
-            if metadata:
-                frontmatter = "---\n"
-                for k, v in metadata.items():
-                    if isinstance(v, list):
-                        frontmatter += f"{k}: [{', '.join(v)}]\n"
-                    else:
-                        frontmatter += f"{k}: {v}\n"
-                frontmatter += "---\n\n"
-                final_content = frontmatter + meal_plan
-            
-            with open(filename, "w", encoding="utf-8") as file:
-                file.write(final_content)
-                
-            print(f"✅ Meal plan saved to {filename}")
+            on_saved = self._index_saved_plan if self.recipe_index is not None else None
+            filename = self.plan_writer.save_plan(meal_plan, metadata=metadata, filename=filename, on_saved=on_saved)
+            STAGE_SECONDS.observe(time.perf_counter() - save_start, stage="save")
             return filename
             
         except Exception as e:
-            print(f"❌ Failed to save meal plan: {str(e)}")
-            fallback_filename = "meal_plan_emergency_backup.txt"
-            try:
-                with open(fallback_filename, "w", encoding="utf-8") as file:
-                    file.write(meal_plan)
-                print(f"⚠️ Emergency backup saved to {fallback_filename}")
-                return fallback_filename
-            except:
-                print("❌ Could not save backup file either")
-                return None
+            logger.error(f"❌ Failed to queue meal plan for saving: {str(e)}")
+            ERRORS.inc(type=type(e).__name__)
+            return None
 
-    def generate_meal_plan(self, 
-                          goal: str = "muscle gain",
-                          days: int = 3, 
-                          dietary_preference: str = "non-vegetarian",
-                          cuisine_style: str = "indian", 
-                          allergies: Optional[List[str]] = None,
-                          calories: Union[str, int] = "2500-3000",
-                          max_tokens: int = 2048) -> Dict[str, Any]:
+    def _index_saved_plan(self, path: str, content: str) -> None:
+        """Add a plan to the recipe index once the writer has saved it."""
+        try:
+            self.recipe_index.add_plan(path)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not add plan to the recipe index: {str(e)}")
+
+    def build_plan_prompts(self,
+                           goal: str,
+                           days: int,
+                           dietary_preference: str,
+                           cuisine_style: str,
+                           allergies: List[str],
+                           calorie_info: str) -> Dict[str, Any]:
         """
-        Generate a complete customized meal plan.
+        Build the raw prompts used to generate a meal plan.
         
         Args:
             goal: Nutritional goal (e.g., "muscle gain", "weight loss")
@@ -275,21 +1059,13 @@ class MealPlanGenerator:
             dietary_preference: Dietary preference (e.g., "vegetarian")
             cuisine_style: Preferred cuisine style
             allergies: List of allergies or dietary restrictions
-            calories: Target calorie range (either string range or specific int)
-            max_tokens: Maximum tokens for generation
+            calorie_info: Human-readable calorie target
             
         Returns:
-            Dictionary with status, meal plan, and metadata
+            Dictionary with the shared prompt prefix, one prompt per day, the
+            additional guidance prompt, and one ``SectionSpec`` per section
+            (days, then guidance)
         """
-        if allergies is None:
-            allergies = []
-            
-        # Validate inputs
-        days = max(1, min(14, days))  # Limit days to reasonable range
-        
-        # Format calorie information
-        calorie_info = f"between {calories} kcal" if isinstance(calories, str) else f"approximately {calories} kcal"
-        
         # Base prompt with more context
         base_prompt = f"""You are a Certified Nutritionist & Chef specializing in {cuisine_style.title()} cuisine 
 with expertise in {dietary_preference} diets. Design a detailed and practical meal plan optimized 
@@ -312,129 +1088,393 @@ cultural authenticity. Balance nutrition with practicality and taste.
 {self.get_cuisine_guidelines(cuisine_style, dietary_preference)}
 """
 
-        # Day meal structure template
-        day_meal_structure = """
-### Detailed Meal Plan for Day {day}
+        # Every prompt starts with this text, so its attention state can be cached
+        shared_prefix = f"{base_prompt}\n{dietary_requirements}\n"
+        day_prompts = [
+            f"{shared_prefix}\n### Detailed Meal Plan for Day {day}\n\n{DAY_MEAL_STRUCTURE}"
+            for day in range(1, days + 1)
+        ]
 
-Provide the following meals with complete details:
+        general_sections_prompt = f"""{base_prompt}
+{dietary_requirements}
 
-1. **Breakfast** (Morning Energy Boost)
-   - Main dish with protein source
-   - Side items and beverages
-   - Timing: Early morning meal
-   
-2. **Mid-Morning Snack**
-   - Light, nutritious options
-   - Protein or fruit-based choices
-   
-3. **Lunch** (Mid-day Fuel)
-   - Complete main course
-   - Side dishes and accompaniments
-   - Recommended beverages
-   
-4. **Evening Snack**
-   - Energy-sustaining options
-   - Small but satisfying portions
-   
-5. **Dinner** (Evening Nourishment)
-   - Full main course
-   - Balanced side dishes
-   - Light beverage options
+Provide the following practical guidance sections for the entire {days}-day meal plan:
 
-For each meal, include:
-1. 🍽️ **Recipe Name & Description**
-2. ⚖️ **Exact Portions & Measurements**
-3. 📊 **Complete Nutritional Breakdown**
-   - Calories: exact kcal
-   - Protein: g
-   - Carbs: g
-   - Fats: g
-   - Fiber: g
-4. 🥘 **Ingredients List**
-5. 👩‍🍳 **Preparation Steps** (step-by-step with precise cooking times and techniques)
-6. ⌚ **Timing Guidelines**
-7. 💡 **Tips & Substitutions**
-"""
+{GUIDANCE_STRUCTURE}"""
+        return {
+            "shared_prefix": shared_prefix,
+            "day_prompts": day_prompts,
+            "guidance_prompt": general_sections_prompt,
+            "section_specs": [SectionSpec.for_day(day) for day in range(1, days + 1)] + [SectionSpec.for_guidance()]
+        }
+
+    def build_meal_prompt(self, shared_prefix: str, day: int, slot: str) -> str:
+        """
+        Build the prompt for a single meal of a day, used to fill gaps in an indexed plan.
+        
+        Args:
+            shared_prefix: Shared prompt prefix from ``build_plan_prompts``
+            day: Day number
+            slot: Meal slot from ``DAY_SECTIONS``
+        """
+        return (f"{shared_prefix}\n### {slot} for Day {day}\n\n"
+                f"Provide only the {slot} for this day, with complete details:\n{MEAL_DETAILS}")
+
+    def _plan_header(self, goal: str, days: int, dietary_preference: str, cuisine_style: str,
+                     allergies: List[str], calorie_info: str) -> str:
+        """Build the markdown title and overview that precede the generated days."""
+        header = f"# {days}-Day {cuisine_style.title()} {dietary_preference.title()} Meal Plan for {goal.title()}\n\n"
+        header += f"*Generated on {datetime.now().strftime('%B %d, %Y')}*\n\n"
+        header += "## Overview\n\n"
+        header += f"This meal plan is designed for {goal} with {cuisine_style.title()} cuisine adapted for a {dietary_preference} diet.\n\n"
+        
+        if allergies:
+            header += f"**Allergies/Restrictions:** {', '.join(allergies)}\n\n"
+            
+        header += f"**Target Daily Calories:** {calorie_info}\n\n"
+        header += "---\n\n"
+        return header
+
+    def _plan_metadata(self, goal: str, days: int, dietary_preference: str, cuisine_style: str,
+                       calories: Union[str, int], allergies: List[str], decoding_profile: Optional[str],
+                       call_stats: List[Dict[str, Any]],
+                       stop_reasons: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Build the metadata saved with a plan, including aggregate decoding throughput
+        and prompt token usage per segment kind.
+        
+        ``stop_reasons`` lists why each section (days, then guidance) stopped.
+        """
+        generated_tokens = sum(stats["generated_tokens"] for stats in call_stats)
+        generation_seconds = sum(stats["seconds"] for stats in call_stats)
+        prompt_segments: Dict[str, int] = {}
+        for stats in call_stats:
+            for kind, tokens in stats.get("prompt_segments", {}).items():
+                prompt_segments[kind] = prompt_segments.get(kind, 0) + tokens
+        return {
+            "goal": goal,
+            "days": days,
+            "dietary_preference": dietary_preference,
+            "cuisine_style": cuisine_style,
+            "calories": calories,
+            "allergies": allergies,
+            "generation_date": datetime.now().strftime("%Y-%m-%d"),
+            "model": self.model_name,
+            "precision": self.active_precision,
+            "inference_backend": self.inference_backend if self.compiled is not None else "eager",
+            "decoding_profile": call_stats[0]["profile"] if call_stats else (decoding_profile or self.decoding_profile),
+            "generated_tokens": generated_tokens,
+            "tokens_per_sec": round(generated_tokens / generation_seconds, 2) if generation_seconds > 0 else 0.0,
+            "prompt_tokens": sum(stats.get("prompt_tokens", 0) for stats in call_stats),
+            "prompt_segments": prompt_segments,
+            "prefill_seconds": round(sum(stats.get("prefill_seconds", 0.0) for stats in call_stats), 3),
+            "decode_seconds": round(sum(stats.get("decode_seconds", 0.0) for stats in call_stats), 3),
+            "stop_reasons": stop_reasons if stop_reasons is not None else
+                [reason for stats in call_stats for reason in stats.get("stop_reasons", [])],
+            **self._draft_metadata(call_stats)
+        }
+
+    def _draft_metadata(self, call_stats: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Summarize assisted generation across model calls, if a draft model is configured."""
+        if not self.draft_model_name:
+            return {}
+        proposed = sum(stats.get("draft_proposed", 0) for stats in call_stats)
+        accepted = sum(stats.get("draft_accepted", 0) for stats in call_stats)
+        speedups = [stats["draft_speedup"] for stats in call_stats if stats.get("draft_speedup") is not None]
+        return {
+            "draft_model": self.draft_model_name,
+            "draft_calls": sum(stats.get("draft_calls", 0) for stats in call_stats),
+            "draft_acceptance_rate": round(accepted / proposed, 3) if proposed else 0.0,
+            "draft_speedup": speedups[-1] if speedups else 0.0
+        }
+
+    def _generate_sections(self, section_prompts: List[str], labels: List[str], max_tokens: int,
+                           prefix: Optional[str], profile: str, batch_size: int,
+                           progress_callback: Callable[[int], None],
+                           parallel_sections: int = 1,
+                           stop_specs: Optional[List[Optional[SectionSpec]]] = None,
+                           cancel_event: Optional[threading.Event] = None
+                           ) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """
+        Generate independent plan sections through the scheduler, concurrently, in batches, or one by one.
+        
+        Args:
+            section_prompts: Prompts for the sections to generate
+            labels: Human-readable name of each section for progress output
+            max_tokens: Maximum tokens for generation
+            prefix: Leading text shared by all prompts
+            profile: Decoding profile name
+            batch_size: Prompts per batched model call; 1 generates sequentially
+            progress_callback: Called with the number of sections finished so far
+            parallel_sections: Sections generated concurrently as independent tasks
+            stop_specs: Optional early-stopping rules per section
+            cancel_event: Optional event that stops generation once set
+            
+        Returns:
+            Tuple of (section texts in prompt order, generation stats per model call)
+            
+        Raises:
+            GenerationCancelled: If ``cancel_event`` is set before all sections are done
+        """
+        if self.scheduler is not None:
+            logger.info(f"🔄 Queueing {len(section_prompts)} sections for batched generation...")
+            return self.scheduler.generate_many(section_prompts, max_tokens, prefix=prefix,
+                                                profile=profile, progress_callback=progress_callback,
+                                                stop_specs=stop_specs, cancel_event=cancel_event)
+            
+        if stop_specs is None:
+            stop_specs = [None] * len(section_prompts)
+        if parallel_sections > 1 and len(section_prompts) > 1:
+            return self._generate_sections_parallel(section_prompts, max_tokens, prefix, profile,
+                                                    progress_callback, parallel_sections, stop_specs,
+                                                    cancel_event)
+            
+        if batch_size > 1:
+            # Day prompts and the guidance prompt are independent, so generate them together
+            logger.info(f"🔄 Generating {len(section_prompts)} sections in batches of {batch_size}...")
+            texts, stats = self._generate(section_prompts, max_tokens, batch_size=batch_size,
+                                          prefix=prefix, profile=profile,
+                                          progress_callback=progress_callback, stop_specs=stop_specs,
+                                          cancel_events=[cancel_event] * len(section_prompts))
+            raise_if_cancelled(cancel_event)
+            return texts, [stats]
+            
+        texts = []
+        call_stats = []
+        for label, prompt, spec in zip(labels, section_prompts, stop_specs):
+            raise_if_cancelled(cancel_event)
+            logger.info(f"🔄 Generating {label}...")
+            section_texts, stats = self._generate([prompt], max_tokens, prefix=prefix, profile=profile,
+                                                  stop_specs=[spec], cancel_events=[cancel_event])
+            texts.append(section_texts[0])
+            call_stats.append(stats)
+            progress_callback(len(texts))
+        raise_if_cancelled(cancel_event)
+        return texts, call_stats
+
+    def _generate_sections_parallel(self, section_prompts: List[str], max_tokens: int,
+                                    prefix: Optional[str], profile: str,
+                                    progress_callback: Callable[[int], None], parallel_sections: int,
+                                    stop_specs: List[Optional[SectionSpec]],
+                                    cancel_event: Optional[threading.Event] = None
+                                    ) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """
+        Fan sections out as independent tasks and collect them in prompt order.
+        
+        No day depends on another day's text, so each section is its own
+        ``_generate`` call. With a worker pool every call lands on a separate
+        model process; without one, the calls share this process's model.
+        
+        Returns:
+            Tuple of (section texts in prompt order, generation stats per section)
+        """
+        workers = min(parallel_sections, len(section_prompts))
+        logger.info(f"🔄 Generating {len(section_prompts)} sections with {workers} in parallel...")
+        completed = [0]
+        progress_lock = threading.Lock()
+        
+        def run(prompt: str, spec: Optional[SectionSpec]) -> Tuple[List[str], Dict[str, Any]]:
+            outcome = self._generate([prompt], max_tokens, prefix=prefix, profile=profile, stop_specs=[spec],
+                                     cancel_events=[cancel_event])
+            with progress_lock:
+                completed[0] += 1
+                progress_callback(completed[0])
+            return outcome
+        
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="plan-section") as executor:
+            futures = [executor.submit(run, prompt, spec) for prompt, spec in zip(section_prompts, stop_specs)]
+            outcomes = [future.result() for future in futures]
+        raise_if_cancelled(cancel_event)
+        return [texts[0] for texts, _ in outcomes], [stats for _, stats in outcomes]
+
+    def generate_meal_plan(self, 
+                          goal: str = "muscle gain",
+                          days: int = 3, 
+                          dietary_preference: str = "non-vegetarian",
+                          cuisine_style: str = "indian", 
+                          allergies: Optional[List[str]] = None,
+                          calories: Union[str, int] = "2500-3000",
+                          max_tokens: int = 2048,
+                          batch_size: int = 4,
+                          decoding_profile: Optional[str] = None,
+                          progress_callback: Optional[Callable[[int, int], None]] = None,
+                          use_cache: bool = True,
+                          parallel_sections: Optional[int] = None,
+                          trace: bool = False,
+                          output_file: Optional[str] = None,
+                          from_index: bool = False,
+                          structured: bool = False,
+                          cancel_event: Optional[threading.Event] = None) -> Dict[str, Any]:
+        """
+        Generate a complete customized meal plan.
+        
+        Args:
+            goal: Nutritional goal (e.g., "muscle gain", "weight loss")
+            days: Number of days in the meal plan
+            dietary_preference: Dietary preference (e.g., "vegetarian")
+            cuisine_style: Preferred cuisine style
+            allergies: List of allergies or dietary restrictions
+            calories: Target calorie range (either string range or specific int)
+            max_tokens: Maximum tokens for generation
+            batch_size: Prompts per batched model call; 1 generates each section sequentially
+            decoding_profile: Decoding profile name; defaults to the generator's profile
+            progress_callback: Optional callable receiving (completed sections, total
+                sections) as days and the guidance section finish
+            use_cache: Reuse and record sections in the result cache
+            parallel_sections: Days and guidance generated concurrently as independent
+                tasks; defaults to the worker pool size, or 1 (batched) without a pool
+            trace: Include a per-stage breakdown of where the time went under ``trace``
+            output_file: File to save the plan to; defaults to a timestamped name in meal_plans/
+            from_index: Assemble days from matching meals in the recipe index and only
+                generate the meals (and guidance) it has no match for; ignored when an
+                allergy maps to no known allergen tag
+            structured: Also parse the plan into days, meals, ingredients and macros with
+                nutrition totals checked against ``calories``, returned under ``structured``
+                and saved as JSON next to the markdown
+            cancel_event: Optional event, e.g. set when the client disconnects, that
+                stops generation; the result is then an error of type ``GenerationCancelled``
+                and nothing is saved or cached
+            
+        Returns:
+            Dictionary with status, meal plan, metadata and cache status
+        """
+        if allergies is None:
+            allergies = []
+        if parallel_sections is None:
+            parallel_sections = self.worker_pool.num_workers if self.worker_pool is not None else 1
+            
+        # Validate inputs
+        days = max(1, min(14, days))  # Limit days to reasonable range
+        
+        # Format calorie information
+        calorie_info = f"between {calories} kcal" if isinstance(calories, str) else f"approximately {calories} kcal"
+        
+        plan_trace = Trace()
+        with plan_trace.stage("build_prompts"):
+            prompts = self.build_plan_prompts(goal, days, dietary_preference, cuisine_style,
+                                              allergies, calorie_info)
+
+        unknown_allergies = unmapped_allergies(allergies) if from_index else []
+        if unknown_allergies and self.recipe_index is not None:
+            # Indexed meals are only tagged with known allergens, so none can be vouched for
+            logger.warning(f"⚠️ No allergen tags for {', '.join(unknown_allergies)}; "
+                           "generating the whole plan instead of reusing indexed meals")
+        if from_index and self.recipe_index is not None and not unknown_allergies:
+            return self._generate_from_index(goal, days, dietary_preference, cuisine_style, allergies, calories,
+                                             calorie_info, prompts, max_tokens, batch_size, decoding_profile,
+                                             progress_callback, parallel_sections, plan_trace, trace, output_file,
+                                             structured, cancel_event)
 
         try:
-            print(f"🔄 Generating {days}-day meal plan for {goal} with {cuisine_style} {dietary_preference} cuisine...")
-            meal_plan_text = f"# {days}-Day {cuisine_style.title()} {dietary_preference.title()} Meal Plan for {goal.title()}\n\n"
-            meal_plan_text += f"*Generated on {datetime.now().strftime('%B %d, %Y')}*\n\n"
-            meal_plan_text += "## Overview\n\n"
-            meal_plan_text += f"This meal plan is designed for {goal} with {cuisine_style.title()} cuisine adapted for a {dietary_preference} diet.\n\n"
-            
-            if allergies:
-                meal_plan_text += f"**Allergies/Restrictions:** {', '.join(allergies)}\n\n"
-                
-            meal_plan_text += f"**Target Daily Calories:** {calorie_info}\n\n"
-            meal_plan_text += "---\n\n"
+            logger.info(f"🔄 Generating {days}-day meal plan for {goal} with {cuisine_style} {dietary_preference} cuisine...")
+            meal_plan_text = self._plan_header(goal, days, dietary_preference, cuisine_style,
+                                               allergies, calorie_info)
 
-            # Generate each day's plan
-            for day in range(1, days + 1):
-                print(f"🔄 Generating Day {day}/{days}...")
-                day_prompt = f"{base_prompt}\n{dietary_requirements}\n{day_meal_structure.format(day=day)}"
-                day_text = self.generate_text(day_prompt, max_tokens)
-                meal_plan_text += f"## Day {day}\n\n{day_text}\n\n---\n\n"
+            total_sections = days + 1
 
-            # Generate general sections with more specific guidance
-            print("🔄 Generating additional sections...")
-            general_sections_prompt = f"""{base_prompt}
-{dietary_requirements}
+            def report_progress(completed: int) -> None:
+                if progress_callback is not None:
+                    progress_callback(completed, total_sections)
 
-Provide the following practical guidance sections for the entire {days}-day meal plan:
+            profile = decoding_profile or self.decoding_profile
+            section_prompts = prompts["day_prompts"] + [prompts["guidance_prompt"]]
+            section_labels = [f"Day {day}/{days}" for day in range(1, days + 1)] + ["additional sections"]
 
-1. **Weekly Shopping List**
-   - Organize by food category (produce, proteins, pantry items, etc.)
-   - Include exact quantities needed for the full plan
-   - Note shelf-stable vs fresh items
-   - Suggest budget-friendly alternatives
+            # Reuse any sections already generated for this exact request profile
+            sections: List[Optional[str]] = [None] * total_sections
+            cache_key = None
+            if use_cache and self.result_cache is not None and profile in DECODING_PROFILES:
+                if self.worker_pool is None:
+                    # The key includes the precision "auto" resolves to, known once the model is loaded
+                    self.load_model()
+                # max_tokens caps every profile, so sections cut short by a small cap are kept apart
+                decoding = {"profile": profile, **DECODING_PROFILES[profile],
+                            "max_new_tokens": min(DECODING_PROFILES[profile]["max_new_tokens"], max_tokens),
+                            "section_stopping": self.section_stopping}
+                cache_key = ResultCache.make_key(goal, dietary_preference, cuisine_style, allergies, calories,
+                                                 self.model_name, decoding,
+                                                 inference_backend=self.inference_backend,
+                                                 precision=self.active_precision or self.precision)
+                with plan_trace.stage("cache_lookup"):
+                    sections = self.result_cache.lookup(cache_key, days)
+            missing = [i for i, text in enumerate(sections) if text is None]
+            cached_sections = total_sections - len(missing)
+            if cache_key is not None:
+                outcome = "miss" if not cached_sections else "partial" if missing else "hit"
+                CACHE_LOOKUPS.inc(cache="result", outcome=outcome)
+            if cached_sections:
+                logger.info(f"♻️ Reusing {cached_sections}/{total_sections} cached sections")
+                report_progress(cached_sections)
 
-2. **Meal Prep Strategy**
-   - Provide a detailed weekly meal prep timeline
-   - Identify which components can be prepared in advance
-   - Include storage instructions and shelf life information
-   - Batch cooking recommendations
+            call_stats = []
+            stop_reasons = ["cached"] * total_sections
+            if missing:
+                section_specs = prompts["section_specs"] if self.section_stopping else [None] * total_sections
+                texts, call_stats = self._generate_sections(
+                    [section_prompts[i] for i in missing], [section_labels[i] for i in missing],
+                    max_tokens, prompts["shared_prefix"], profile, batch_size,
+                    lambda done: report_progress(cached_sections + done),
+                    parallel_sections, [section_specs[i] for i in missing], cancel_event
+                )
+                generated_reasons = [reason for stats in call_stats for reason in stats["stop_reasons"]]
+                for i, text, reason in zip(missing, texts, generated_reasons):
+                    sections[i] = text
+                    stop_reasons[i] = reason
+                for stats in call_stats:
+                    plan_trace.add_generation(stats)
+                if cache_key is not None:
+                    with plan_trace.stage("cache_store"):
+                        self.result_cache.store(cache_key, days, sections)
 
-3. **Portion Control & Scaling**
-   - Guidelines for adjusting portions based on individual needs
-   - How to scale recipes up or down
-   - Visual portion size references
+            day_texts, general_sections_text = sections[:-1], sections[-1]
+
+            for day, day_text in enumerate(day_texts, start=1):
+                meal_plan_text += f"## Day {day}\n\n{day_text}\n\n---\n\n"
 
-4. **Progress Tracking & Adjustments**
-   - Signs that the meal plan is working for the stated goal
-   - Common issues and how to troubleshoot them
-   - When and how to make adjustments
-"""
-            general_sections_text = self.generate_text(general_sections_prompt, max_tokens)
             meal_plan_text += "## Additional Guidance\n\n" + general_sections_text
 
             # Save and return
-            metadata = {
-                "goal": goal,
-                "days": days,
-                "dietary_preference": dietary_preference,
-                "cuisine_style": cuisine_style,
-                "calories": calories,
-                "allergies": allergies,
-                "generation_date": datetime.now().strftime("%Y-%m-%d"),
-                "model": self.model_name
-            }
+            metadata = self._plan_metadata(goal, days, dietary_preference, cuisine_style,
+                                           calories, allergies, decoding_profile, call_stats, stop_reasons)
             
-            filename = self.save_meal_plan_to_file(meal_plan_text, metadata=metadata)
+            with plan_trace.stage("save"):
+                filename = self.save_meal_plan_to_file(meal_plan_text, filename=output_file, metadata=metadata)
             
-            return {
+            if cache_key is None:
+                cache_status = "disabled"
+            elif not missing:
+                cache_status = "hit"
+            else:
+                cache_status = "partial" if cached_sections else "miss"
+            
+            PLAN_SECONDS.observe(time.perf_counter() - plan_trace.start, mode="batch")
+            result = {
                 "status": "success",
                 "meal_plan": meal_plan_text,
                 "file_path": filename,
-                "metadata": metadata
+                "metadata": metadata,
+                "cache": {
+                    "status": cache_status,
+                    "cached_sections": cached_sections,
+                    "total_sections": total_sections
+                }
             }
+            if structured:
+                with plan_trace.stage("structure"):
+                    days_data = [day.to_dict() for day in parse_days(day_texts)]
+                    self._attach_structured(result, days_data, calories)
+            if trace:
+                result["trace"] = plan_trace.as_dict()
+            return result
             
         except Exception as e:
             error_msg = f"An error occurred during meal plan generation: {str(e)}"
-            print(f"❌ {error_msg}")
+            logger.error(f"❌ {error_msg}", extra={"error_type": type(e).__name__})
+            ERRORS.inc(type=type(e).__name__)
             return {
                 "status": "error",
                 "error": error_msg,
+                "error_type": type(e).__name__,
                 "metadata": {
                     "goal": goal,
                     "days": days,
@@ -444,6 +1484,356 @@ Provide the following practical guidance sections for the entire {days}-day meal
                 }
             }
 
+    def _attach_structured(self, result: Dict[str, Any], days: List[Dict[str, Any]],
+                           calories: Union[str, int]) -> None:
+        """
+        Add the structured plan and its nutrition totals to a result, saving them next to the markdown.
+        
+        Args:
+            result: Result (or ``done`` event) with ``file_path`` and ``metadata``
+            days: Parsed days in ``DayPlan.to_dict`` form
+            calories: Calorie target the daily totals are checked against
+        """
+        result["structured"] = {"days": days, "nutrition": nutrition_totals(days, calories)}
+        # Archive-only plans have no file to save the JSON next to
+        if not result.get("file_path") or not self.plan_writer.write_files:
+            return
+        path = os.path.splitext(result["file_path"])[0] + ".json"
+        try:
+            self.plan_writer.save_file(path, json.dumps({"metadata": result["metadata"], **result["structured"]},
+                                                        separators=(",", ":")))
+            result["structured_path"] = path
+        except Exception as e:
+            logger.warning(f"⚠️ Could not save structured plan: {str(e)}")
+
+    def _generate_from_index(self, goal: str, days: int, dietary_preference: str, cuisine_style: str,
+                             allergies: List[str], calories: Union[str, int], calorie_info: str,
+                             prompts: Dict[str, Any], max_tokens: int, batch_size: int,
+                             decoding_profile: Optional[str],
+                             progress_callback: Optional[Callable[[int, int], None]],
+                             parallel_sections: int, plan_trace: Trace, trace: bool,
+                             output_file: Optional[str], structured: bool = False,
+                             cancel_event: Optional[threading.Event] = None) -> Dict[str, Any]:
+        """
+        Assemble a plan from indexed meals, generating only the meals with no match.
+        
+        Each day takes one indexed meal per slot, preferring meals not used
+        earlier in the plan. Meals without a match get a single-meal prompt,
+        and the guidance section is reused from an indexed plan with the same
+        cuisine, diet and number of days or generated; all missing sections go to the model
+        together. Returns the same shape as ``generate_meal_plan``, plus an
+        ``index`` summary.
+        """
+        try:
+            logger.info(f"🔄 Assembling {days}-day meal plan for {goal} from the recipe index...")
+            profile = decoding_profile or self.decoding_profile
+            slots = list(DAY_SECTIONS)
+            # One entry per meal (days x slots), then the guidance section
+            sections: List[Optional[str]] = []
+            used: set = set()
+            with plan_trace.stage("index_lookup"):
+                for day in range(1, days + 1):
+                    for slot in slots:
+                        record = self.recipe_index.match(cuisine_style, dietary_preference, slot, allergies,
+                                                         goal, calories, avoid=used)
+                        if record is not None:
+                            used.add(record["id"])
+                        sections.append(record["text"] if record is not None else None)
+                # Guidance covers the whole plan (shopping list, quantities), so only same-length plans fit
+                guidance = self.recipe_index.match(cuisine_style, dietary_preference, GUIDANCE_SLOT, allergies,
+                                                   goal, calories, days=days)
+                sections.append(guidance["text"] if guidance is not None else None)
+
+            total_sections = len(sections)
+            missing = [i for i, text in enumerate(sections) if text is None]
+            indexed_sections = total_sections - len(missing)
+            total_meals = days * len(slots)
+            indexed_meals = sum(1 for text in sections[:total_meals] if text is not None)
+            logger.info(f"♻️ Found {indexed_meals}/{total_meals} meals in the recipe index")
+
+            def report_progress(completed: int) -> None:
+                if progress_callback is not None:
+                    progress_callback(indexed_sections + completed, total_sections)
+
+            if indexed_sections:
+                report_progress(0)
+
+            call_stats = []
+            stop_reasons = ["indexed"] * total_sections
+            if missing:
+                section_prompts, labels, specs = [], [], []
+                for i in missing:
+                    if i < total_meals:
+                        day, slot = i // len(slots) + 1, slots[i % len(slots)]
+                        section_prompts.append(self.build_meal_prompt(prompts["shared_prefix"], day, slot))
+                        labels.append(f"Day {day} {slot}")
+                        specs.append(SectionSpec.for_meal(day, slot) if self.section_stopping else None)
+                    else:
+                        section_prompts.append(prompts["guidance_prompt"])
+                        labels.append("additional sections")
+                        specs.append(prompts["section_specs"][-1] if self.section_stopping else None)
+                texts, call_stats = self._generate_sections(section_prompts, labels, max_tokens,
+                                                            prompts["shared_prefix"], profile, batch_size,
+                                                            report_progress, parallel_sections, specs,
+                                                            cancel_event)
+                generated_reasons = [reason for stats in call_stats for reason in stats["stop_reasons"]]
+                for i, text, reason in zip(missing, texts, generated_reasons):
+                    # Generated meals get the slot heading that indexed meals carry from their source plan
+                    sections[i] = f"### {slots[i % len(slots)]}\n\n{text}" if i < total_meals else text
+                    stop_reasons[i] = reason
+                for stats in call_stats:
+                    plan_trace.add_generation(stats)
+
+            meal_plan_text = self._plan_header(goal, days, dietary_preference, cuisine_style,
+                                               allergies, calorie_info)
+            for day in range(1, days + 1):
+                meals = sections[(day - 1) * len(slots):day * len(slots)]
+                meal_plan_text += f"## Day {day}\n\n" + "\n\n".join(meals) + "\n\n---\n\n"
+            meal_plan_text += "## Additional Guidance\n\n" + sections[-1]
+
+            metadata = self._plan_metadata(goal, days, dietary_preference, cuisine_style,
+                                           calories, allergies, decoding_profile, call_stats, stop_reasons)
+            metadata["indexed_meals"] = indexed_meals
+            metadata["generated_meals"] = total_meals - indexed_meals
+            with plan_trace.stage("save"):
+                filename = self.save_meal_plan_to_file(meal_plan_text, filename=output_file, metadata=metadata)
+
+            PLAN_SECONDS.observe(time.perf_counter() - plan_trace.start, mode="index")
+            result = {
+                "status": "success",
+                "meal_plan": meal_plan_text,
+                "file_path": filename,
+                "metadata": metadata,
+                "cache": {
+                    "status": "disabled",
+                    "cached_sections": 0,
+                    "total_sections": days + 1
+                },
+                "index": {
+                    "indexed_meals": indexed_meals,
+                    "total_meals": total_meals,
+                    "guidance": "indexed" if guidance is not None else "generated"
+                }
+            }
+            if structured:
+                with plan_trace.stage("structure"):
+                    day_texts = ["\n\n".join(sections[(day - 1) * len(slots):day * len(slots)])
+                                 for day in range(1, days + 1)]
+                    self._attach_structured(result, [day.to_dict() for day in parse_days(day_texts)], calories)
+            if trace:
+                result["trace"] = plan_trace.as_dict()
+            return result
+
+        except Exception as e:
+            error_msg = f"An error occurred during meal plan generation: {str(e)}"
+            logger.error(f"❌ {error_msg}", extra={"error_type": type(e).__name__})
+            ERRORS.inc(type=type(e).__name__)
+            return {
+                "status": "error",
+                "error": error_msg,
+                "error_type": type(e).__name__,
+                "metadata": {
+                    "goal": goal,
+                    "days": days,
+                    "dietary_preference": dietary_preference,
+                    "cuisine_style": cuisine_style,
+                    "allergies": allergies
+                }
+            }
+
+    def stream_meal_plan(self,
+                         goal: str = "muscle gain",
+                         days: int = 3,
+                         dietary_preference: str = "non-vegetarian",
+                         cuisine_style: str = "indian",
+                         allergies: Optional[List[str]] = None,
+                         calories: Union[str, int] = "2500-3000",
+                         max_tokens: int = 2048,
+                         decoding_profile: Optional[str] = None,
+                         trace: bool = False,
+                         structured: bool = False,
+                         cancel_event: Optional[threading.Event] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Generate a meal plan section by section, yielding events as text is produced.
+        
+        Events are dictionaries with an ``event`` key:
+        
+        - ``section``: a new section starts; ``text`` holds its markdown heading
+        - ``token``: newly decoded ``text`` for the current section
+        - ``meal``: with ``structured``, a parsed ``meal`` of ``day``, sent once the
+          next meal starts
+        - ``done``: the plan is complete; includes ``file_path``, ``metadata`` and,
+          if requested, ``structured`` and ``trace``
+        - ``error``: generation failed; includes ``message``
+        
+        Concatenating the ``text`` of every section and token event reproduces
+        the markdown returned by ``generate_meal_plan``. Streaming cannot be
+        combined with beam search, so beam profiles fall back to ``fast``.
+        Setting ``cancel_event``, or closing the generator early, stops the
+        section being generated at its next token.
+        
+        Args:
+            goal: Nutritional goal (e.g., "muscle gain", "weight loss")
+            days: Number of days in the meal plan
+            dietary_preference: Dietary preference (e.g., "vegetarian")
+            cuisine_style: Preferred cuisine style
+            allergies: List of allergies or dietary restrictions
+            calories: Target calorie range (either string range or specific int)
+            max_tokens: Maximum tokens for generation
+            decoding_profile: Decoding profile name; defaults to the generator's profile
+            trace: Include a per-stage time breakdown in the ``done`` event
+            structured: Parse meals as they stream and add the structured plan with
+                nutrition totals to the ``done`` event
+            cancel_event: Optional event that stops generation once set; an ``error``
+                event follows and nothing is saved
+            
+        Yields:
+            Event dictionaries in generation order
+        """
+        if allergies is None:
+            allergies = []
+            
+        days = max(1, min(14, days))
+        calorie_info = f"between {calories} kcal" if isinstance(calories, str) else f"approximately {calories} kcal"
+        
+        profile = decoding_profile or self.decoding_profile
+        if profile in DECODING_PROFILES and DECODING_PROFILES[profile]["num_beams"] > 1:
+            logger.warning(f"⚠️ '{profile}' profile uses beam search, which cannot stream; using 'fast' instead")
+            profile = "fast"
+        
+        plan_trace = Trace()
+        with plan_trace.stage("build_prompts"):
+            prompts = self.build_plan_prompts(goal, days, dietary_preference, cuisine_style,
+                                              allergies, calorie_info)
+        
+        try:
+            logger.info(f"🔄 Streaming {days}-day meal plan for {goal} with {cuisine_style} {dietary_preference} cuisine...")
+            meal_plan_text = self._plan_header(goal, days, dietary_preference, cuisine_style,
+                                               allergies, calorie_info)
+            yield {"event": "section", "section": "overview", "text": meal_plan_text}
+            parser = PlanParser() if structured else None
+            
+            call_stats = []
+            sections = [(f"## Day {day}\n\n", day, prompt)
+                        for day, prompt in enumerate(prompts["day_prompts"], start=1)]
+            sections.append(("## Additional Guidance\n\n", None, prompts["guidance_prompt"]))
+            specs = prompts["section_specs"] if self.section_stopping else [None] * len(sections)
+            
+            for (heading, day, prompt), spec in zip(sections, specs):
+                raise_if_cancelled(cancel_event)
+                if day is None:
+                    yield {"event": "section", "section": "guidance", "text": heading}
+                else:
+                    yield {"event": "section", "section": "day", "day": day, "text": heading}
+                meal_plan_text += heading
+                if parser is not None:
+                    for meal_day, meal in parser.feed(heading):
+                        yield {"event": "meal", "day": meal_day, "meal": meal.to_dict()}
+                
+                stream = self._stream_section(prompt, max_tokens, prompts["shared_prefix"], profile, spec,
+                                              cancel_event)
+                while True:
+                    try:
+                        chunk = next(stream)
+                    except StopIteration as finished:
+                        call_stats.append(finished.value)
+                        plan_trace.add_generation(finished.value)
+                        break
+                    meal_plan_text += chunk
+                    yield {"event": "token", "text": chunk}
+                    if parser is not None:
+                        for meal_day, meal in parser.feed(chunk):
+                            yield {"event": "meal", "day": meal_day, "meal": meal.to_dict()}
+                
+                if day is not None:
+                    meal_plan_text += "\n\n---\n\n"
+                    yield {"event": "token", "text": "\n\n---\n\n"}
+            
+            raise_if_cancelled(cancel_event)
+            metadata = self._plan_metadata(goal, days, dietary_preference, cuisine_style,
+                                           calories, allergies, profile, call_stats)
+            with plan_trace.stage("save"):
+                filename = self.save_meal_plan_to_file(meal_plan_text, metadata=metadata)
+            PLAN_SECONDS.observe(time.perf_counter() - plan_trace.start, mode="stream")
+            done = {"event": "done", "file_path": filename, "metadata": metadata}
+            if parser is not None:
+                for meal_day, meal in parser.close():
+                    yield {"event": "meal", "day": meal_day, "meal": meal.to_dict()}
+                self._attach_structured(done, [day.to_dict() for day in parser.plan_days()], calories)
+            if trace:
+                done["trace"] = plan_trace.as_dict()
+            yield done
+            
+        except Exception as e:
+            error_msg = f"An error occurred during meal plan generation: {str(e)}"
+            logger.error(f"❌ {error_msg}", extra={"error_type": type(e).__name__})
+            ERRORS.inc(type=type(e).__name__)
+            yield {"event": "error", "message": error_msg}
+
+    def _stream_section(self, prompt: str, max_tokens: int, prefix: Optional[str],
+                        profile: str, stop_spec: Optional[SectionSpec] = None,
+                        cancel_event: Optional[threading.Event] = None) -> Generator[str, None, Dict[str, Any]]:
+        """
+        Run one prompt in a background thread and yield decoded text as it arrives.
+        
+        With a ``stop_spec``, text is released a line at a time once the line
+        is known not to cross a section boundary, so the lines the section is
+        cut at are never sent. Generation stops at the next token once
+        ``cancel_event`` is set; closing this generator early sets it, so an
+        abandoned stream does not keep the model busy.
+        
+        Returns:
+            The generation stats for the call, as the generator's return value
+        """
+        self.load_model()
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        outcome: Dict[str, Any] = {}
+        if cancel_event is None:
+            cancel_event = threading.Event()
+        
+        def run():
+            try:
+                _, outcome["stats"] = self._generate([prompt], max_tokens, prefix=prefix,
+                                                     profile=profile, streamer=streamer,
+                                                     stop_specs=[stop_spec], cancel_events=[cancel_event])
+            except Exception as e:
+                outcome["error"] = e
+                # Unblock the consumer if generate() failed before finishing the stream
+                streamer.end()
+        
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        received = ""
+        sent = 0
+        stopped = False
+        try:
+            for chunk in streamer:
+                if not chunk or stopped:
+                    continue
+                if stop_spec is None:
+                    yield chunk
+                    continue
+                received += chunk
+                complete = received[:received.rfind("\n") + 1]
+                allowed, reason = stop_spec.scan(complete)
+                stopped = reason is not None
+                if len(allowed) > sent:
+                    yield allowed[sent:]
+                    sent = len(allowed)
+            if stop_spec is not None and not stopped:
+                allowed, _ = stop_spec.scan(received)
+                if len(allowed) > sent:
+                    yield allowed[sent:]
+        except GeneratorExit:
+            # The consumer went away mid-section; stop decoding text nobody will read
+            cancel_event.set()
+            raise
+        thread.join()
+        
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome["stats"]
+
 
 # Command-line interface setup
 def parse_args():
@@ -472,6 +1862,51 @@ def parse_args():
                         help="Output filename (optional)")
     parser.add_argument("--cache-dir", type=str, default=None,
                         help="Directory to cache the downloaded model")
+    parser.add_argument("--batch-size", type=int, default=4,
+                        help="Prompts per batched model call (1 = generate sections sequentially)")
+    parser.add_argument("--prefix-cache-mb", type=int, default=256,
+                        help="Memory budget for cached prompt prefixes in MB (0 disables)")
+    parser.add_argument("--precision", type=str, default="auto", choices=list(PRECISIONS),
+                        help="Weight precision: auto picks fp16 on GPU and bf16/fp32 on CPU; int8 quantizes Linear layers (CPU)")
+    parser.add_argument("--draft-model", type=str, default=None,
+                        help="Small model with the same tokenizer family that drafts tokens for assisted "
+                             "generation (fast/draft profiles; turned off automatically when it does not help)")
+    parser.add_argument("--backend", type=str, default="eager", choices=list(INFERENCE_BACKENDS),
+                        help="Inference backend: eager model.generate, or compile to decode through a torch.compile'd "
+                             "graph with a static KV cache (kernels cached under --cache-dir)")
+    parser.add_argument("--plan-archive", type=str, default=None, metavar="SQLITE_PATH",
+                        help="Also append saved plans to this compressed SQLite archive, indexed by metadata")
+    parser.add_argument("--no-plan-files", action="store_true",
+                        help="Save plans only to --plan-archive instead of one markdown file each")
+    parser.add_argument("--mmap-weights", action="store_true",
+                        help="Memory-map safetensors weights instead of copying them into memory")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always generate fresh text instead of reusing cached plan sections")
+    parser.add_argument("--decoding-profile", type=str, default="quality",
+                        choices=list(DECODING_PROFILES),
+                        help="Decoding strategy: 'quality' beam sampling, 'fast' single-beam sampling, 'draft' greedy")
+    parser.add_argument("--structured", action="store_true",
+                        help="Also save the plan as JSON (days, meals, ingredients, macros) with nutrition totals")
+    parser.add_argument("--from-index", action="store_true",
+                        help="Assemble days from meals of previously saved plans and only generate the missing ones")
+    parser.add_argument("--no-section-stopping", action="store_true",
+                        help="Always decode up to the profile's token cap instead of stopping at section boundaries")
+    parser.add_argument("--quiet", action="store_true",
+                        help="Turn off progress logging (NUTRIMIND_LOG_LEVEL / NUTRIMIND_LOG_FORMAT also apply)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Model worker processes, each pinned to its own cores (0 runs the model in-process)")
+    parser.add_argument("--worker-sharing", type=str, default="fork", choices=["fork", "mmap"],
+                        help="How workers share weights: fork after loading, or memory-map the checkpoint")
+    parser.add_argument("--parallel-sections", type=int, default=None,
+                        help="Days generated concurrently (defaults to --workers, or batched generation without workers)")
+    parser.add_argument("--bulk", type=str, default=None, metavar="REQUESTS_JSONL",
+                        help="Generate every plan request in this JSONL file instead of a single plan")
+    parser.add_argument("--bulk-output", type=str, default="meal_plans/bulk_results.jsonl",
+                        help="JSONL file bulk results are appended to; also the checkpoint a rerun resumes from")
+    parser.add_argument("--bulk-concurrency", type=int, default=4,
+                        help="Plans generated at once in bulk mode; their sections are batched together")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="Start the bulk output over instead of skipping requests that already succeeded")
     
     # Use parse_known_args to handle additional args from Jupyter/Colab
     return parser.parse_known_args()
@@ -497,33 +1932,77 @@ if __name__ == "__main__":
         else:
             # Command line usage
             args, unknown = parse_args()
+            configure_logging(level="off" if args.quiet else None)
             if unknown:
                 print(f"⚠️ Ignoring unknown arguments: {unknown}")
             
+            if args.no_plan_files and not args.plan_archive:
+                print("❌ --no-plan-files needs --plan-archive")
+                sys.exit(2)
+            archive = PlanArchive(args.plan_archive) if args.plan_archive else None
+            plan_writer = PlanWriter(archive=archive, write_files=not args.no_plan_files)
+            
             # Create the meal plan generator
-            generator = MealPlanGenerator(model_name=args.model, cache_dir=args.cache_dir)
-            
-            # Generate the meal plan
-            result = generator.generate_meal_plan(
-                goal=args.goal,
-                days=args.days,
-                dietary_preference=args.diet,
-                cuisine_style=args.cuisine,
-                allergies=args.allergies,
-                calories=args.calories
-            )
+            generator = MealPlanGenerator(model_name=args.model, cache_dir=args.cache_dir,
+                                          prefix_cache_mb=args.prefix_cache_mb,
+                                          decoding_profile=args.decoding_profile,
+                                          mmap_weights=args.mmap_weights,
+                                          precision=args.precision,
+                                          lazy_load=args.workers > 0,
+                                          section_stopping=not args.no_section_stopping,
+                                          draft_model=args.draft_model,
+                                          inference_backend=args.backend,
+                                          plan_writer=plan_writer)
+            if args.workers > 0:
+                generator.worker_pool = ModelWorkerPool(generator, num_workers=args.workers,
+                                                        sharing=args.worker_sharing)
             
-            if result["status"] == "success":
-                print("\n✅ Meal plan generation complete!")
-                print(f"📄 Saved to: {result['file_path']}")
-                
-                # Print a preview
-                preview_lines = result["meal_plan"].split("\n")[:20]
-                print("\n=== Preview ===\n")
-                print("\n".join(preview_lines))
-                print("\n...(content continues)...\n")
+            if args.bulk:
+                runner = BulkRunner(generator, concurrency=args.bulk_concurrency, batch_size=args.batch_size,
+                                    use_cache=not args.no_cache)
+                summary = runner.run(args.bulk, args.bulk_output, resume=not args.no_resume)
+                print("\n✅ Bulk generation complete!")
+                print(f"📄 Results: {summary['output']} (markdown in {summary['markdown_dir']})")
+                print(f"📊 {summary['succeeded']} succeeded, {summary['failed']} failed, "
+                      f"{summary['skipped']} already done")
+                print(f"⚡ {summary['plans_per_minute']} plans/min, {summary['tokens_per_sec']} tokens/sec "
+                      f"over {summary['seconds']}s (p50 {summary['p50_plan_seconds']}s, "
+                      f"p95 {summary['p95_plan_seconds']}s per plan)")
             else:
-                print(f"\n❌ Failed to generate meal plan: {result.get('error', 'Unknown error')}")
+                # Generate the meal plan
+                result = generator.generate_meal_plan(
+                    goal=args.goal,
+                    days=args.days,
+                    dietary_preference=args.diet,
+                    cuisine_style=args.cuisine,
+                    allergies=args.allergies,
+                    calories=args.calories,
+                    batch_size=args.batch_size,
+                    use_cache=not args.no_cache,
+                    parallel_sections=args.parallel_sections,
+                    output_file=args.output,
+                    from_index=args.from_index,
+                    structured=args.structured
+                )
+            
+                if result["status"] == "success":
+                    print("\n✅ Meal plan generation complete!")
+                    print(f"📄 Saved to: {result['file_path']}")
+                    print(f"⚡ Decoding: {result['metadata']['decoding_profile']} profile, "
+                          f"{result['metadata']['tokens_per_sec']} tokens/sec")
+                    if "structured" in result:
+                        nutrition = result["structured"]["nutrition"]
+                        print(f"📊 Structured plan: {result.get('structured_path')} "
+                              f"(daily average {nutrition['daily_average'][0]} kcal, "
+                              f"within target: {nutrition.get('within_target', 'n/a')})")
+                
+                    # Print a preview
+                    preview_lines = result["meal_plan"].split("\n")[:20]
+                    print("\n=== Preview ===\n")
+                    print("\n".join(preview_lines))
+                    print("\n...(content continues)...\n")
+                else:
+                    print(f"\n❌ Failed to generate meal plan: {result.get('error', 'Unknown error')}")
                 
     except KeyboardInterrupt:
         print("\n⚠️ Process interrupted by user")
@@ -0,0 +1,467 @@
+import os
+import json
+import time
+import zlib
+import queue
+import atexit
+import sqlite3
+import hashlib
+import tempfile
+import threading
+from datetime import datetime
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    from .telemetry import ERRORS, STAGE_SECONDS, get_logger
+except ImportError:
+    # Running as a script from inside model/
+    from telemetry import ERRORS, STAGE_SECONDS, get_logger
+
+logger = get_logger("persistence")
+
+# Metadata fields stored in their own indexed archive columns; ``PlanArchive.find`` filters on these
+ARCHIVE_FIELDS = ("goal", "days", "dietary_preference", "cuisine_style", "calories", "model", "decoding_profile")
+# Where plans go when their own directory cannot be written
+FALLBACK_DIR = os.path.join(tempfile.gettempdir(), "nutrimind_backup")
+# Finished writes whose final path ``PlanWriter.wait`` can still report
+MAX_FINISHED_WRITES = 4096
+
+
+def render_plan(meal_plan: str, metadata: Optional[Dict[str, Any]] = None) -> str:
+    """Prepend the metadata to a plan as markdown frontmatter, as read back by ``recipe_index.parse_plan``."""
+    if not metadata:
+        return meal_plan
+    frontmatter = "---\n"
+    for k, v in metadata.items():
+        if isinstance(v, list):
+            frontmatter += f"{k}: [{', '.join(map(str, v))}]\n"
+        else:
+            frontmatter += f"{k}: {v}\n"
+    return frontmatter + "---\n\n" + meal_plan
+
+
+def plan_id(content: str) -> str:
+    """Content hash identifying a saved plan; identical plans share an id."""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+
+
+def plan_filename(content: str, metadata: Optional[Dict[str, Any]], output_dir: str) -> str:
+    """
+    Name a plan file after its request and content hash.
+
+    Plans saved in the same second no longer collide, and saving the same
+    plan twice writes the same file.
+    """
+    goal = str(metadata.get("goal", "custom")).lower().replace(" ", "_") if metadata else "plan"
+    cuisine = str(metadata.get("cuisine_style", "")).lower().replace(" ", "_") if metadata else ""
+    date = datetime.now().strftime("%Y%m%d")
+    return os.path.join(output_dir, f"meal_plan_{cuisine}_{goal}_{date}_{plan_id(content)}.md")
+
+
+def write_atomic(path: str, text: str) -> None:
+    """Write to a temporary file next to ``path`` and rename it, so readers never see a partial file."""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class PlanArchive:
+    """
+    SQLite archive of saved plans, compressed and indexed by metadata.
+
+    Each plan is one row keyed by its content hash; the text is stored
+    zlib-compressed and the ``ARCHIVE_FIELDS`` of its metadata get their own
+    indexed columns, so finding e.g. every vegan Indian plan is an index
+    lookup instead of a scan over plan files. Rows are inserted in batches,
+    one transaction per batch.
+    """
+
+    def __init__(self, path: str = os.path.join("meal_plans", "archive.sqlite")):
+        """
+        Args:
+            path: SQLite database file, created if missing
+        """
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock, self._db:
+            # WAL lets lookups read while the writer thread appends
+            self._db.execute("PRAGMA journal_mode=WAL")
+            columns = ", ".join(f"{name} {'INTEGER' if name == 'days' else 'TEXT'}" for name in ARCHIVE_FIELDS)
+            self._db.execute(f"CREATE TABLE IF NOT EXISTS plans (id TEXT PRIMARY KEY, created_at REAL, "
+                             f"file_path TEXT, {columns}, metadata TEXT, size INTEGER, content BLOB)")
+            for name in ARCHIVE_FIELDS + ("created_at",):
+                self._db.execute(f"CREATE INDEX IF NOT EXISTS plans_{name} ON plans ({name})")
+
+    def add_many(self, plans: List[Tuple[str, Optional[str], Dict[str, Any], str]]) -> int:
+        """
+        Insert plans in one transaction; plans already archived are skipped.
+
+        Args:
+            plans: (id, file path or None, metadata, content) tuples
+
+        Returns:
+            Number of plans inserted
+        """
+        rows = []
+        for pid, file_path, metadata, content in plans:
+            encoded = content.encode("utf-8")
+            fields = [metadata.get(name) for name in ARCHIVE_FIELDS]
+            fields = [None if v is None else (int(v) if name == "days" else str(v).strip().lower())
+                      for name, v in zip(ARCHIVE_FIELDS, fields)]
+            rows.append((pid, time.time(), file_path, *fields, json.dumps(metadata, default=str),
+                         len(encoded), zlib.compress(encoded, 6)))
+        placeholders = ", ".join("?" * (len(ARCHIVE_FIELDS) + 6))
+        with self._lock, self._db:
+            before = self._db.total_changes
+            self._db.executemany(f"INSERT OR IGNORE INTO plans VALUES ({placeholders})", rows)
+            return self._db.total_changes - before
+
+    def get(self, pid: str) -> Optional[Dict[str, Any]]:
+        """Return an archived plan's metadata and decompressed text, or None."""
+        with self._lock:
+            row = self._db.execute("SELECT * FROM plans WHERE id = ?", (pid,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": row["id"],
+            "file_path": row["file_path"],
+            "created_at": row["created_at"],
+            "metadata": json.loads(row["metadata"]),
+            "meal_plan": zlib.decompress(row["content"]).decode("utf-8")
+        }
+
+    def find(self, limit: int = 50, **filters: Any) -> List[Dict[str, Any]]:
+        """
+        Find archived plans by metadata, newest first, without reading their text.
+
+        Args:
+            limit: Most plans to return
+            **filters: ``ARCHIVE_FIELDS`` values to match (case-insensitive)
+
+        Returns:
+            Summaries with id, file path, creation time and metadata
+
+        Raises:
+            ValueError: If a filter is not one of ``ARCHIVE_FIELDS``
+        """
+        unknown = set(filters) - set(ARCHIVE_FIELDS)
+        if unknown:
+            raise ValueError(f"Cannot filter plans by {', '.join(sorted(unknown))}. "
+                             f"Choose from: {', '.join(ARCHIVE_FIELDS)}")
+        where = " AND ".join(f"{name} = ?" for name in filters) or "1"
+        values = [int(v) if name == "days" else str(v).strip().lower() for name, v in filters.items()]
+        with self._lock:
+            rows = self._db.execute(f"SELECT id, file_path, created_at, metadata FROM plans WHERE {where} "
+                                    f"ORDER BY created_at DESC LIMIT ?", (*values, int(limit))).fetchall()
+        return [{"id": row["id"], "file_path": row["file_path"], "created_at": row["created_at"],
+                 "metadata": json.loads(row["metadata"])} for row in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the number of archived plans and their raw and compressed sizes."""
+        with self._lock:
+            count, raw, stored = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(LENGTH(content)), 0) FROM plans").fetchone()
+        return {
+            "plans": count,
+            "bytes": raw,
+            "compressed_bytes": stored,
+            "compression_ratio": round(raw / stored, 2) if stored else 0.0
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class _Write:
+    """One queued write: a plan (with its archive id and metadata) or a plain file."""
+
+    __slots__ = ("path", "text", "pid", "metadata", "on_saved", "key", "done")
+
+    def __init__(self, path: Optional[str], text: str, pid: Optional[str] = None,
+                 metadata: Optional[Dict[str, Any]] = None,
+                 on_saved: Optional[Callable[[str, str], None]] = None):
+        self.path = path
+        self.text = text
+        self.pid = pid
+        self.metadata = metadata
+        self.on_saved = on_saved
+        # Path returned by ``save_plan``, under which ``PlanWriter.wait`` finds this write
+        self.key = path
+        self.done = threading.Event()
+
+
+class PlanWriter:
+    """
+    Saves generated plans from a background thread, off the request path.
+
+    ``save_plan`` names the plan after its content hash and returns at once;
+    a writer thread drains the queue in batches, writing each file to a
+    temporary name and renaming it into place, and appends the batch to the
+    ``PlanArchive`` in a single transaction. With ``write_files`` off, plans
+    only go to the archive instead of one small file each. Files that cannot
+    be written go to ``FALLBACK_DIR`` under the same collision-free name;
+    an unwritable directory is detected when the plan is queued, so the
+    returned path already points there, and ``wait`` reports where a plan
+    really ended up. Pending writes are flushed when the process exits.
+    """
+
+    def __init__(self, output_dir: str = "meal_plans", archive: Optional[PlanArchive] = None,
+                 write_files: bool = True, max_batch: int = 64, max_pending: int = 1024):
+        """
+        Args:
+            output_dir: Directory for plan files
+            archive: Optional archive every plan is also appended to
+            write_files: Write one markdown file per plan (requires ``archive`` when off)
+            max_batch: Most writes handled per batch
+            max_pending: Queued writes before ``save_plan`` blocks until the writer catches up
+        """
+        if not write_files and archive is None:
+            raise ValueError("Plans must be written to files, an archive, or both")
+        self.output_dir = output_dir
+        self.archive = archive
+        self.write_files = write_files
+        self.max_batch = max_batch
+        self._queue: "queue.Queue[_Write]" = queue.Queue(maxsize=max_pending)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._created_dirs = set()
+        # Queued writes by returned path, and the final path (None if failed) of finished ones
+        self._pending: Dict[str, _Write] = {}
+        self._finished: "OrderedDict[str, Optional[str]]" = OrderedDict()
+        self._paths_lock = threading.Lock()
+        self.saved = 0
+        self.failed = 0
+        self.batches = 0
+
+    def save_plan(self, meal_plan: str, metadata: Optional[Dict[str, Any]] = None, filename: Optional[str] = None,
+                  on_saved: Optional[Callable[[str, str], None]] = None) -> str:
+        """
+        Queue a plan for saving.
+
+        Args:
+            meal_plan: The generated meal plan text
+            metadata: Metadata saved as frontmatter and archive columns
+            filename: Optional file name; bare names go into ``output_dir``
+            on_saved: Called from the writer thread with the path and content once the file is written
+
+        Returns:
+            Path the plan file will have, or ``<archive>#<id>`` when only archiving;
+            pass it to ``wait`` to block until the plan is saved
+        """
+        content = render_plan(meal_plan, metadata)
+        pid = plan_id(content)
+        if not filename:
+            filename = plan_filename(content, metadata, self.output_dir)
+        elif not os.path.dirname(filename):
+            filename = os.path.join(self.output_dir, filename)
+        path = None
+        if self.write_files:
+            path = filename if self._writable(os.path.dirname(filename)) else self._fallback_path(filename)
+        write = _Write(path, content, pid, metadata or {}, on_saved)
+        write.key = path or f"{self.archive.path}#{pid}"
+        with self._paths_lock:
+            self._pending[write.key] = write
+        self._put(write)
+        return write.key
+
+    def save_file(self, path: str, text: str) -> None:
+        """Queue a plain file write, e.g. a plan's structured JSON; writes keep their queue order."""
+        self._put(_Write(path, text))
+
+    def wait(self, path: str, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        Wait until the plan queued under ``path`` is saved.
+
+        Args:
+            path: Path returned by ``save_plan``
+            timeout: Seconds to wait at most
+
+        Returns:
+            Where the plan was saved (a fallback path if its own could not be
+            written), or None if it could not be saved or is still queued after
+            ``timeout``
+        """
+        with self._paths_lock:
+            write = self._pending.get(path)
+        if write is not None and not write.done.wait(timeout):
+            return None
+        with self._paths_lock:
+            # Paths never queued here are taken as already saved
+            return self._finished.get(path, path)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every queued write is done.
+
+        Returns:
+            Whether the queue drained before the timeout
+        """
+        if self._thread is None:
+            return True
+        if timeout is None:
+            self._queue.join()
+            return True
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue depth, write counts and archive statistics."""
+        stats = {
+            "pending": self.pending(),
+            "saved": self.saved,
+            "failed": self.failed,
+            "batches": self.batches,
+            "write_files": self.write_files
+        }
+        if self.archive is not None:
+            stats["archive"] = self.archive.stats()
+        return stats
+
+    def _put(self, write: _Write) -> None:
+        self._ensure_started()
+        self._queue.put(write)
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="plan-writer", daemon=True)
+                self._thread.start()
+                # The thread is a daemon, so finish queued writes before the interpreter exits
+                atexit.register(self.flush)
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                logger.error(f"❌ Plan writer batch failed: {str(e)}")
+                ERRORS.inc(type=type(e).__name__)
+                for write in batch:
+                    if not write.done.is_set():
+                        self._finish(write, None)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _finish(self, write: _Write, path: Optional[str]) -> None:
+        """Record where a queued plan ended up (None if it was not saved) and wake its waiters."""
+        if write.pid is not None:
+            with self._paths_lock:
+                if self._pending.get(write.key) is write:
+                    del self._pending[write.key]
+                self._finished[write.key] = path
+                self._finished.move_to_end(write.key)
+                while len(self._finished) > MAX_FINISHED_WRITES:
+                    self._finished.popitem(last=False)
+        write.done.set()
+
+    def _write_batch(self, batch: List[_Write]) -> None:
+        """Write the files of a batch, then archive its plans in one transaction."""
+        start = time.perf_counter()
+        saved = []
+        for write in batch:
+            path = write.path
+            if path is not None:
+                path = self._write_file(path, write.text)
+                if path is None:
+                    self.failed += 1
+                    self._finish(write, None)
+                    continue
+            if write.pid is not None:
+                saved.append((write, path))
+
+        if self.archive is not None and saved:
+            try:
+                self.archive.add_many([(write.pid, path, write.metadata, write.text) for write, path in saved])
+            except Exception as e:
+                logger.error(f"❌ Could not archive {len(saved)} plans: {str(e)}")
+                ERRORS.inc(type=type(e).__name__)
+                if not self.write_files:
+                    self.failed += len(saved)
+                    for write, _ in saved:
+                        self._finish(write, None)
+                    saved = []
+
+        for write, path in saved:
+            self.saved += 1
+            self._finish(write, path or write.key)
+            logger.info(f"✅ Meal plan saved to {path or write.key}")
+            if write.on_saved is not None and path is not None:
+                try:
+                    write.on_saved(path, write.text)
+                except Exception as e:
+                    logger.warning(f"⚠️ Post-save hook failed for {path}: {str(e)}")
+        self.batches += 1
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage="persist")
+
+    def _writable(self, directory: str) -> bool:
+        """Create ``directory`` if needed and check plans can be written to it."""
+        if not directory or directory in self._created_dirs:
+            return True
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError as e:
+            logger.error(f"❌ Cannot create {directory}: {str(e)}")
+            return False
+        if not os.access(directory, os.W_OK):
+            logger.error(f"❌ {directory} is not writable")
+            return False
+        self._created_dirs.add(directory)
+        return True
+
+    @staticmethod
+    def _fallback_path(path: str) -> str:
+        fallback = os.path.join(FALLBACK_DIR, os.path.basename(path))
+        logger.warning(f"⚠️ Saving {os.path.basename(path)} to {FALLBACK_DIR} instead")
+        return fallback
+
+    def _write_file(self, path: str, text: str) -> Optional[str]:
+        """Write one file atomically, falling back to ``FALLBACK_DIR``; returns the path written or None."""
+        directory = os.path.dirname(path)
+        try:
+            if directory and directory not in self._created_dirs:
+                os.makedirs(directory, exist_ok=True)
+                self._created_dirs.add(directory)
+            write_atomic(path, text)
+            return path
+        except Exception as e:
+            logger.error(f"❌ Failed to save {path}: {str(e)}")
+            # The directory may have been removed since it was created
+            self._created_dirs.discard(directory)
+            ERRORS.inc(type=type(e).__name__)
+            fallback = os.path.join(FALLBACK_DIR, os.path.basename(path))
+            try:
+                os.makedirs(FALLBACK_DIR, exist_ok=True)
+                write_atomic(fallback, text)
+                logger.warning(f"⚠️ Backup saved to {fallback}")
+                return fallback
+            except Exception:
+                logger.error("❌ Could not save backup file either")
+                return None
@@ -0,0 +1,116 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def cache_nbytes(past_key_values: Any) -> int:
+    """
+    Estimate the memory held by a transformers ``Cache`` object.
+
+    Args:
+        past_key_values: A ``DynamicCache`` (or compatible) instance
+
+    Returns:
+        Total size in bytes of the cached key and value tensors
+    """
+    layers = getattr(past_key_values, "layers", None)
+    if layers is not None:
+        tensors = [t for layer in layers for t in (layer.keys, layer.values) if t is not None]
+    else:
+        # Older transformers releases keep flat per-layer lists
+        tensors = list(getattr(past_key_values, "key_cache", [])) + list(getattr(past_key_values, "value_cache", []))
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+class PrefixCache:
+    """
+    LRU cache of ``past_key_values`` for shared prompt prefixes.
+
+    Meal plan prompts share a long header (system prompt, base prompt, dietary
+    requirements and cuisine guidelines) that is fully determined by the goal,
+    diet, cuisine, allergies and calorie target. Caching the attention state for
+    that header lets each day and each later request with the same profile skip
+    its prefill. Entries are evicted least-recently-used first once the total
+    size exceeds ``max_bytes``.
+    """
+
+    def __init__(self, max_bytes: int):
+        """
+        Initialize an empty prefix cache.
+
+        Args:
+            max_bytes: Memory budget for all cached entries combined
+        """
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Tuple[List[int], Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[List[int], Any]]:
+        """
+        Look up a cached prefix and mark it as most recently used.
+
+        Args:
+            key: The formatted prefix text
+
+        Returns:
+            Tuple of (prefix token ids, past_key_values) or None on a miss.
+            Callers must copy the cache before letting ``generate`` extend it.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def put(self, key: str, input_ids: List[int], past_key_values: Any) -> bool:
+        """
+        Store the attention state for a prefix, evicting old entries as needed.
+
+        Args:
+            key: The formatted prefix text
+            input_ids: Token ids the cache was computed from
+            past_key_values: The prefilled cache for ``input_ids``
+
+        Returns:
+            True if the entry was stored, False if it alone exceeds the budget
+        """
+        size = cache_nbytes(past_key_values)
+        if size > self.max_bytes:
+            return False
+
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[2]
+            self._entries[key] = (input_ids, past_key_values, size)
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes and self._entries:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+        return True
+
+    def clear(self) -> None:
+        """Drop every cached prefix."""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and current memory usage."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
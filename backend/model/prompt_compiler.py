@@ -0,0 +1,292 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    from .telemetry import get_logger
+except ImportError:
+    # Running as a script from inside model/
+    from telemetry import get_logger
+
+logger = get_logger("prompt_compiler")
+
+# Token budget of each kind of prompt segment, per prompt. Registered segments
+# are static text ("chat" markup, the "structure" a response must follow and
+# cuisine "guidelines"); everything else is "request" text built from user
+# input. Static segments over budget are shortened when registered; prompts
+# whose request text is over budget are rejected rather than cut, since any
+# cut could drop part of the request such as the allergies.
+SEGMENT_BUDGETS = {"chat": 64, "structure": 640, "guidelines": 256, "request": 512}
+# Longest prompt the budgets allow
+MAX_PROMPT_TOKENS = sum(SEGMENT_BUDGETS.values())
+# Request pieces whose token ids are kept
+MAX_CACHED_PIECES = 2048
+
+
+class PromptTooLongError(ValueError):
+    """Raised when a prompt's request text is over its token budget."""
+
+
+def segment_lines(text: str) -> str:
+    """
+    The part of a template text that is pre-tokenized as a segment.
+
+    Tokenizers merge runs of whitespace (blank lines, indentation) into
+    single tokens, so segments are cut where no run is split: from the
+    first line's text, keeping the one space of indentation that joins the
+    first word, to the last non-whitespace character. The whitespace around
+    them is tokenized with the surrounding request text.
+    """
+    body = text.lstrip()
+    if body and len(text) > len(body) and text[len(text) - len(body) - 1] == " ":
+        body = " " + body
+    return body.rstrip()
+
+
+class CompiledPrompt:
+    """Token ids of one prompt plus how many tokens each kind of segment used."""
+
+    __slots__ = ("input_ids", "usage")
+
+    def __init__(self, input_ids: List[int], usage: Dict[str, int]):
+        self.input_ids = input_ids
+        self.usage = usage
+
+
+class PromptCompiler:
+    """
+    Assembles prompt token ids from pre-tokenized template segments.
+
+    Static segments (the chat markup, the meal and guidance structures and
+    every cuisine guideline) are tokenized once when registered. Compiling a
+    prompt finds those segments in its text, tokenizes only the request text
+    between them (with a small cache, since the same request text repeats
+    across the days of a plan) and concatenates the cached arrays. Request
+    text is tokenized between the character before it and the first
+    characters of the segment after it, and those context tokens are then
+    dropped, so whitespace runs at a boundary tokenize as they do in the
+    whole prompt. ``verify`` checks the assembled ids against whole-prompt
+    tokenization for the loaded tokenizer; where they differ, prompts are
+    tokenized whole, with the same budgets.
+    """
+
+    def __init__(self, tokenizer: Any, head: str, budgets: Optional[Dict[str, int]] = None):
+        """
+        Args:
+            tokenizer: The model's tokenizer
+            head: Chat markup every formatted prompt starts with
+            budgets: Token budget per segment kind (default ``SEGMENT_BUDGETS``)
+        """
+        self.tokenizer = tokenizer
+        self.head = head
+        self.budgets = dict(budgets or SEGMENT_BUDGETS)
+        self.max_tokens = sum(self.budgets.values())
+        self.exact = True
+        self._head_ids = tokenizer(head)["input_ids"]
+        self._special = set(getattr(tokenizer, "all_special_tokens", [])) | set(tokenizer.get_added_vocab())
+        # (text, kind, ids, lead) longest first, so a segment is never matched inside a longer one
+        self._segments: List[Tuple[str, str, List[int], str]] = []
+        self._pieces: "OrderedDict[Tuple[str, str, str], List[int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._check_budget("chat", len(self._head_ids), "The chat header")
+
+    def _encode(self, text: str) -> List[int]:
+        return self.tokenizer(text, add_special_tokens=False)["input_ids"]
+
+    def _encode_piece(self, text: str, anchor: str, lookahead: str = "") -> List[int]:
+        """Token ids of ``text`` as it reads after ``anchor`` and before ``lookahead``."""
+        if anchor == self.head:
+            anchor_ids, ids = self._head_ids, self.tokenizer(anchor + text + lookahead)["input_ids"]
+        else:
+            anchor_ids, ids = self._encode(anchor), self._encode(anchor + text + lookahead)
+        lookahead_ids = self._encode(lookahead) if lookahead else []
+        end = len(ids) - len(lookahead_ids)
+        if ids[:len(anchor_ids)] != anchor_ids or ids[end:] != lookahead_ids:
+            # The piece merged with its context; the concatenation would not match a whole-prompt encoding
+            self.exact = False
+        return ids[len(anchor_ids):end]
+
+    def _check_budget(self, kind: str, tokens: int, what: str) -> None:
+        if tokens > self.budgets[kind]:
+            raise ValueError(f"{what} needs {tokens} tokens, over the {self.budgets[kind]}-token {kind} budget")
+
+    def _lead(self, text: str) -> str:
+        """Leading characters of a segment that decide how the whitespace before it tokenizes."""
+        if any(text.startswith(token) for token in self._special):
+            # Text is split at special tokens before it is tokenized, so nothing before one merges with it
+            return ""
+        stripped = text.lstrip()
+        return text[:len(text) - len(stripped) + 1]
+
+    def register(self, kind: str, text: str, ends_prompt: bool = False) -> str:
+        """
+        Pre-tokenize a static template segment.
+
+        A segment over its kind's budget is shortened, by whole lines where it
+        has several, and a warning is logged; prompts must then use the
+        returned text for the segment to be found in them.
+
+        Args:
+            kind: Segment kind in ``budgets`` ("chat", "structure" or "guidelines")
+            text: Template text (see ``segment_lines`` for the part that is used)
+            ends_prompt: The segment closes prompts (e.g. the chat markup after the
+                user turn) and is used as is
+
+        Returns:
+            The segment text as registered
+        """
+        if not ends_prompt:
+            text = segment_lines(text)
+        if not text:
+            return text
+        # Segments follow a line break or the space before an indented line
+        ids = self._encode_piece(text, "\n")
+        if len(ids) > self.budgets[kind]:
+            logger.warning(f"⚠️ Prompt segment {text[:40]!r} needs {len(ids)} tokens, over the "
+                           f"{self.budgets[kind]}-token {kind} budget; shortening it")
+            while len(ids) > self.budgets[kind]:
+                if "\n" in text:
+                    text = text[:text.rfind("\n")].rstrip()
+                else:
+                    text = text[:len(text) * self.budgets[kind] // len(ids)].rstrip()
+                ids = self._encode_piece(text, "\n")
+        with self._lock:
+            self._segments.append((text, kind, ids, self._lead(text)))
+            self._segments.sort(key=lambda segment: -len(segment[0]))
+        return text
+
+    def _split(self, body: str) -> List[Tuple[int, int, Optional[Tuple[str, List[int], str]]]]:
+        """Cut ``body`` into (start, end, static segment or None for request text) pieces."""
+        taken: List[Tuple[int, int, Tuple[str, List[int], str]]] = []
+        for text, kind, ids, lead in self._segments:
+            start = body.find(text)
+            while start != -1:
+                end = start + len(text)
+                # Only whole segments set off by whitespace; the first piece follows the chat header
+                bounded = start > 0 and body[start - 1] in "\n " and (end == len(body) or body[end].isspace())
+                if bounded and all(end <= s or start >= e for s, e, _ in taken):
+                    taken.append((start, end, (kind, ids, lead)))
+                start = body.find(text, start + 1)
+        taken.sort()
+
+        pieces = []
+        position = 0
+        for start, end, segment in taken:
+            if start > position:
+                pieces.append((position, start, None))
+            pieces.append((start, end, segment))
+            position = end
+        if position < len(body):
+            pieces.append((position, len(body), None))
+        return pieces
+
+    def _request_ids(self, text: str, anchor: str, lookahead: str) -> List[int]:
+        key = (text, anchor, lookahead)
+        with self._lock:
+            ids = self._pieces.get(key)
+            if ids is not None:
+                self._pieces.move_to_end(key)
+                return ids
+        ids = self._encode_piece(text, anchor, lookahead)
+        with self._lock:
+            self._pieces[key] = ids
+            while len(self._pieces) > MAX_CACHED_PIECES:
+                self._pieces.popitem(last=False)
+        return ids
+
+    def _check_usage(self, usage: Dict[str, int]) -> None:
+        for kind in ("chat", "structure", "guidelines"):
+            self._check_budget(kind, usage[kind], "The prompt's static segments")
+        if usage["request"] > self.budgets["request"]:
+            raise PromptTooLongError(
+                f"The request needs {usage['request']} prompt tokens, over the {self.budgets['request']}-token "
+                "budget for request text; shorten the goal, allergies or other free-text fields")
+
+    def compile(self, prompt: str) -> CompiledPrompt:
+        """
+        Build the token ids of a formatted prompt.
+
+        Args:
+            prompt: Prompt wrapped in the chat markup (or the leading part of one)
+
+        Returns:
+            The prompt's ids and per-kind token usage
+
+        Raises:
+            PromptTooLongError: If the prompt's request text is over its budget
+            ValueError: If the prompt's static segments are over their budgets
+        """
+        if not self.exact or not prompt.startswith(self.head):
+            return self._compile_whole(prompt)
+        body = prompt[len(self.head):]
+
+        split = self._split(body)
+        pieces: List[Tuple[str, List[int]]] = []
+        for index, (start, end, segment) in enumerate(split):
+            if segment is not None:
+                pieces.append(segment[:2])
+                continue
+            anchor = body[start - 1] if start > 0 else self.head
+            # Request text is always followed by a segment or the end of the prompt
+            lookahead = split[index + 1][2][2] if index + 1 < len(split) else ""
+            pieces.append(("request", self._request_ids(body[start:end], anchor, lookahead)))
+
+        usage = {kind: 0 for kind in self.budgets}
+        usage["chat"] += len(self._head_ids)
+        for kind, ids in pieces:
+            usage[kind] += len(ids)
+        self._check_usage(usage)
+
+        if not self.exact:
+            return self._compile_whole(prompt)
+        input_ids = list(self._head_ids)
+        for _, ids in pieces:
+            input_ids.extend(ids)
+        return CompiledPrompt(input_ids, usage)
+
+    def _compile_whole(self, prompt: str) -> CompiledPrompt:
+        """
+        Tokenize a prompt in one go, within the same budgets.
+
+        Usage counts the static segments found in the prompt at their
+        pre-tokenized lengths and everything else as request tokens.
+        """
+        input_ids = self.tokenizer(prompt)["input_ids"]
+        usage = {kind: 0 for kind in self.budgets}
+        if prompt.startswith(self.head):
+            usage["chat"] += len(self._head_ids)
+            for _, _, segment in self._split(prompt[len(self.head):]):
+                if segment is not None:
+                    usage[segment[0]] += len(segment[1])
+        usage["request"] = max(0, len(input_ids) - sum(usage.values()))
+        self._check_usage(usage)
+        return CompiledPrompt(input_ids, usage)
+
+    def verify(self, prompts: Sequence[str]) -> bool:
+        """
+        Check that assembled ids equal whole-prompt tokenization for sample prompts.
+
+        Falls back to whole-prompt tokenization (``exact`` False) if any differ.
+
+        Returns:
+            Whether assembled prompts are used
+        """
+        for prompt in prompts:
+            if not self.exact:
+                break
+            if self.compile(prompt).input_ids != self.tokenizer(prompt)["input_ids"]:
+                self.exact = False
+        if not self.exact:
+            logger.warning("⚠️ This tokenizer merges tokens across prompt segments; tokenizing prompts whole")
+        return self.exact
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the registered segments, their tokens and whether assembly is exact."""
+        with self._lock:
+            return {
+                "exact": self.exact,
+                "segments": len(self._segments),
+                "segment_tokens": sum(len(segment[2]) for segment in self._segments),
+                "cached_request_pieces": len(self._pieces),
+                "budgets": dict(self.budgets)
+            }
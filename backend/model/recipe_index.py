@@ -0,0 +1,431 @@
+import os
+import re
+import glob
+import json
+import hashlib
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set, Union
+
+try:
+    from .stopping import DAY_SECTIONS, GUIDANCE_SECTIONS, heading_key
+    from .telemetry import get_logger
+except ImportError:
+    # Running as a script from inside model/
+    from stopping import DAY_SECTIONS, GUIDANCE_SECTIONS, heading_key
+    from telemetry import get_logger
+
+logger = get_logger("recipe_index")
+
+# Slot name used for the additional guidance section of a plan
+GUIDANCE_SLOT = "guidance"
+
+# Words that mark a meal as containing an allergen; matched as whole words (plurals included)
+ALLERGEN_KEYWORDS: Dict[str, List[str]] = {
+    "dairy": ["milk", "paneer", "cheese", "yogurt", "yoghurt", "curd", "ghee", "butter", "cream", "whey",
+              "feta", "ricotta", "labneh", "lassi", "raita"],
+    "gluten": ["wheat", "bread", "roti", "chapati", "naan", "paratha", "pasta", "barley", "rye", "semolina",
+               "couscous", "bulgur", "seitan", "noodle", "pita", "flour"],
+    "nuts": ["nut", "almond", "cashew", "walnut", "pistachio", "hazelnut", "pecan"],
+    "peanuts": ["peanut"],
+    "eggs": ["egg", "omelette", "omelet"],
+    "soy": ["soy", "tofu", "tempeh", "edamame", "miso"],
+    "fish": ["fish", "salmon", "tuna", "cod", "sardine", "mackerel", "anchovy", "tilapia"],
+    "shellfish": ["shrimp", "prawn", "crab", "lobster", "mussel", "clam", "oyster", "scallop"],
+    "sesame": ["sesame", "tahini"]
+}
+
+# Other names for allergens and the ``ALLERGEN_KEYWORDS`` tags they stand for
+ALLERGEN_SYNONYMS: Dict[str, List[str]] = {
+    "lactose": ["dairy"], "casein": ["dairy"], "cow milk": ["dairy"], "milk protein": ["dairy"],
+    "celiac": ["gluten"], "coeliac": ["gluten"], "spelt": ["gluten"],
+    "tree nut": ["nuts"], "mixed nut": ["nuts"],
+    "groundnut": ["peanuts"], "egg white": ["eggs"], "egg yolk": ["eggs"],
+    "soya": ["soy"], "soybean": ["soy"], "soya bean": ["soy"],
+    "crustacean": ["shellfish"], "mollusc": ["shellfish"], "mollusk": ["shellfish"],
+    "seafood": ["fish", "shellfish"], "sesame seed": ["sesame"]
+}
+
+# Words that qualify an allergy without naming another allergen ("shellfish allergy", "dairy products")
+_ALLERGY_FILLER = {"allergy", "allergies", "allergic", "intolerance", "intolerant", "sensitivity", "free",
+                   "product", "products", "food", "foods", "to", "no", "avoid", "any", "all", "none"}
+
+# Diets whose meals also satisfy the requested one
+DIET_COMPATIBLE: Dict[str, List[str]] = {
+    "vegan": ["vegan"],
+    "vegetarian": ["vegetarian", "vegan"],
+    "pescatarian": ["pescatarian", "vegetarian", "vegan"],
+    "non-vegetarian": ["non-vegetarian", "pescatarian", "vegetarian", "vegan"]
+}
+
+# Meals shorter than this or without a calorie figure, and guidance without any of
+# its section headings, are too thin to reuse
+MIN_MEAL_CHARS = 80
+
+_CALORIES = re.compile(r"calories?\W{0,10}(\d{2,4})", re.IGNORECASE)
+_RECIPE_NAME = re.compile(r"recipe name[^:]*:\**\s*(.+)", re.IGNORECASE)
+_BOLD = re.compile(r"\*\*([^*]{3,80})\*\*")
+_DAY_HEADING = re.compile(r"^## Day \d+\s*$", re.MULTILINE)
+_SLOTS = {name.lower(): name for name in DAY_SECTIONS}
+_GUIDANCE_HEADINGS = {name.lower() for name in GUIDANCE_SECTIONS}
+
+
+def _normalize(value: str) -> str:
+    return " ".join(str(value).lower().split())
+
+
+def _mentions(text: str, word: str) -> bool:
+    """Whether ``word`` (or its plural) appears in ``text`` as a whole word."""
+    return re.search(rf"\b{re.escape(word)}(?:s|es)?\b", text) is not None
+
+
+def detect_allergens(text: str) -> List[str]:
+    """Return the ``ALLERGEN_KEYWORDS`` tags whose keywords appear in ``text``."""
+    lowered = text.lower()
+    return sorted(tag for tag, words in ALLERGEN_KEYWORDS.items() if any(_mentions(lowered, w) for w in words))
+
+
+def _singular(name: str) -> str:
+    if name.endswith("ies"):
+        return name[:-3] + "y"
+    return name[:-1] if name.endswith("s") and not name.endswith("ss") else name
+
+
+def _allergen_names() -> Dict[str, Set[str]]:
+    """Allergen names (tags, keywords and synonyms, in singular form) to the tags they stand for."""
+    names: Dict[str, Set[str]] = {}
+    for tag, words in ALLERGEN_KEYWORDS.items():
+        for name in (tag, *words):
+            names.setdefault(_singular(name), set()).add(tag)
+    for name, tags in ALLERGEN_SYNONYMS.items():
+        names.setdefault(_singular(name), set()).update(tags)
+    return names
+
+
+_ALLERGEN_NAMES = _allergen_names()
+
+
+def _allergy_tags(allergy: str) -> Optional[Set[str]]:
+    """
+    Tags of one free-text allergy, or None if any part of it names no known allergen.
+
+    The allergy is split on "and", "or", commas and slashes; each part, less
+    words such as "allergy" or "products", must be an allergen tag, keyword
+    or synonym.
+    """
+    tags: Set[str] = set()
+    for part in re.split(r"[,/&;+]|\band\b|\bor\b", _normalize(allergy).replace("'s", "")):
+        words = [word for word in re.findall(r"[a-z]+", part) if word not in _ALLERGY_FILLER]
+        if not words:
+            continue
+        name = _singular(" ".join(words))
+        if name not in _ALLERGEN_NAMES:
+            return None
+        tags |= _ALLERGEN_NAMES[name]
+    return tags
+
+
+def allergen_tags(allergies: Iterable[str]) -> Set[str]:
+    """Map free-text allergies (e.g. "Peanuts", "lactose", "tree nuts") to ``ALLERGEN_KEYWORDS`` tags."""
+    tags: Set[str] = set()
+    for allergy in allergies:
+        tags |= _allergy_tags(allergy) or set()
+    return tags
+
+
+def unmapped_allergies(allergies: Iterable[str]) -> List[str]:
+    """
+    Return the allergies that map to no ``ALLERGEN_KEYWORDS`` tag.
+
+    Indexed meals are only tagged with known allergens, so meals cannot be
+    safely reused for a request with any of these.
+    """
+    return [allergy for allergy in allergies if allergy.strip() and _allergy_tags(allergy) is None]
+
+
+def parse_plan(content: str) -> Dict[str, Any]:
+    """
+    Split a saved meal plan into its frontmatter metadata, meals and guidance.
+
+    Args:
+        content: Markdown written by ``MealPlanGenerator.save_meal_plan_to_file``
+
+    Returns:
+        Dictionary with ``metadata``, ``meals`` (slot, text) pairs and ``guidance`` text
+    """
+    metadata: Dict[str, str] = {}
+    body = content
+    if content.startswith("---\n"):
+        end = content.find("\n---\n", 4)
+        if end != -1:
+            for line in content[4:end].splitlines():
+                key, sep, value = line.partition(":")
+                if sep:
+                    metadata[key.strip()] = value.strip()
+            body = content[end + 5:]
+
+    guidance = ""
+    if "## Additional Guidance" in body:
+        body, guidance = body.split("## Additional Guidance", 1)
+        guidance = guidance.strip()
+
+    meals = []
+    for day_text in _DAY_HEADING.split(body)[1:]:
+        day_text = day_text.split("\n---\n", 1)[0]
+        slot, lines = None, []
+        for line in day_text.splitlines():
+            key = heading_key(line)
+            if key in _SLOTS:
+                if slot is not None:
+                    meals.append((slot, "\n".join(lines).strip()))
+                slot, lines = _SLOTS[key], [line]
+            elif slot is not None:
+                lines.append(line)
+        if slot is not None:
+            meals.append((slot, "\n".join(lines).strip()))
+    return {"metadata": metadata, "meals": meals, "guidance": guidance}
+
+
+def _meal_name(slot: str, text: str) -> str:
+    """Best-effort recipe name of an indexed meal."""
+    match = _RECIPE_NAME.search(text)
+    if match:
+        return match.group(1).strip(" *")
+    for bold in _BOLD.findall(text):
+        if _normalize(bold) not in _SLOTS:
+            return bold.strip()
+    return slot
+
+
+class RecipeIndex:
+    """
+    On-disk index of meals from previously generated plans.
+
+    Saved plans are split into one record per meal, tagged with the plan's
+    cuisine, diet, goal and calorie target, the meal slot (breakfast, lunch,
+    ...) and the allergens its text mentions. An inverted index maps terms
+    such as ``cuisine:indian`` or ``allergen:dairy`` to record ids, so finding
+    meals for a request is a few set intersections. Guidance sections are
+    indexed the same way under the ``guidance`` slot.
+
+    Records are appended to ``records.jsonl`` and the postings plus the list
+    of indexed files are written to ``index.json``, so the index survives
+    restarts and only new plan files are parsed on refresh.
+    """
+
+    def __init__(self, index_dir: str = os.path.join("meal_plans", "recipe_index"),
+                 plans_dir: str = "meal_plans"):
+        """
+        Args:
+            index_dir: Directory holding the index files
+            plans_dir: Directory of saved plans to index
+        """
+        self.index_dir = index_dir
+        self.plans_dir = plans_dir
+        self._records: Dict[str, Dict[str, Any]] = {}
+        self._postings: Dict[str, Set[str]] = {}
+        self._sources: Dict[str, float] = {}
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._records)
+
+    def _ensure_loaded(self) -> None:
+        """Load the index from disk, then pick up any plans saved since."""
+        if self._loaded:
+            return
+        self._loaded = True
+        records_path = os.path.join(self.index_dir, "records.jsonl")
+        index_path = os.path.join(self.index_dir, "index.json")
+        try:
+            if os.path.exists(records_path) and os.path.exists(index_path):
+                with open(records_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            record = json.loads(line)
+                            self._records[record["id"]] = record
+                with open(index_path, "r", encoding="utf-8") as f:
+                    index = json.load(f)
+                self._postings = {term: set(ids) & set(self._records) for term, ids in index["postings"].items()}
+                self._sources = index["sources"]
+        except Exception as e:
+            logger.warning(f"⚠️ Could not read recipe index, rebuilding it: {str(e)}")
+            self._records, self._postings, self._sources = {}, {}, {}
+        self.refresh()
+
+    def refresh(self) -> int:
+        """
+        Index plan files in ``plans_dir`` that are new or changed since they were last indexed.
+
+        Returns:
+            Number of meal records added
+        """
+        with self._lock:
+            self._ensure_loaded()
+            added = []
+            for path in sorted(glob.glob(os.path.join(self.plans_dir, "**", "*.md"), recursive=True)):
+                mtime = os.path.getmtime(path)
+                if self._sources.get(path) == mtime:
+                    continue
+                added.extend(self._index_file(path))
+                self._sources[path] = mtime
+            if added or not os.path.exists(os.path.join(self.index_dir, "index.json")):
+                self._save(added)
+            if added:
+                logger.info(f"✅ Indexed {len(added)} meals ({len(self._records)} total)")
+            return len(added)
+
+    def add_plan(self, path: str) -> int:
+        """
+        Index one saved plan file right away.
+
+        Returns:
+            Number of meal records added
+        """
+        with self._lock:
+            self._ensure_loaded()
+            added = self._index_file(path)
+            self._sources[path] = os.path.getmtime(path)
+            self._save(added)
+            return len(added)
+
+    def _index_file(self, path: str) -> List[Dict[str, Any]]:
+        """Parse a plan file and add its new meal and guidance records."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                plan = parse_plan(f.read())
+        except Exception as e:
+            logger.warning(f"⚠️ Could not index {path}: {str(e)}")
+            return []
+        metadata = plan["metadata"]
+        if not metadata.get("cuisine_style") or not metadata.get("dietary_preference"):
+            return []
+
+        sections = list(plan["meals"])
+        if plan["guidance"]:
+            sections.append((GUIDANCE_SLOT, plan["guidance"]))
+        added = []
+        for slot, text in sections:
+            calories = _CALORIES.search(text)
+            if len(text) < MIN_MEAL_CHARS:
+                continue
+            if slot == GUIDANCE_SLOT:
+                if not any(heading_key(line) in _GUIDANCE_HEADINGS for line in text.splitlines()):
+                    continue
+            elif calories is None:
+                continue
+            record_id = hashlib.sha1(f"{slot}\n{text}".encode("utf-8")).hexdigest()[:16]
+            if record_id in self._records:
+                continue
+            record = {
+                "id": record_id,
+                "slot": _normalize(slot),
+                "name": _meal_name(slot, text) if slot != GUIDANCE_SLOT else GUIDANCE_SLOT,
+                "cuisine": _normalize(metadata["cuisine_style"]),
+                "diet": _normalize(metadata["dietary_preference"]),
+                "goal": _normalize(metadata.get("goal", "")),
+                "calorie_target": metadata.get("calories", "").replace(" ", ""),
+                "days": metadata.get("days", ""),
+                "calories": int(calories.group(1)) if calories else None,
+                "allergens": detect_allergens(text),
+                "text": text,
+                "source": path
+            }
+            self._records[record_id] = record
+            for term in self._terms(record):
+                self._postings.setdefault(term, set()).add(record_id)
+            added.append(record)
+        return added
+
+    @staticmethod
+    def _terms(record: Dict[str, Any]) -> List[str]:
+        terms = [f"cuisine:{record['cuisine']}", f"diet:{record['diet']}", f"slot:{record['slot']}",
+                 f"goal:{record['goal']}"]
+        return terms + [f"allergen:{tag}" for tag in record["allergens"]]
+
+    def _save(self, added: List[Dict[str, Any]]) -> None:
+        """Append new records and atomically rewrite the postings file."""
+        try:
+            os.makedirs(self.index_dir, exist_ok=True)
+            with open(os.path.join(self.index_dir, "records.jsonl"), "a", encoding="utf-8") as f:
+                for record in added:
+                    f.write(json.dumps(record) + "\n")
+            index_path = os.path.join(self.index_dir, "index.json")
+            with open(index_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump({"postings": {term: sorted(ids) for term, ids in self._postings.items()},
+                           "sources": self._sources}, f)
+            os.replace(index_path + ".tmp", index_path)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not save recipe index: {str(e)}")
+
+    def match(self, cuisine_style: str, dietary_preference: str, slot: str, allergies: List[str],
+              goal: Optional[str] = None, calories: Union[str, int, None] = None,
+              avoid: Iterable[str] = (), days: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Find an indexed meal for one slot of a request.
+
+        Candidates must share the cuisine and slot, come from a compatible
+        diet and mention none of the allergies. Among them, meals from plans
+        with the same goal and calorie target rank first, and ids in
+        ``avoid`` (meals already used in this plan) are only reused when
+        nothing else fits. Allergies that map to no known allergen tag
+        (see ``unmapped_allergies``) match nothing, since indexed meals could
+        not be checked against them.
+
+        Args:
+            cuisine_style: Requested cuisine
+            dietary_preference: Requested diet
+            slot: Meal slot from ``DAY_SECTIONS``, or ``GUIDANCE_SLOT``
+            allergies: Allergies or foods to avoid
+            goal: Nutritional goal, used for ranking
+            calories: Calorie target, used for ranking
+            avoid: Record ids to prefer not to return
+            days: Only return records from plans of this many days; guidance covers
+                the whole plan (shopping list, quantities), so it needs the same length
+
+        Returns:
+            The best matching record, or None
+        """
+        if unmapped_allergies(allergies):
+            return None
+        with self._lock:
+            self._ensure_loaded()
+            diet = _normalize(dietary_preference)
+            candidates = (self._postings.get(f"cuisine:{_normalize(cuisine_style)}", set())
+                          & self._postings.get(f"slot:{_normalize(slot)}", set()))
+            diet_ids = set().union(*(self._postings.get(f"diet:{d}", set())
+                                     for d in DIET_COMPATIBLE.get(diet, [diet])))
+            candidates &= diet_ids
+            for tag in allergen_tags(allergies):
+                candidates -= self._postings.get(f"allergen:{tag}", set())
+            words = [_normalize(a) for a in allergies if a.strip()]
+            candidates = [self._records[i] for i in candidates
+                          if not any(_mentions(self._records[i]["text"].lower(), w) for w in words)
+                          and (days is None or self._records[i]["days"] == str(days))]
+            if not candidates:
+                return None
+
+            avoid = set(avoid)
+            goal = _normalize(goal) if goal else None
+            target = str(calories).replace(" ", "") if calories is not None else None
+            best = max(candidates, key=lambda r: (r["id"] not in avoid, r["goal"] == goal,
+                                                  r["calorie_target"] == target, r["id"]))
+            return best
+
+    def stats(self) -> Dict[str, Any]:
+        """Return record counts per slot and cuisine."""
+        with self._lock:
+            self._ensure_loaded()
+
+            def count(prefix: str) -> Dict[str, int]:
+                return {term.split(":", 1)[1]: len(ids) for term, ids in self._postings.items()
+                        if term.startswith(prefix) and ids}
+
+            return {
+                "records": len(self._records),
+                "plans": len(self._sources),
+                "slots": count("slot:"),
+                "cuisines": count("cuisine:")
+            }
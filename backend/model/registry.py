@@ -0,0 +1,230 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+from transformers import AutoTokenizer
+
+try:
+    from .weights import model_nbytes
+    from .telemetry import MODEL_EVENTS, MODEL_LOAD_SECONDS, MODEL_MEMORY_BYTES, get_logger
+except ImportError:
+    # Running as a script from inside model/
+    from weights import model_nbytes
+    from telemetry import MODEL_EVENTS, MODEL_LOAD_SECONDS, MODEL_MEMORY_BYTES, get_logger
+
+logger = get_logger("registry")
+
+
+def tokenizer_fingerprint(tokenizer: Any) -> str:
+    """Hash a tokenizer's class, vocabulary and special tokens; equal hashes encode text identically."""
+    digest = hashlib.sha1(type(tokenizer).__name__.encode("utf-8"))
+    digest.update(repr(sorted(tokenizer.get_vocab().items())).encode("utf-8"))
+    digest.update(repr(sorted(tokenizer.special_tokens_map.items())).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    """
+    Meal plan generators for several models, loaded on demand and kept under a memory budget.
+
+    Requests name the model they want (or get the default); the registry
+    builds a generator for each allowed name the first time it is asked for
+    and loads its weights on first use. Callers hold a lease on a generator
+    while they use it. When loading a model would exceed ``memory_budget_mb``,
+    the least recently used models without a lease are unloaded first;
+    generators themselves are kept, so their result caches survive and a
+    reload skips the tokenizer. Models whose tokenizers encode text
+    identically share one tokenizer instance.
+
+    ``generate_meal_plan`` and ``stream_meal_plan`` take a ``model`` argument
+    and otherwise mirror ``MealPlanGenerator``, so the registry can stand in
+    for a generator, e.g. behind a ``JobManager``.
+    """
+
+    def __init__(self, factory: Callable[[str], Any], default_model: str,
+                 models: Optional[Sequence[str]] = None, memory_budget_mb: float = 0):
+        """
+        Args:
+            factory: Builds an unloaded ``MealPlanGenerator`` for a model name
+            default_model: Model used when a request names none
+            models: Other model names requests may choose
+            memory_budget_mb: Memory the loaded models may use together (0 for no limit)
+        """
+        self.factory = factory
+        self.default_model = default_model
+        self.allowed_models = [default_model] + [name for name in models or [] if name != default_model]
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        # Least recently leased first
+        self._generators: "OrderedDict[str, Any]" = OrderedDict()
+        self._leases: Dict[str, int] = {}
+        # Measured size of each model's weights, kept after eviction to plan its reload
+        self._sizes: Dict[str, int] = {}
+        self._loaded: set = set()
+        self._tokenizers: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+        self._loads = 0
+        self._evictions = 0
+        self._shared_tokenizers = 0
+
+    def resolve(self, model: Optional[str] = None) -> str:
+        """
+        Return the model name to use for a request.
+
+        Raises:
+            ValueError: If ``model`` is not one of ``allowed_models``
+        """
+        if model is None:
+            return self.default_model
+        if model not in self.allowed_models:
+            raise ValueError(f"Unknown model '{model}'. Choose from: {', '.join(self.allowed_models)}")
+        return model
+
+    def get(self, model: Optional[str] = None) -> Any:
+        """Return the generator for a model, building it unloaded if needed, without leasing it."""
+        name = self.resolve(model)
+        with self._lock:
+            generator = self._generators.get(name)
+            if generator is None:
+                generator = self.factory(name)
+                self._generators[name] = generator
+                self._leases[name] = 0
+            return generator
+
+    @contextmanager
+    def lease(self, model: Optional[str] = None) -> Iterator[Any]:
+        """
+        Use a model's generator, loading it first if needed; it cannot be evicted until the lease ends.
+
+        Raises:
+            ValueError: If ``model`` is not allowed
+        """
+        name = self.resolve(model)
+        generator = self.get(name)
+        with self._lock:
+            self._leases[name] += 1
+            self._generators.move_to_end(name)
+        try:
+            # Worker processes hold the weights of a pooled generator, not this one
+            if name not in self._loaded and generator.worker_pool is None:
+                self._load(name, generator)
+            yield generator
+        finally:
+            with self._lock:
+                self._leases[name] -= 1
+            # Models loaded while every other model was busy may have left the budget exceeded
+            self._evict(0, keep=None)
+
+    def has_loaded(self, model: Optional[str] = None) -> bool:
+        """Whether a model has loaded successfully at least once, even if it was evicted since."""
+        with self._lock:
+            return self.resolve(model) in self._sizes
+
+    def generate_meal_plan(self, model: Optional[str] = None, **plan_kwargs: Any) -> Dict[str, Any]:
+        """Generate a meal plan with ``model`` (default if None); see ``MealPlanGenerator.generate_meal_plan``."""
+        with self.lease(model) as generator:
+            return generator.generate_meal_plan(**plan_kwargs)
+
+    def stream_meal_plan(self, model: Optional[str] = None, **plan_kwargs: Any) -> Iterator[Dict[str, Any]]:
+        """Stream a meal plan with ``model``, leasing it until the stream ends; see ``MealPlanGenerator.stream_meal_plan``."""
+        with self.lease(model) as generator:
+            yield from generator.stream_meal_plan(**plan_kwargs)
+
+    def start_background_load(self, model: Optional[str] = None) -> threading.Thread:
+        """Load a model in a daemon thread; failures are recorded in its generator's ``load_error``."""
+        def run():
+            try:
+                with self.lease(model):
+                    pass
+            except Exception:
+                pass  # recorded in generator.load_error by load_model
+
+        thread = threading.Thread(target=run, name="model-loader", daemon=True)
+        thread.start()
+        return thread
+
+    def _load(self, name: str, generator: Any) -> None:
+        """Make room for a model, load it with a shared tokenizer and record its size."""
+        # A model evicted before is reloaded at its known size; a new one is measured once loaded
+        self._evict(self._sizes.get(name, 0), keep=name)
+        # The fake backend needs neither a tokenizer nor weights
+        if generator.tokenizer is None and generator.fake is None:
+            generator.tokenizer = self._shared_tokenizer(name, generator.cache_dir)
+
+        start = time.perf_counter()
+        generator.load_model()
+        seconds = time.perf_counter() - start
+
+        with self._lock:
+            if name in self._loaded:
+                # Another lease finished loading it first
+                return
+            size = model_nbytes(generator.model) if generator.fake is None else 0
+            if generator.speculative is not None and generator.speculative.model is not None:
+                size += model_nbytes(generator.speculative.model)
+            self._sizes[name] = size
+            self._loaded.add(name)
+            self._loads += 1
+        MODEL_EVENTS.inc(model=name, event="load")
+        MODEL_LOAD_SECONDS.observe(seconds, model=name)
+        MODEL_MEMORY_BYTES.set(size, model=name)
+        logger.info(f"✅ Registered {name} ({size / 1024 / 1024:.1f} MB, loaded in {seconds:.1f}s)")
+        self._evict(0, keep=name)
+
+    def _shared_tokenizer(self, name: str, cache_dir: Optional[str]) -> Any:
+        """Load a model's tokenizer, returning an equivalent one already in use if there is one."""
+        tokenizer = AutoTokenizer.from_pretrained(name, cache_dir=cache_dir)
+        fingerprint = tokenizer_fingerprint(tokenizer)
+        with self._lock:
+            shared = self._tokenizers.setdefault(fingerprint, tokenizer)
+            if shared is not tokenizer:
+                self._shared_tokenizers += 1
+                logger.info(f"♻️ {name} shares its tokenizer with an already loaded model")
+        return shared
+
+    def _resident_bytes(self) -> int:
+        return sum(self._sizes[name] for name in self._loaded)
+
+    def _evict(self, needed: int, keep: Optional[str]) -> None:
+        """Unload least recently used idle models until ``needed`` more bytes fit in the budget."""
+        if not self.memory_budget:
+            return
+        with self._lock:
+            for name in list(self._generators):
+                if self._resident_bytes() + needed <= self.memory_budget:
+                    return
+                if name == keep or name not in self._loaded or self._leases[name]:
+                    continue
+                self._generators[name].unload_model()
+                self._loaded.discard(name)
+                self._evictions += 1
+                MODEL_EVENTS.inc(model=name, event="evict")
+                MODEL_MEMORY_BYTES.set(0, model=name)
+                logger.info(f"♻️ Evicted {name} to stay within the "
+                            f"{self.memory_budget / 1024 / 1024:.1f} MB model memory budget")
+            if keep is not None and self._resident_bytes() + needed > self.memory_budget:
+                logger.warning(f"⚠️ Models in use need {(self._resident_bytes() + needed) / 1024 / 1024:.1f} MB, "
+                               f"over the {self.memory_budget / 1024 / 1024:.1f} MB budget")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the allowed models, which are loaded or leased, memory use and load/evict counts."""
+        with self._lock:
+            models: List[Dict[str, Any]] = []
+            for name in self.allowed_models:
+                models.append({
+                    "model": name,
+                    "default": name == self.default_model,
+                    "loaded": name in self._loaded,
+                    "leases": self._leases.get(name, 0),
+                    "memory_bytes": self._sizes.get(name)
+                })
+            return {
+                "models": models,
+                "memory_budget_bytes": self.memory_budget or None,
+                "resident_bytes": self._resident_bytes(),
+                "loads": self._loads,
+                "evictions": self._evictions,
+                "shared_tokenizers": self._shared_tokenizers
+            }
@@ -0,0 +1,194 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Union
+
+try:
+    from .telemetry import get_logger
+except ImportError:
+    # Running as a script from inside model/
+    from telemetry import get_logger
+
+logger = get_logger("result_cache")
+
+# Part of every key; bump when the key inputs or entry layout change so older entries are never served
+CACHE_FORMAT_VERSION = 3
+
+
+class ResultCache:
+    """
+    Content-addressed cache of generated meal plan sections.
+
+    Plans are keyed on a hash of the normalized request (goal, diet, cuisine,
+    allergies, calories) plus the model, how it runs (inference backend and
+    precision) and the decoding settings. The number
+    of days is deliberately left out of the key: a day's prompt does not depend
+    on the plan length, so each day is cached on its own and a 7-day request can
+    reuse days 1-5 of an earlier 5-day plan. The guidance section mentions the
+    plan length, so it is cached per day count.
+
+    Entries live in an in-memory LRU and are mirrored as JSON files in
+    ``disk_dir`` so they survive restarts.
+    """
+
+    def __init__(self, max_entries: int = 256, disk_dir: Optional[str] = os.path.join("meal_plans", "cache")):
+        """
+        Initialize the cache tiers.
+
+        Args:
+            max_entries: Number of request profiles kept in memory
+            disk_dir: Directory for the on-disk tier, or None to keep memory only
+        """
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(goal: str, dietary_preference: str, cuisine_style: str, allergies: List[str],
+                 calories: Union[str, int], model_name: str, decoding: Dict[str, Any],
+                 inference_backend: str = "eager", precision: Optional[str] = None) -> str:
+        """
+        Hash the inputs that determine a plan's content.
+
+        Args:
+            goal: Nutritional goal
+            dietary_preference: Dietary preference
+            cuisine_style: Cuisine style
+            allergies: Allergies or restrictions, in any order
+            calories: Calorie target
+            model_name: Name of the model that generates the plan
+            decoding: Decoding profile name and settings, with the effective
+                ``max_new_tokens`` (the profile's limit capped by the request's)
+            inference_backend: Backend that runs the model ("eager", "compile" or "fake")
+            precision: Precision the model runs in, e.g. "fp32" or "int8"
+
+        Returns:
+            Hex digest identifying the request profile
+        """
+        normalized = {
+            "goal": " ".join(goal.lower().split()),
+            "dietary_preference": dietary_preference.strip().lower(),
+            "cuisine_style": cuisine_style.strip().lower(),
+            "allergies": sorted({a.strip().lower() for a in allergies if a.strip()}),
+            "calories": str(calories).replace(" ", ""),
+            "model": model_name,
+            "decoding": decoding,
+            "inference_backend": inference_backend,
+            "precision": precision,
+            "version": CACHE_FORMAT_VERSION
+        }
+        encoded = json.dumps(normalized, sort_keys=True).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
+    def lookup(self, key: str, days: int) -> List[Optional[str]]:
+        """
+        Fetch whatever sections of a plan are cached.
+
+        Args:
+            key: Key from ``make_key``
+            days: Number of days requested
+
+        Returns:
+            ``days + 1`` entries: one per day followed by the guidance section,
+            each the cached text or None if it must be generated
+        """
+        entry = self._load(key)
+        if entry is None:
+            sections = [None] * (days + 1)
+        else:
+            sections = [entry["days"].get(str(day)) for day in range(1, days + 1)]
+            sections.append(entry["guidance"].get(str(days)))
+
+        found = sum(1 for text in sections if text is not None)
+        with self._lock:
+            if found == len(sections):
+                self.hits += 1
+            elif found:
+                self.partial_hits += 1
+            else:
+                self.misses += 1
+        return sections
+
+    def store(self, key: str, days: int, sections: List[str]) -> None:
+        """
+        Record the sections of a generated plan.
+
+        Args:
+            key: Key from ``make_key``
+            days: Number of days in the plan
+            sections: One text per day followed by the guidance section
+        """
+        entry = self._load(key) or {"days": {}, "guidance": {}}
+        for day, text in enumerate(sections[:days], start=1):
+            entry["days"][str(day)] = text
+        entry["guidance"][str(days)] = sections[days]
+
+        with self._lock:
+            self._remember(key, entry)
+        self._write_disk(key, entry)
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit counters and the in-memory entry count."""
+        with self._lock:
+            return {
+                "entries": len(self._memory),
+                "hits": self.hits,
+                "partial_hits": self.partial_hits,
+                "misses": self.misses
+            }
+
+    def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of a cached entry from memory, falling back to disk."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return {"days": dict(entry["days"]), "guidance": dict(entry["guidance"])}
+
+        entry = self._read_disk(key)
+        if entry is not None:
+            with self._lock:
+                self._remember(key, entry)
+            return {"days": dict(entry["days"]), "guidance": dict(entry["guidance"])}
+        return None
+
+    def _remember(self, key: str, entry: Dict[str, Any]) -> None:
+        """Insert into the memory tier; the caller holds the lock."""
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"⚠️ Ignoring unreadable cache entry {key}: {str(e)}")
+            return None
+
+    def _write_disk(self, key: str, entry: Dict[str, Any]) -> None:
+        if not self.disk_dir:
+            return
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            # Write then rename so concurrent readers never see a partial file
+            tmp_path = f"{self._path(key)}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._path(key))
+        except Exception as e:
+            logger.warning(f"⚠️ Could not write cache entry {key}: {str(e)}")
@@ -0,0 +1,328 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    from .stopping import GenerationCancelled, raise_if_cancelled
+except ImportError:
+    # Running as a script from inside model/
+    from stopping import GenerationCancelled, raise_if_cancelled
+
+# Seconds between cancellation checks while a caller waits for its prompts
+CANCEL_POLL_INTERVAL = 0.25
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the scheduler queue is at capacity and cannot accept more prompts."""
+
+
+class RequestTimeoutError(TimeoutError):
+    """Raised when a prompt is not generated before its deadline."""
+
+
+class _PendingPrompt:
+    """A prompt waiting in the scheduler queue, plus the future its caller waits on."""
+
+    __slots__ = ("prompt", "max_tokens", "prefix", "profile", "deadline", "stop_spec", "cancel_event", "future")
+
+    def __init__(self, prompt: str, max_tokens: int, prefix: Optional[str],
+                 profile: Optional[str], deadline: float, stop_spec: Optional[Any] = None,
+                 cancel_event: Optional[threading.Event] = None):
+        self.prompt = prompt
+        self.stop_spec = stop_spec
+        self.cancel_event = cancel_event
+        self.max_tokens = max_tokens
+        self.prefix = prefix
+        self.profile = profile
+        self.deadline = deadline
+        self.future: Future = Future()
+
+
+class InferenceScheduler:
+    """
+    Micro-batching scheduler in front of a ``MealPlanGenerator``.
+
+    Prompts submitted from concurrent requests are queued; a single worker
+    thread takes the first waiting prompt, keeps collecting more for up to
+    ``batch_window_ms``, then runs them through the model as one padded batch
+    and hands each caller its own result. The queue is bounded so overload is
+    reported to callers (``QueueFullError``) instead of piling up, and every
+    prompt carries a deadline after which it is dropped. A prompt whose
+    cancel event is set is dropped from the queue or, if it is already being
+    generated, stops at the next token without holding up the rest of its batch.
+
+    With ``max_concurrent_batches`` above one, several batches are in flight at
+    once, which keeps a ``ModelWorkerPool`` behind the generator busy. The next
+    batch is only collected once a slot frees up, so prompts keep accumulating
+    into larger batches while every worker is busy.
+    """
+
+    def __init__(self, generator: Any, max_batch_size: int = 8, batch_window_ms: float = 20.0,
+                 max_queue_size: int = 64, timeout: float = 600.0, max_concurrent_batches: int = 1):
+        """
+        Start the scheduler's worker thread.
+
+        Args:
+            generator: The ``MealPlanGenerator`` that runs batches
+            max_batch_size: Maximum prompts per model call
+            batch_window_ms: How long to wait for more prompts after the first one
+            max_queue_size: Maximum prompts waiting to be scheduled
+            timeout: Default seconds a caller waits for its prompts
+            max_concurrent_batches: Batches that may run through the generator at once
+        """
+        self.generator = generator
+        self.max_batch_size = max(1, max_batch_size)
+        self.batch_window = batch_window_ms / 1000.0
+        self.timeout = timeout
+        self._queue: "queue.Queue[Optional[_PendingPrompt]]" = queue.Queue(maxsize=max_queue_size)
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._batched_prompts = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._cancelled = 0
+        self.max_concurrent_batches = max(1, max_concurrent_batches)
+        self._slots = threading.BoundedSemaphore(self.max_concurrent_batches)
+        self._executor = (ThreadPoolExecutor(max_workers=self.max_concurrent_batches,
+                                             thread_name_prefix="inference-batch")
+                          if self.max_concurrent_batches > 1 else None)
+        self._worker = threading.Thread(target=self._run, name="inference-scheduler", daemon=True)
+        self._worker.start()
+
+    def submit(self, prompt: str, max_tokens: int = 2048, prefix: Optional[str] = None,
+               profile: Optional[str] = None, deadline: Optional[float] = None,
+               stop_spec: Optional[Any] = None, cancel_event: Optional[threading.Event] = None) -> Future:
+        """
+        Queue a prompt for generation without waiting for it.
+
+        Args:
+            prompt: The prompt to send to the model
+            max_tokens: Maximum number of tokens to generate
+            prefix: Optional leading part of ``prompt`` with a cacheable attention state
+            profile: Name of a decoding profile
+            deadline: ``time.monotonic()`` value after which the prompt is dropped
+            stop_spec: Optional ``SectionSpec`` with early-stopping rules for this prompt
+            cancel_event: Optional event that cancels the prompt once set; its
+                future then fails with ``GenerationCancelled``
+
+        Returns:
+            Future resolving to a ``(text, stats)`` tuple
+
+        Raises:
+            QueueFullError: If the queue is at capacity
+        """
+        if deadline is None:
+            deadline = time.monotonic() + self.timeout
+        # Normalize so default-profile prompts batch with explicitly named ones
+        profile = profile or self.generator.decoding_profile
+        item = _PendingPrompt(prompt, max_tokens, prefix, profile, deadline, stop_spec, cancel_event)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            with self._stats_lock:
+                self._rejected += 1
+            raise QueueFullError(f"Inference queue is full ({self._queue.maxsize} prompts waiting)")
+        return item.future
+
+    def generate_many(self, prompts: List[str], max_tokens: int = 2048, prefix: Optional[str] = None,
+                      profile: Optional[str] = None, timeout: Optional[float] = None,
+                      progress_callback: Optional[Callable[[int], None]] = None,
+                      stop_specs: Optional[List[Any]] = None,
+                      cancel_event: Optional[threading.Event] = None
+                      ) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """
+        Queue several prompts and block until all of them are generated.
+
+        Args:
+            prompts: The prompts to send to the model
+            max_tokens: Maximum number of tokens to generate
+            prefix: Optional leading part shared by all ``prompts``
+            profile: Name of a decoding profile
+            timeout: Seconds to wait for all prompts (defaults to the scheduler timeout)
+            progress_callback: Optional callable receiving the number of prompts
+                finished so far, in prompt order
+            stop_specs: Optional ``SectionSpec`` per prompt
+            cancel_event: Optional event that cancels all the prompts once set
+
+        Returns:
+            Tuple of (texts in prompt order, per-prompt generation stats)
+
+        Raises:
+            QueueFullError: If the queue cannot take all prompts
+            RequestTimeoutError: If the prompts are not done before the deadline
+            GenerationCancelled: If ``cancel_event`` is set before they are done
+        """
+        deadline = time.monotonic() + (timeout if timeout is not None else self.timeout)
+        futures: List[Future] = []
+        try:
+            for i, prompt in enumerate(prompts):
+                stop_spec = stop_specs[i] if stop_specs else None
+                futures.append(self.submit(prompt, max_tokens, prefix, profile, deadline, stop_spec,
+                                           cancel_event))
+
+            results = []
+            for future in futures:
+                try:
+                    results.append(self._wait(future, deadline, cancel_event))
+                except FutureTimeoutError:
+                    with self._stats_lock:
+                        self._timed_out += 1
+                    raise RequestTimeoutError("Timed out waiting for the inference queue")
+                if progress_callback is not None:
+                    progress_callback(len(results))
+        except BaseException:
+            # Don't spend model time on prompts nobody is waiting for
+            for future in futures:
+                future.cancel()
+            raise
+
+        return [text for text, _ in results], [stats for _, stats in results]
+
+    def _wait(self, future: Future, deadline: float, cancel_event: Optional[threading.Event]) -> Any:
+        """Wait for a prompt's result until the deadline, giving up early once ``cancel_event`` is set."""
+        while True:
+            remaining = max(0.0, deadline - time.monotonic())
+            if cancel_event is None or remaining <= CANCEL_POLL_INTERVAL:
+                return future.result(timeout=remaining)
+            try:
+                return future.result(timeout=CANCEL_POLL_INTERVAL)
+            except FutureTimeoutError:
+                raise_if_cancelled(cancel_event)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue depth and batching counters."""
+        with self._stats_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_queue_size": self._queue.maxsize,
+                "max_batch_size": self.max_batch_size,
+                "max_concurrent_batches": self.max_concurrent_batches,
+                "batches": self._batches,
+                "average_batch_size": round(self._batched_prompts / self._batches, 2) if self._batches else 0.0,
+                "rejected": self._rejected,
+                "timed_out": self._timed_out,
+                "cancelled": self._cancelled
+            }
+
+    def shutdown(self) -> None:
+        """Stop the worker thread after the prompts already queued."""
+        self._queue.put(None)
+        self._worker.join()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    def _run(self) -> None:
+        """Worker loop: collect a micro-batch, then run it."""
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            # Wait for a free batch slot before collecting the rest of the batch
+            self._slots.acquire()
+
+            batch = [first]
+            window_end = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch_size:
+                remaining = window_end - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._dispatch(batch)
+                    return
+                batch.append(item)
+
+            self._dispatch(batch)
+
+    def _dispatch(self, batch: List[_PendingPrompt]) -> None:
+        """Run a batch inline or on the batch executor, releasing its slot when done."""
+        if self._executor is None:
+            try:
+                self._run_batch(batch)
+            finally:
+                self._slots.release()
+            return
+
+        def run() -> None:
+            try:
+                self._run_batch(batch)
+            finally:
+                self._slots.release()
+
+        self._executor.submit(run)
+
+    def _run_batch(self, batch: List[_PendingPrompt]) -> None:
+        """Run the live prompts of a micro-batch and resolve their futures."""
+        now = time.monotonic()
+        live = []
+        for item in batch:
+            if not item.future.set_running_or_notify_cancel():
+                continue
+            if item.deadline <= now:
+                item.future.set_exception(RequestTimeoutError("Prompt expired while queued"))
+                continue
+            if item.cancel_event is not None and item.cancel_event.is_set():
+                self._set_cancelled(item)
+                continue
+            live.append(item)
+
+        # Only prompts with the same decoding settings can share a generate() call
+        groups: Dict[Tuple[Optional[str], int], List[_PendingPrompt]] = {}
+        for item in live:
+            groups.setdefault((item.profile, item.max_tokens), []).append(item)
+
+        for (profile, max_tokens), group in groups.items():
+            prefixes = {item.prefix for item in group}
+            prefix = prefixes.pop() if len(prefixes) == 1 else None
+            try:
+                stop_specs = [item.stop_spec for item in group]
+                cancel_events = [item.cancel_event for item in group]
+                texts, stats = self.generator._generate(
+                    [item.prompt for item in group], max_tokens,
+                    batch_size=len(group), prefix=prefix, profile=profile,
+                    stop_specs=stop_specs if any(spec is not None for spec in stop_specs) else None,
+                    cancel_events=cancel_events if any(event is not None for event in cancel_events) else None
+                )
+            except Exception as e:
+                for item in group:
+                    item.future.set_exception(e)
+                continue
+
+            with self._stats_lock:
+                self._batches += 1
+                self._batched_prompts += len(group)
+
+            share = stats["seconds"] / len(group)
+            for row, (item, text) in enumerate(zip(group, texts)):
+                stop_reason = stats["stop_reasons"][row]
+                if stop_reason == "cancelled":
+                    self._set_cancelled(item)
+                    continue
+                item.future.set_result((text, {
+                    "profile": stats["profile"],
+                    "generated_tokens": stats["row_tokens"][row],
+                    "stop_reasons": [stop_reason],
+                    "prompt_tokens": stats["row_prompt_tokens"][row],
+                    "prompt_segments": stats["row_prompt_segments"][row],
+                    "seconds": share,
+                    "tokenize_seconds": stats["tokenize_seconds"] / len(group),
+                    "prefill_seconds": stats["prefill_seconds"] / len(group),
+                    "decode_seconds": stats["decode_seconds"] / len(group),
+                    "tokens_per_sec": stats["tokens_per_sec"],
+                    # Only single-prompt groups run with the draft model, so these are never shared
+                    "draft_calls": stats.get("draft_calls", 0),
+                    "draft_proposed": stats.get("draft_proposed", 0),
+                    "draft_accepted": stats.get("draft_accepted", 0),
+                    "draft_speedup": stats.get("draft_speedup")
+                }))
+
+    def _set_cancelled(self, item: _PendingPrompt) -> None:
+        """Fail a cancelled prompt's future and count it."""
+        with self._stats_lock:
+            self._cancelled += 1
+        item.future.set_exception(GenerationCancelled("Prompt was cancelled"))
@@ -0,0 +1,199 @@
+import threading
+import torch
+from typing import Any, Dict, Optional, Tuple
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+try:
+    from .weights import quantize_dynamic_int8
+    from .telemetry import get_logger
+except ImportError:
+    # Running as a script from inside model/
+    from weights import quantize_dynamic_int8
+    from telemetry import get_logger
+
+logger = get_logger("speculative")
+
+# Forward passes run by the current thread, per model role
+_forward_counts = threading.local()
+
+
+def _count_forward(role: str):
+    """Build a forward hook that counts calls made by the current thread."""
+    def hook(module, args, output):
+        setattr(_forward_counts, role, getattr(_forward_counts, role, 0) + 1)
+    return hook
+
+
+class SpeculativeDecoder:
+    """
+    Assisted generation with a small draft model that proposes tokens for the main model to verify.
+
+    Decoding a 1B model on CPU is bound by memory bandwidth, so checking a
+    run of drafted tokens in one main-model pass can be much cheaper than
+    generating them one by one. It only pays off when the draft agrees with
+    the main model often enough, so the decoder keeps a moving average of
+    decoding tokens/sec with and without the draft, tries both until each has
+    ``min_samples`` calls, then uses whichever is faster. Every
+    ``probe_interval`` calls it runs the other mode once so a change in load
+    or prompts can flip the decision back. Rates leave out prefill: plain
+    calls reuse the cached prompt prefix while assisted calls encode the
+    whole prompt in both models, so whole-call rates would favour plain
+    decoding whatever the draft's acceptance.
+
+    Acceptance is derived from forward-pass counts: every main-model pass
+    verifies one round of drafted tokens and keeps the accepted ones plus
+    one token of its own, and every draft pass proposes one token.
+    """
+
+    def __init__(self, model_name: str, cache_dir: Optional[str] = None, min_samples: int = 2,
+                 probe_interval: int = 20, min_speedup: float = 1.05):
+        """
+        Args:
+            model_name: Name or path of the draft model
+            cache_dir: Optional directory to cache the downloaded model
+            min_samples: Calls measured in each mode before choosing between them
+            probe_interval: Every this many calls, run the mode not currently preferred
+            min_speedup: Smallest measured speedup for which the draft stays on
+        """
+        self.model_name = model_name
+        self.cache_dir = cache_dir
+        self.min_samples = max(1, min_samples)
+        self.probe_interval = max(2, probe_interval)
+        self.min_speedup = min_speedup
+        self.model = None
+        self.tokenizer = None
+        self.shares_tokenizer = True
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._preferred = True
+        self._rates: Dict[str, Optional[float]] = {"assisted": None, "plain": None}
+        self._samples = {"assisted": 0, "plain": 0}
+        self._proposed = 0
+        self._accepted = 0
+
+    def load(self, main_model: Any, device: torch.device, torch_dtype: torch.dtype,
+             quantize: bool = False) -> None:
+        """
+        Load the draft model next to an already loaded main model.
+
+        Args:
+            main_model: The model whose tokens the draft proposes
+            device: Device the main model runs on
+            torch_dtype: Load dtype of the main model
+            quantize: Apply dynamic int8 quantization like the main model
+        """
+        tokenizer = AutoTokenizer.from_pretrained(self.model_name, cache_dir=self.cache_dir)
+        model_kwargs = {"torch_dtype": torch_dtype, "low_cpu_mem_usage": True}
+        if self.cache_dir:
+            model_kwargs["cache_dir"] = self.cache_dir
+        model = AutoModelForCausalLM.from_pretrained(self.model_name, **model_kwargs).to(device)
+        if quantize:
+            model = quantize_dynamic_int8(model)
+        model.eval()
+
+        # A draft with another vocabulary needs both tokenizers to translate its proposals;
+        # transformers tells the two cases apart by vocabulary size
+        self.shares_tokenizer = model.config.vocab_size == main_model.config.vocab_size
+        main_model.register_forward_hook(_count_forward("main"))
+        model.register_forward_hook(_count_forward("draft"))
+        self.tokenizer = tokenizer
+        self.model = model
+        logger.info(f"✅ Draft model {self.model_name} loaded"
+                    + ("" if self.shares_tokenizer else " (different tokenizer)"))
+
+    def choose(self) -> bool:
+        """Return True if the next eligible call should use the draft model."""
+        with self._lock:
+            self._calls += 1
+            if self._samples["assisted"] < self.min_samples:
+                return True
+            if self._samples["plain"] < self.min_samples:
+                return False
+            # Occasionally measure the other mode so its estimate stays current
+            if self._calls % self.probe_interval == 0:
+                return not self._preferred
+            return self._preferred
+
+    def generation_kwargs(self, main_tokenizer: Any) -> Dict[str, Any]:
+        """Extra ``model.generate`` arguments that turn on assisted generation."""
+        kwargs = {"assistant_model": self.model}
+        if not self.shares_tokenizer:
+            kwargs.update(tokenizer=main_tokenizer, assistant_tokenizer=self.tokenizer)
+        return kwargs
+
+    def begin(self) -> None:
+        """Reset this thread's forward-pass counts before a ``generate`` call."""
+        _forward_counts.main = 0
+        _forward_counts.draft = 0
+
+    def finish(self, assisted: bool, generated_tokens: int, decode_seconds: float) -> Tuple[int, int]:
+        """
+        Record one finished ``generate`` call and update the mode decision.
+
+        Args:
+            assisted: Whether the call used the draft model
+            generated_tokens: Tokens generated by the call
+            decode_seconds: Wall time of the call after its first main-model pass
+
+        Returns:
+            Tuple of (tokens proposed by the draft, tokens accepted)
+        """
+        main_passes = getattr(_forward_counts, "main", 0)
+        proposed = accepted = 0
+        if assisted:
+            proposed = getattr(_forward_counts, "draft", 0)
+            accepted = min(proposed, max(0, generated_tokens - main_passes))
+
+        mode = "assisted" if assisted else "plain"
+        # The first main-model pass is the prefill (for assisted calls, with the draft's first
+        # round); its share of the tokens is left out along with its time
+        decode_tokens = generated_tokens * (main_passes - 1) / main_passes if main_passes > 1 else 0
+        rate = decode_tokens / decode_seconds if decode_tokens and decode_seconds > 0 else None
+        with self._lock:
+            previous = self._rates[mode]
+            if rate is not None:
+                self._rates[mode] = rate if previous is None else 0.7 * previous + 0.3 * rate
+            self._samples[mode] += 1
+            self._proposed += proposed
+            self._accepted += accepted
+            speedup = self._speedup()
+            if speedup is not None and min(self._samples.values()) >= self.min_samples:
+                preferred = speedup >= self.min_speedup
+                if preferred != self._preferred:
+                    if preferred:
+                        logger.info(f"✅ Draft model speeds up decoding ({speedup:.2f}x); using it again")
+                    else:
+                        logger.warning(f"⚠️ Draft model is not speeding up decoding ({speedup:.2f}x); "
+                                       f"falling back to plain decoding")
+                self._preferred = preferred
+        return proposed, accepted
+
+    def _speedup(self) -> Optional[float]:
+        """Measured assisted/plain tokens-per-second ratio, if both are known."""
+        if not self._rates["assisted"] or not self._rates["plain"]:
+            return None
+        return self._rates["assisted"] / self._rates["plain"]
+
+    @property
+    def speedup(self) -> Optional[float]:
+        with self._lock:
+            speedup = self._speedup()
+        return round(speedup, 2) if speedup is not None else None
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the draft model, acceptance rate, measured throughput and current decision."""
+        with self._lock:
+            speedup = self._speedup()
+            return {
+                "draft_model": self.model_name,
+                "shares_tokenizer": self.shares_tokenizer,
+                "using_draft": self._preferred,
+                "assisted_calls": self._samples["assisted"],
+                "plain_calls": self._samples["plain"],
+                "proposed_tokens": self._proposed,
+                "accepted_tokens": self._accepted,
+                "acceptance_rate": round(self._accepted / self._proposed, 3) if self._proposed else None,
+                "assisted_tokens_per_sec": round(self._rates["assisted"], 2) if self._rates["assisted"] else None,
+                "plain_tokens_per_sec": round(self._rates["plain"], 2) if self._rates["plain"] else None,
+                "speedup": round(speedup, 2) if speedup is not None else None
+            }
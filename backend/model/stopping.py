@@ -0,0 +1,185 @@
+import re
+import threading
+import torch
+from typing import Dict, List, Optional, Sequence, Tuple
+from transformers import StoppingCriteria
+
+# Meals requested for every day; each is expected once per day section
+DAY_SECTIONS = ("Breakfast", "Mid-Morning Snack", "Lunch", "Evening Snack", "Dinner")
+# Sections requested in the additional guidance prompt
+GUIDANCE_SECTIONS = ("Weekly Shopping List", "Meal Prep Strategy", "Portion Control & Scaling",
+                     "Progress Tracking & Adjustments")
+
+# Token budgets: a fully detailed meal (recipe, portions, macros, ingredients,
+# steps, tips) rarely needs more than this, plus some room for an intro line
+TOKENS_PER_MEAL = 220
+TOKENS_PER_GUIDANCE_SECTION = 200
+SECTION_OVERHEAD_TOKENS = 60
+# Budget of the longest section (a full day), which every context must leave room for
+MAX_SECTION_TOKENS = max(len(DAY_SECTIONS) * TOKENS_PER_MEAL,
+                         len(GUIDANCE_SECTIONS) * TOKENS_PER_GUIDANCE_SECTION) + SECTION_OVERHEAD_TOKENS
+
+# Stop reasons reported per section
+STOP_REASONS = ("eos", "section_boundary", "repeated_section", "token_budget", "max_tokens", "cancelled")
+
+_DAY_HEADER = re.compile(r"^(?:#+\s*|\*\*\s*)(?:detailed meal plan for\s+)?day\s+(\d+)\b", re.IGNORECASE)
+_HEADING = re.compile(r"^\s*(?:#+\s*|\d+\.\s*)?\**\s*([^*:(\n]+)")
+
+
+class GenerationCancelled(RuntimeError):
+    """Raised when the caller of a generation cancelled it, e.g. because its client disconnected."""
+
+
+def raise_if_cancelled(cancel_event: Optional[threading.Event]) -> None:
+    """Raise ``GenerationCancelled`` if ``cancel_event`` is set."""
+    if cancel_event is not None and cancel_event.is_set():
+        raise GenerationCancelled("Meal plan generation was cancelled")
+
+
+def heading_key(line: str) -> Optional[str]:
+    """Return the normalized title of a markdown heading or numbered bold item, or None."""
+    stripped = line.strip()
+    if not (stripped.startswith("#") or re.match(r"^(\d+\.\s*)?\*\*", stripped)):
+        return None
+    match = _HEADING.match(stripped)
+    if not match:
+        return None
+    return " ".join(match.group(1).lower().split())
+
+
+class SectionSpec:
+    """
+    Stopping rules for one generated plan section.
+
+    A section ends early when the model crosses into another section (the
+    header of a different day, or a guidance section inside a day), when one
+    of its expected sub-sections starts a second time, or when it uses up its
+    token budget.
+    """
+
+    def __init__(self, day: Optional[int], section_names: Sequence[str], token_budget: int,
+                 max_repeats: int = 1):
+        """
+        Args:
+            day: Day number for a day section, or None for the guidance section
+            section_names: Sub-section titles the prompt asks for
+            token_budget: Maximum new tokens for this section
+            max_repeats: How many times a sub-section title may appear
+        """
+        self.day = day
+        self.section_names = {name.lower() for name in section_names}
+        self.token_budget = token_budget
+        self.max_repeats = max_repeats
+        # Guidance headings inside a day section mean the model has drifted
+        self._foreign_names = ({name.lower() for name in GUIDANCE_SECTIONS} - self.section_names
+                               if day is not None else set())
+
+    @classmethod
+    def for_day(cls, day: int, max_repeats: int = 1) -> "SectionSpec":
+        budget = len(DAY_SECTIONS) * TOKENS_PER_MEAL + SECTION_OVERHEAD_TOKENS
+        return cls(day, DAY_SECTIONS, budget, max_repeats)
+
+    @classmethod
+    def for_meal(cls, day: int, slot: str, max_repeats: int = 1) -> "SectionSpec":
+        spec = cls(day, [slot], TOKENS_PER_MEAL + SECTION_OVERHEAD_TOKENS, max_repeats)
+        # Another meal's heading means the model has moved past this one
+        spec._foreign_names |= {name.lower() for name in DAY_SECTIONS} - spec.section_names
+        return spec
+
+    @classmethod
+    def for_guidance(cls, max_repeats: int = 1) -> "SectionSpec":
+        budget = len(GUIDANCE_SECTIONS) * TOKENS_PER_GUIDANCE_SECTION + SECTION_OVERHEAD_TOKENS
+        return cls(None, GUIDANCE_SECTIONS, budget, max_repeats)
+
+    def _line_reason(self, line: str, counts: Dict[str, int]) -> Optional[str]:
+        """Check one line, updating sub-section counts; return a stop reason or None."""
+        if self.day is not None:
+            day_header = _DAY_HEADER.match(line.strip())
+            if day_header and int(day_header.group(1)) != self.day:
+                return "section_boundary"
+        key = heading_key(line)
+        if key is None:
+            return None
+        if key in self._foreign_names:
+            return "section_boundary"
+        if key in self.section_names:
+            counts[key] = counts.get(key, 0) + 1
+            if counts[key] > self.max_repeats:
+                return "repeated_section"
+        return None
+
+    def scan(self, text: str) -> Tuple[str, Optional[str]]:
+        """
+        Find where a generated section should have stopped.
+
+        Args:
+            text: Generated text of the section
+
+        Returns:
+            Tuple of (text cut before the offending line, stop reason), or the
+            unchanged text and None if no rule fired
+        """
+        counts: Dict[str, int] = {}
+        offset = 0
+        for line in text.splitlines(keepends=True):
+            reason = self._line_reason(line, counts)
+            if reason is not None:
+                return text[:offset].rstrip(), reason
+            offset += len(line)
+        return text, None
+
+
+class SectionStoppingCriteria(StoppingCriteria):
+    """
+    ``model.generate`` stopping criteria that apply a ``SectionSpec`` to each row.
+
+    Rows stop independently once they exhaust their token budget or, at the
+    end of a line, once their text breaks a section rule. Beam search expands
+    each prompt into a group of consecutive candidate rows that share its spec.
+    """
+
+    def __init__(self, tokenizer, specs: List[Optional[SectionSpec]], prompt_length: int):
+        self.tokenizer = tokenizer
+        self.specs = specs
+        self.prompt_length = prompt_length
+        self._newline_tokens: Dict[int, bool] = {}
+
+    def _ends_line(self, token_id: int) -> bool:
+        ends = self._newline_tokens.get(token_id)
+        if ends is None:
+            ends = "\n" in self.tokenizer.decode([token_id])
+            self._newline_tokens[token_id] = ends
+        return ends
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        generated = input_ids.shape[1] - self.prompt_length
+        done = torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+        rows_per_prompt = max(1, input_ids.shape[0] // len(self.specs))
+        for row in range(input_ids.shape[0]):
+            spec = self.specs[row // rows_per_prompt]
+            if spec is None:
+                continue
+            if generated >= spec.token_budget:
+                done[row] = True
+            elif self._ends_line(int(input_ids[row, -1])):
+                text = self.tokenizer.decode(input_ids[row, self.prompt_length:], skip_special_tokens=True)
+                done[row] = spec.scan(text)[1] is not None
+        return done
+
+
+class CancellationStoppingCriteria(StoppingCriteria):
+    """
+    ``model.generate`` stopping criteria that stop the rows whose caller cancelled.
+
+    Each prompt of the batch has its own event (or None); a set event stops
+    that prompt's rows at the next token while the other rows keep decoding.
+    """
+
+    def __init__(self, events: List[Optional[threading.Event]]):
+        self.events = events
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        rows_per_prompt = max(1, input_ids.shape[0] // len(self.events))
+        cancelled = [event is not None and event.is_set() for event in self.events]
+        return torch.tensor([cancelled[row // rows_per_prompt] for row in range(input_ids.shape[0])],
+                            dtype=torch.bool, device=input_ids.device)
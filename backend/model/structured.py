@@ -0,0 +1,228 @@
+import re
+import numpy as np
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+try:
+    from .stopping import DAY_SECTIONS, heading_key
+except ImportError:
+    # Running as a script from inside model/
+    from stopping import DAY_SECTIONS, heading_key
+
+# Macro order of every ``macros`` list; calories in kcal, the rest in grams
+MACROS = ("calories", "protein", "carbs", "fats", "fiber")
+# A single calorie figure as the target accepts this relative deviation
+TARGET_TOLERANCE = 0.10
+
+_SLOTS = {name.lower(): name for name in DAY_SECTIONS}
+_DAY_HEADER = re.compile(r"^#+\s*day\s+(\d+)\b", re.IGNORECASE)
+_GUIDANCE_HEADER = re.compile(r"^#+\s*additional guidance\b", re.IGNORECASE)
+_MACRO_LINE = re.compile(
+    r"^[\s*\-•]*(calories|energy|protein|carb(?:ohydrate)?s?|fats?|fib(?:er|re))\**\s*[:\-=]?\s*\**\s*"
+    r"(?:~|approx\.?|about|around)?\s*(\d+(?:\.\d+)?)", re.IGNORECASE)
+_MACRO_KEYS = {"calories": 0, "energy": 0, "protein": 1, "carb": 2, "fat": 3, "fib": 4}
+_BULLET = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+(.*)")
+_RECIPE_NAME = re.compile(r"recipe name[^:]*:\**\s*(.*)", re.IGNORECASE)
+# Bold headings of the per-meal checklist, e.g. "4. 🥘 **Ingredients List**"
+_SUBHEADING = re.compile(r"^\s*(?:#+\s*|\d+[.)]\s*)?[^\w*\-•]*\*\*([^*]+)\*\*")
+_CHECKLIST_WORDS = ("recipe", "portion", "measurement", "nutrition", "ingredient", "preparation", "step",
+                    "timing", "tip", "substitution")
+
+
+@dataclass
+class Meal:
+    """One parsed meal: its slot, recipe name, ingredient lines and ``MACROS`` values."""
+    slot: str
+    name: str = ""
+    ingredients: List[str] = field(default_factory=list)
+    macros: List[Optional[float]] = field(default_factory=lambda: [None] * len(MACROS))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"slot": self.slot, "name": self.name, "ingredients": self.ingredients, "macros": self.macros}
+
+
+@dataclass
+class DayPlan:
+    """The meals parsed for one day of a plan."""
+    day: int
+    meals: List[Meal] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"day": self.day, "meals": [meal.to_dict() for meal in self.meals]}
+
+
+def _macro_index(label: str) -> int:
+    label = label.lower()
+    return next(index for key, index in _MACRO_KEYS.items() if label.startswith(key))
+
+
+class PlanParser:
+    """
+    Incremental parser from generated markdown to days, meals, ingredients and macros.
+
+    Text can be fed in arbitrary chunks as it is decoded; only complete lines
+    are parsed, and ``feed`` returns each meal, with its day number, as soon
+    as the next meal (or day) starts. ``## Day N`` headings switch days and ``## Additional
+    Guidance`` ends the meal part; callers that feed day text without its
+    heading call ``start_day`` first.
+    """
+
+    def __init__(self):
+        self.days: List[DayPlan] = []
+        self._buffer = ""
+        self._meal: Optional[Meal] = None
+        self._in_ingredients = False
+        self._expect_name = False
+
+    def start_day(self, day: int) -> List[Tuple[int, Meal]]:
+        """Finish the current meal and collect following meals under ``day``."""
+        finished = self._finish_meal()
+        self.days.append(DayPlan(day))
+        return finished
+
+    def feed(self, text: str) -> List[Tuple[int, Meal]]:
+        """
+        Parse the complete lines in ``text`` plus any earlier partial line.
+
+        Returns:
+            (day, meal) pairs completed by this chunk
+        """
+        self._buffer += text
+        *lines, self._buffer = self._buffer.split("\n")
+        finished: List[Tuple[int, Meal]] = []
+        for line in lines:
+            finished.extend(self._parse_line(line))
+        return finished
+
+    def plan_days(self) -> List[DayPlan]:
+        """Days parsed so far, without the guidance part."""
+        return [day for day in self.days if day.day]
+
+    def close(self) -> List[Tuple[int, Meal]]:
+        """Parse any trailing partial line and finish the last meal."""
+        finished = self._parse_line(self._buffer) if self._buffer else []
+        self._buffer = ""
+        return finished + self._finish_meal()
+
+    def _finish_meal(self) -> List[Tuple[int, Meal]]:
+        meal, self._meal = self._meal, None
+        self._in_ingredients = self._expect_name = False
+        if meal is None or not self.days:
+            return []
+        self.days[-1].meals.append(meal)
+        return [(self.days[-1].day, meal)]
+
+    def _parse_line(self, line: str) -> List[Tuple[int, Meal]]:
+        stripped = line.strip()
+        day_header = _DAY_HEADER.match(stripped)
+        if day_header:
+            return self.start_day(int(day_header.group(1)))
+        if _GUIDANCE_HEADER.match(stripped):
+            finished = self._finish_meal()
+            # Nothing after the guidance heading belongs to a day
+            self.days.append(DayPlan(0))
+            return finished
+
+        key = heading_key(line)
+        if key in _SLOTS:
+            finished = self._finish_meal()
+            if self.days and self.days[-1].day:
+                self._meal = Meal(_SLOTS[key])
+            return finished
+        meal = self._meal
+        if meal is None or not stripped:
+            return []
+
+        name = _RECIPE_NAME.search(stripped)
+        if name:
+            meal.name = meal.name or name.group(1).strip(" *")
+            self._expect_name = not meal.name
+            return []
+        macro = _MACRO_LINE.match(stripped)
+        if macro:
+            index = _macro_index(macro.group(1))
+            if meal.macros[index] is None:
+                meal.macros[index] = float(macro.group(2))
+            return []
+        subheading = _SUBHEADING.match(line)
+        if subheading and any(word in subheading.group(1).lower() for word in _CHECKLIST_WORDS):
+            # Ingredients only run until the next checklist heading
+            title = subheading.group(1).lower()
+            self._in_ingredients = "ingredient" in title
+            self._expect_name = "recipe" in title and not meal.name
+            return []
+
+        bullet = _BULLET.match(line)
+        item = (bullet.group(1) if bullet else stripped).replace("**", "").strip(" *")
+        if self._expect_name and item:
+            # "Masala Oats - a warm, spiced porridge" -> "Masala Oats"
+            meal.name = re.split(r"\s[-–—]\s|:\s", item)[0].strip(" *")
+            self._expect_name = False
+        elif self._in_ingredients and bullet and item:
+            meal.ingredients.append(item)
+        return []
+
+
+def parse_days(day_texts: List[str]) -> List[DayPlan]:
+    """Parse the generated text of each day, in order, into ``DayPlan`` objects."""
+    parser = PlanParser()
+    for day, text in enumerate(day_texts, start=1):
+        parser.start_day(day)
+        parser.feed(text)
+    parser.close()
+    return parser.plan_days()
+
+
+def parse_calorie_target(calories: Union[str, int, None]) -> Optional[Tuple[float, float]]:
+    """
+    Turn a calorie target such as "2500-3000" or 2200 into a (low, high) range.
+
+    A single figure accepts ``TARGET_TOLERANCE`` either side; targets without
+    a number return None.
+    """
+    numbers = [float(n) for n in re.findall(r"\d+(?:\.\d+)?", str(calories or ""))]
+    if not numbers:
+        return None
+    if len(numbers) == 1:
+        return numbers[0] * (1 - TARGET_TOLERANCE), numbers[0] * (1 + TARGET_TOLERANCE)
+    return min(numbers[:2]), max(numbers[:2])
+
+
+def nutrition_totals(days: List[Dict[str, Any]], calories: Union[str, int, None] = None) -> Dict[str, Any]:
+    """
+    Compute daily and plan-wide macro totals and check daily calories against the target.
+
+    All meals go into one (meals x ``MACROS``) array that is summed per day
+    in a single pass; macros a meal does not state count as zero and are
+    reported under ``missing``.
+
+    Args:
+        days: Days in the ``DayPlan.to_dict`` form, e.g. ``structured["days"]``
+        calories: Calorie target of the plan
+
+    Returns:
+        Dictionary with daily and plan totals and the target check
+    """
+    rows = [(index, meal["macros"]) for index, day in enumerate(days) for meal in day["meals"]]
+    values = np.array([[np.nan if v is None else v for v in macros] for _, macros in rows],
+                      dtype=float).reshape(-1, len(MACROS))
+    day_index = np.array([index for index, _ in rows], dtype=int)
+
+    daily = np.zeros((len(days), len(MACROS)))
+    np.add.at(daily, day_index, np.nan_to_num(values))
+    plan = daily.sum(axis=0)
+    target = parse_calorie_target(calories)
+
+    totals = {
+        "macros": list(MACROS),
+        "daily": np.round(daily, 1).tolist(),
+        "plan": np.round(plan, 1).tolist(),
+        "daily_average": np.round(plan / max(1, len(days)), 1).tolist(),
+        "missing": dict(zip(MACROS, np.isnan(values).sum(axis=0).astype(int).tolist())),
+        "target": list(target) if target else None
+    }
+    if target:
+        within = (daily[:, 0] >= target[0]) & (daily[:, 0] <= target[1])
+        totals["days_within_target"] = within.tolist()
+        totals["within_target"] = bool(within.all()) if len(days) else False
+    return totals
@@ -0,0 +1,345 @@
+import os
+import sys
+import json
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    """Render a Prometheus label set such as ``{stage="decode"}``."""
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """Base class for a named metric family with optional labels."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, e.g. tokens generated or errors seen."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(self.label_names, key)} {value}"
+                    for key, value in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    """Value that goes up and down, set directly or read from a callback at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._functions: Dict[Tuple[str, ...], Callable[[], float]] = {}
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def set_function(self, function: Callable[[], float], **labels: Any) -> None:
+        """Read the gauge from ``function`` whenever metrics are rendered."""
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = function
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        for key, function in functions.items():
+            try:
+                values[key] = float(function())
+            except Exception:
+                continue
+        return [f"{self.name}{_format_labels(self.label_names, key)} {value}"
+                for key, value in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets, plus their sum and count."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (+Inf last), sum]
+        self._values: Dict[Tuple[str, ...], List[Any]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0])
+            entry[0][index] += 1
+            entry[1] += value
+
+    def count(self, **labels: Any) -> int:
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+            return sum(entry[0]) if entry else 0
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(list(self.buckets) + [float("inf")], counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(self.label_names, key, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metric families rendered together in Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> Any:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, label_names))
+
+    def gauge(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, label_names))
+
+    def histogram(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def render(self) -> str:
+        """Return every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+METRICS = MetricsRegistry()
+STAGE_SECONDS = METRICS.histogram(
+    "nutrimind_stage_seconds", "Time spent in each generation stage (tokenize, prefill, decode, save)", ["stage"])
+PLAN_SECONDS = METRICS.histogram(
+    "nutrimind_meal_plan_seconds", "End-to-end meal plan generation time", ["mode"])
+HTTP_REQUEST_SECONDS = METRICS.histogram(
+    "nutrimind_http_request_seconds", "HTTP request latency", ["endpoint", "method", "status"])
+PROMPT_TOKENS = METRICS.counter(
+    "nutrimind_prompt_tokens_total", "Prompt tokens fed to the model", ["profile"])
+PROMPT_SEGMENT_TOKENS = METRICS.counter(
+    "nutrimind_prompt_segment_tokens_total", "Prompt tokens by segment kind (chat, structure, guidelines, request)",
+    ["kind"])
+GENERATED_TOKENS = METRICS.counter(
+    "nutrimind_generated_tokens_total", "Tokens generated by the model", ["profile"])
+CACHE_LOOKUPS = METRICS.counter(
+    "nutrimind_cache_lookups_total", "Cache lookups by cache and outcome", ["cache", "outcome"])
+ERRORS = METRICS.counter(
+    "nutrimind_errors_total", "Generation errors by exception type", ["type"])
+DRAFT_TOKENS = METRICS.counter(
+    "nutrimind_draft_tokens_total", "Tokens proposed by the draft model and accepted by the main model", ["outcome"])
+MODEL_EVENTS = METRICS.counter(
+    "nutrimind_model_events_total", "Model registry loads and evictions by model", ["model", "event"])
+MODEL_LOAD_SECONDS = METRICS.histogram(
+    "nutrimind_model_load_seconds", "Time to load a model's weights", ["model"])
+MODEL_MEMORY_BYTES = METRICS.gauge(
+    "nutrimind_model_memory_bytes", "Estimated memory held by each loaded model", ["model"])
+QUEUE_DEPTH = METRICS.gauge(
+    "nutrimind_queue_depth", "Items waiting in a queue", ["queue"])
+
+
+def record_generation(stats: Dict[str, Any]) -> None:
+    """
+    Record the stage latencies and token counts of one ``_generate`` call.
+
+    Args:
+        stats: Generation stats returned by ``MealPlanGenerator._generate``
+    """
+    for stage in ("tokenize", "prefill", "decode"):
+        STAGE_SECONDS.observe(stats.get(f"{stage}_seconds", 0.0), stage=stage)
+    PROMPT_TOKENS.inc(stats.get("prompt_tokens", 0), profile=stats["profile"])
+    for kind, tokens in stats.get("prompt_segments", {}).items():
+        PROMPT_SEGMENT_TOKENS.inc(tokens, kind=kind)
+    GENERATED_TOKENS.inc(stats["generated_tokens"], profile=stats["profile"])
+    if stats.get("draft_proposed"):
+        DRAFT_TOKENS.inc(stats["draft_proposed"], outcome="proposed")
+        DRAFT_TOKENS.inc(stats["draft_accepted"], outcome="accepted")
+
+
+class Trace:
+    """
+    Per-request breakdown of where generation time went.
+
+    Stages are recorded in the order they finish; the same stage name may
+    appear several times (e.g. one decode per model call) and is summed in
+    the report.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float, **attributes: Any) -> None:
+        with self._lock:
+            self.stages.append(dict(stage=stage, seconds=round(seconds, 4), **attributes))
+
+    def add_generation(self, stats: Dict[str, Any]) -> None:
+        """Add the tokenize, prefill and decode time of one ``_generate`` call."""
+        for stage in ("tokenize", "prefill", "decode"):
+            self.add(stage, stats.get(f"{stage}_seconds", 0.0))
+
+    @contextmanager
+    def stage(self, name: str, **attributes: Any) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start, **attributes)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        Summarize the trace.
+
+        Returns:
+            Dictionary with total seconds, seconds per stage, the time not
+            covered by any stage, and the raw stage records
+        """
+        total = time.perf_counter() - self.start
+        with self._lock:
+            stages = list(self.stages)
+        per_stage: Dict[str, float] = {}
+        for record in stages:
+            per_stage[record["stage"]] = per_stage.get(record["stage"], 0.0) + record["seconds"]
+        return {
+            "total_seconds": round(total, 4),
+            "stage_seconds": {stage: round(seconds, 4) for stage, seconds in per_stage.items()},
+            # Stages of concurrent model calls overlap, so this can be negative
+            "unaccounted_seconds": round(total - sum(per_stage.values()), 4),
+            "stages": stages
+        }
+
+
+# Attributes every LogRecord has; anything else was passed through ``extra``
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Format log records as one JSON object per line, including ``extra`` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Return a logger under the ``nutrimind`` namespace."""
+    return logging.getLogger(f"nutrimind.{name}")
+
+
+def configure_logging(level: Optional[str] = None, fmt: Optional[str] = None) -> None:
+    """
+    Configure the ``nutrimind`` loggers.
+
+    Args:
+        level: Log level name, or "off" to silence logging entirely
+            (defaults to ``NUTRIMIND_LOG_LEVEL``, else "info")
+        fmt: "text" for the plain messages or "json" for one JSON object per line
+            (defaults to ``NUTRIMIND_LOG_FORMAT``, else "text")
+    """
+    level = (level or os.environ.get("NUTRIMIND_LOG_LEVEL", "info")).lower()
+    fmt = (fmt or os.environ.get("NUTRIMIND_LOG_FORMAT", "text")).lower()
+
+    root = logging.getLogger("nutrimind")
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.propagate = False
+
+    if level == "off":
+        root.addHandler(logging.NullHandler())
+        root.setLevel(logging.CRITICAL + 1)
+        return
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter("%(message)s"))
+    root.addHandler(handler)
+    root.setLevel(level.upper())
@@ -0,0 +1,228 @@
+import os
+import glob
+import json
+import struct
+import torch
+from typing import Dict, List, Optional, Tuple
+from transformers import AutoConfig, AutoModelForCausalLM
+
+try:
+    from transformers.initialization import no_init_weights
+except ImportError:
+    # transformers < 5
+    from transformers.modeling_utils import no_init_weights
+
+try:
+    from .telemetry import get_logger
+except ImportError:
+    # Running as a script from inside model/
+    from telemetry import get_logger
+
+logger = get_logger("weights")
+
+# safetensors dtype codes -> torch dtypes
+SAFETENSORS_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool
+}
+
+
+# Precision modes accepted by MealPlanGenerator; "auto" picks one per device
+PRECISIONS = ("auto", "fp32", "fp16", "bf16", "int8")
+
+
+def cpu_supports_bf16() -> bool:
+    """Return True if the CPU has native bfloat16 matmul support (AVX512-BF16 / AMX)."""
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except Exception:
+        return False
+
+
+def resolve_precision(precision: str, device: torch.device) -> Tuple[str, torch.dtype]:
+    """
+    Pick the precision mode and load dtype for a device.
+
+    fp16 is only fast on accelerators, so "auto" uses it on CUDA/MPS and
+    falls back to bf16 (when the CPU supports it) or fp32 on CPU. int8 loads
+    fp32 weights that are then dynamically quantized, which is CPU-only.
+
+    Args:
+        precision: One of ``PRECISIONS``
+        device: The device the model will run on
+
+    Returns:
+        Tuple of (resolved precision mode, dtype to load weights in)
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision '{precision}'. Choose from: {', '.join(PRECISIONS)}")
+
+    if precision == "auto":
+        if device.type in ("cuda", "mps"):
+            precision = "fp16"
+        else:
+            precision = "bf16" if cpu_supports_bf16() else "fp32"
+    elif precision == "bf16" and device.type == "cpu" and not cpu_supports_bf16():
+        logger.warning("⚠️ CPU lacks native bf16 support; bf16 matmuls will be emulated and slow")
+    elif precision == "int8" and device.type != "cpu":
+        logger.warning(f"⚠️ Dynamic int8 quantization only runs on CPU; using fp16 on {device.type}")
+        precision = "fp16"
+
+    dtypes = {"fp32": torch.float32, "fp16": torch.float16, "bf16": torch.bfloat16, "int8": torch.float32}
+    return precision, dtypes[precision]
+
+
+def quantize_dynamic_int8(model: torch.nn.Module) -> torch.nn.Module:
+    """
+    Apply PyTorch dynamic int8 quantization to a model's Linear layers.
+
+    Weights are stored as int8 and activations are quantized on the fly, which
+    cuts memory bandwidth per decoded token on CPU.
+
+    Args:
+        model: An fp32 model on CPU
+
+    Returns:
+        The quantized model
+    """
+    try:
+        from torch.ao.quantization import quantize_dynamic
+    except ImportError:
+        from torch.quantization import quantize_dynamic
+    return quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def model_nbytes(model: torch.nn.Module) -> int:
+    """
+    Estimate the memory held by a model's weights and buffers.
+
+    Tensors that share storage (e.g. tied embeddings) are counted once, and
+    the packed weights of quantized layers are included.
+
+    Args:
+        model: A loaded model
+
+    Returns:
+        Size in bytes
+    """
+    seen = set()
+    total = 0
+    for value in model.state_dict(keep_vars=True).values():
+        # Quantized Linear layers store (weight, bias) tuples
+        for tensor in value if isinstance(value, (tuple, list)) else (value,):
+            if not isinstance(tensor, torch.Tensor) or tensor.data_ptr() in seen:
+                continue
+            seen.add(tensor.data_ptr())
+            total += tensor.nelement() * tensor.element_size()
+    return total
+
+
+def resolve_model_dir(model_name: str, cache_dir: Optional[str] = None) -> str:
+    """
+    Return a local directory holding the model's config and safetensors files.
+
+    Args:
+        model_name: Local path or Hugging Face Hub model id
+        cache_dir: Optional Hub cache directory
+
+    Returns:
+        Path to the local model directory
+    """
+    if os.path.isdir(model_name):
+        return model_name
+    from huggingface_hub import snapshot_download
+    return snapshot_download(model_name, cache_dir=cache_dir, allow_patterns=["*.json", "*.safetensors"])
+
+
+def mmap_safetensors(path: str) -> Dict[str, torch.Tensor]:
+    """
+    Map a safetensors file into memory without reading it.
+
+    Tensors are views over a private (copy-on-write) file mapping, so every
+    process that maps the same file shares the kernel's page cache for it.
+
+    Args:
+        path: Path to a ``.safetensors`` file
+
+    Returns:
+        Dictionary of tensor name to memory-mapped tensor
+    """
+    with open(path, "rb") as f:
+        header_size = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_size))
+
+    storage = torch.UntypedStorage.from_file(path, shared=False, nbytes=os.path.getsize(path))
+    data_start = 8 + header_size
+    tensors = {}
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        dtype = SAFETENSORS_DTYPES[info["dtype"]]
+        begin, _ = info["data_offsets"]
+        itemsize = torch.empty(0, dtype=dtype).element_size()
+        offset = data_start + begin
+        if offset % itemsize:
+            raise ValueError(f"Tensor {name} in {path} is not aligned for memory mapping")
+        tensors[name] = torch.empty(0, dtype=dtype).set_(storage, offset // itemsize, info["shape"])
+    return tensors
+
+
+def load_model_mmap(model_name: str, cache_dir: Optional[str] = None,
+                    torch_dtype: torch.dtype = torch.float16) -> torch.nn.Module:
+    """
+    Build a causal LM whose weights are memory-mapped from its safetensors files.
+
+    The module is constructed without initializing weights and the mapped
+    tensors are assigned as its parameters, so loading does not copy the
+    checkpoint into private memory. Tensors stored in a different dtype than
+    ``torch_dtype`` are converted, which copies them.
+
+    Args:
+        model_name: Local path or Hugging Face Hub model id
+        cache_dir: Optional Hub cache directory
+        torch_dtype: Dtype to run the model in
+
+    Returns:
+        The loaded model in eval mode
+
+    Raises:
+        FileNotFoundError: If the model has no safetensors weights
+    """
+    model_dir = resolve_model_dir(model_name, cache_dir)
+    files: List[str] = sorted(glob.glob(os.path.join(model_dir, "*.safetensors")))
+    if not files:
+        raise FileNotFoundError(f"No safetensors weights found for {model_name}")
+
+    config = AutoConfig.from_pretrained(model_dir)
+    with no_init_weights():
+        model = AutoModelForCausalLM.from_config(config, torch_dtype=torch_dtype)
+
+    state_dict = {}
+    converted = 0
+    for path in files:
+        for name, tensor in mmap_safetensors(path).items():
+            if tensor.is_floating_point() and tensor.dtype != torch_dtype:
+                tensor = tensor.to(torch_dtype)
+                converted += 1
+            state_dict[name] = tensor
+    if converted:
+        logger.warning(f"⚠️ {converted} tensors were converted to {torch_dtype} and are not shared via mmap")
+
+    missing, unexpected = model.load_state_dict(state_dict, strict=False, assign=True)
+    # Checkpoints omit tied weights (e.g. lm_head); re-tie them to the loaded tensors
+    model.tie_weights()
+    loaded = {tensor.data_ptr() for tensor in state_dict.values()}
+    current = model.state_dict()
+    missing = [name for name in missing if current[name].data_ptr() not in loaded]
+    if missing or unexpected:
+        logger.warning(f"⚠️ Memory-mapped load: missing {missing}, unexpected {unexpected}")
+
+    return model.eval()
@@ -0,0 +1,270 @@
+import os
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from .telemetry import configure_logging, get_logger
+except ImportError:
+    # Running as a script from inside model/
+    from telemetry import configure_logging, get_logger
+
+logger = get_logger("worker_pool")
+
+
+def split_cores(num_workers: int) -> List[List[int]]:
+    """
+    Split the CPUs this process may run on into contiguous per-worker subsets.
+
+    Args:
+        num_workers: Number of worker processes
+
+    Returns:
+        One list of CPU ids per worker (empty lists if affinity is unsupported)
+    """
+    if not hasattr(os, "sched_getaffinity"):
+        return [[] for _ in range(num_workers)]
+    cores = sorted(os.sched_getaffinity(0))
+    per_worker = max(1, len(cores) // num_workers)
+    subsets = [cores[i * per_worker:(i + 1) * per_worker] for i in range(num_workers)]
+    # Workers beyond the core count share the last subset
+    return [subset or subsets[0] for subset in subsets]
+
+
+def _worker_main(worker_id: int, generator: Any, generator_kwargs: Dict[str, Any], cores: List[int],
+                 num_threads: int, tasks: Any, results: Any) -> None:
+    """
+    Entry point of a model worker process.
+
+    With fork sharing ``generator`` is the parent's already-loaded instance,
+    inherited copy-on-write; with mmap sharing it is None and the worker builds
+    its own generator from ``generator_kwargs`` over memory-mapped weights.
+    """
+    import torch
+
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(num_threads)
+
+    try:
+        if generator is None:
+            # Spawned processes start with logging unconfigured
+            configure_logging()
+            try:
+                from .meal_planner import MealPlanGenerator
+            except ImportError:
+                from meal_planner import MealPlanGenerator
+            generator = MealPlanGenerator(**generator_kwargs)
+        generator.load_model()
+        # This process runs prompts itself; never route them back to a pool or scheduler
+        generator.worker_pool = None
+        generator.scheduler = None
+    except Exception as e:
+        results.put(("failed", None, worker_id, f"{type(e).__name__}: {e}"))
+        return
+
+    results.put(("ready", None, worker_id, None))
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        task_id, kwargs = task
+        results.put(("started", task_id, worker_id, None))
+        try:
+            outcome = generator._generate(**kwargs)
+            results.put(("done", task_id, worker_id, outcome))
+        except Exception as e:
+            results.put(("error", task_id, worker_id, f"{type(e).__name__}: {e}"))
+
+
+class ModelWorkerPool:
+    """
+    Pool of model processes that run ``MealPlanGenerator._generate`` calls in parallel.
+
+    One process uses one PyTorch intra-op pool and holds the GIL while
+    preparing inputs, which caps throughput on many-core machines. The pool
+    runs ``num_workers`` processes, each pinned to its own subset of cores with
+    a matching ``torch.set_num_threads``, and feeds them from a shared task
+    queue so any idle worker picks up the next call.
+
+    Weights are shared in one of two ways:
+
+    - ``"fork"``: the parent loads the model once and forks the workers, which
+      read the parent's weights copy-on-write. Create the pool before the
+      parent starts serving or running inference, since forking a process
+      with live threads is fragile.
+    - ``"mmap"``: workers are spawned fresh and each memory-maps the
+      safetensors checkpoint, so all of them share the kernel page cache.
+    """
+
+    def __init__(self, generator: Any, num_workers: int = 2, threads_per_worker: Optional[int] = None,
+                 sharing: str = "fork"):
+        """
+        Start the worker processes.
+
+        Args:
+            generator: The parent's ``MealPlanGenerator``; its settings configure the workers
+            num_workers: Number of model processes
+            threads_per_worker: PyTorch threads per worker (defaults to its core count)
+            sharing: "fork" or "mmap", see the class docstring
+        """
+        if sharing not in ("fork", "mmap"):
+            raise ValueError(f"Unknown sharing mode '{sharing}'. Choose from: fork, mmap")
+
+        self.num_workers = max(1, num_workers)
+        self.sharing = sharing
+        self._futures: Dict[int, Future] = {}
+        self._in_flight: Dict[int, int] = {}
+        self._ready = set()
+        self._failed: Dict[int, str] = {}
+        self._task_ids = itertools.count()
+        self._lock = threading.Lock()
+        self._closed = False
+
+        generator_kwargs = {
+            "model_name": generator.model_name,
+            "cache_dir": generator.cache_dir,
+            "decoding_profile": generator.decoding_profile,
+            "precision": generator.precision,
+            "section_stopping": generator.section_stopping,
+            "draft_model": generator.draft_model_name,
+            "inference_backend": generator.inference_backend,
+            "fake_backend": generator.fake,
+            "prefix_cache_mb": (generator.prefix_cache.max_bytes // (1024 * 1024)) if generator.prefix_cache else 0,
+            "result_cache_size": 0,
+            "lazy_load": True,
+            "mmap_weights": True
+        }
+        if sharing == "fork":
+            generator.load_model()
+            context = multiprocessing.get_context("fork")
+            inherited = generator
+        else:
+            context = multiprocessing.get_context("spawn")
+            inherited = None
+
+        self._tasks = context.Queue()
+        self._results = context.Queue()
+        self._processes = []
+        for worker_id, cores in enumerate(split_cores(self.num_workers)):
+            num_threads = threads_per_worker or max(1, len(cores) or (os.cpu_count() or 1) // self.num_workers)
+            process = context.Process(
+                target=_worker_main,
+                args=(worker_id, inherited, generator_kwargs, cores, num_threads, self._tasks, self._results),
+                name=f"model-worker-{worker_id}",
+                daemon=True
+            )
+            process.start()
+            self._processes.append(process)
+
+        self._collector = threading.Thread(target=self._collect, name="model-pool-collector", daemon=True)
+        self._collector.start()
+        logger.info(f"✅ Started {self.num_workers} model workers ({sharing} sharing)")
+
+    @property
+    def is_ready(self) -> bool:
+        """Whether every worker has loaded its model."""
+        with self._lock:
+            return len(self._ready) == self.num_workers
+
+    def submit(self, prompts: List[str], max_tokens: int = 2048, temperature: Optional[float] = None,
+               top_p: Optional[float] = None, batch_size: int = 1, prefix: Optional[str] = None,
+               profile: Optional[str] = None, stop_specs: Optional[List[Any]] = None) -> Future:
+        """
+        Queue a ``_generate`` call for the next idle worker.
+
+        Returns:
+            Future resolving to the ``(texts, stats)`` tuple from ``_generate``
+        """
+        future: Future = Future()
+        with self._lock:
+            if len(self._failed) == self.num_workers:
+                raise RuntimeError(f"All model workers failed: {self._failed}")
+            task_id = next(self._task_ids)
+            self._futures[task_id] = future
+        self._tasks.put((task_id, {
+            "prompts": prompts,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "top_p": top_p,
+            "batch_size": batch_size,
+            "prefix": prefix,
+            "profile": profile,
+            "stop_specs": stop_specs
+        }))
+        return future
+
+    def generate(self, prompts: List[str], max_tokens: int = 2048, temperature: Optional[float] = None,
+                 top_p: Optional[float] = None, batch_size: int = 1, prefix: Optional[str] = None,
+                 profile: Optional[str] = None, stop_specs: Optional[List[Any]] = None
+                 ) -> Tuple[List[str], Dict[str, Any]]:
+        """Run a ``_generate`` call on a worker and wait for its result."""
+        return self.submit(prompts, max_tokens, temperature, top_p, batch_size, prefix, profile,
+                           stop_specs).result()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return worker readiness and the number of queued and running calls."""
+        with self._lock:
+            return {
+                "workers": self.num_workers,
+                "sharing": self.sharing,
+                "ready": len(self._ready),
+                "failed": len(self._failed),
+                "busy": len(self._in_flight),
+                "pending": len(self._futures) - len(self._in_flight)
+            }
+
+    def shutdown(self) -> None:
+        """Stop the workers after their current calls."""
+        self._closed = True
+        for _ in self._processes:
+            self._tasks.put(None)
+        for process in self._processes:
+            process.join(timeout=30)
+        self._collector.join()
+
+    def _collect(self) -> None:
+        """Resolve futures from worker messages and fail calls lost to dead workers."""
+        while True:
+            try:
+                kind, task_id, worker_id, payload = self._results.get(timeout=1.0)
+            except Exception:
+                if self._closed:
+                    return
+                self._check_workers()
+                continue
+
+            with self._lock:
+                if kind == "ready":
+                    self._ready.add(worker_id)
+                elif kind == "failed":
+                    self._failed[worker_id] = payload
+                    logger.error(f"❌ Model worker {worker_id} failed to start: {payload}")
+                elif kind == "started":
+                    self._in_flight[worker_id] = task_id
+                else:
+                    self._in_flight.pop(worker_id, None)
+                    future = self._futures.pop(task_id, None)
+                    if future is not None:
+                        if kind == "done":
+                            future.set_result(payload)
+                        else:
+                            future.set_exception(RuntimeError(f"Model worker {worker_id} error: {payload}"))
+
+    def _check_workers(self) -> None:
+        """Fail the in-flight call of any worker process that has died."""
+        for worker_id, process in enumerate(self._processes):
+            if process.is_alive() or process.exitcode is None:
+                continue
+            with self._lock:
+                if worker_id in self._failed:
+                    continue
+                self._failed[worker_id] = f"exited with code {process.exitcode}"
+                self._ready.discard(worker_id)
+                task_id = self._in_flight.pop(worker_id, None)
+                future = self._futures.pop(task_id, None) if task_id is not None else None
+            logger.error(f"❌ Model worker {worker_id} exited with code {process.exitcode}")
+            if future is not None:
+                future.set_exception(RuntimeError(f"Model worker {worker_id} exited while generating"))
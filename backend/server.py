@@ -1,6 +1,22 @@
-from flask import Flask, request, jsonify
+import os
+import json
+import time
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
-from model.meal_planner import MealPlanGenerator
+from model.meal_planner import MealPlanGenerator, DECODING_PROFILES
+from model.recipe_index import RecipeIndex
+from model.persistence import PlanArchive, PlanWriter
+from model.fake_backend import FakeBackend
+from model.scheduler import InferenceScheduler, QueueFullError
+from model.jobs import JobManager
+from model.registry import ModelRegistry
+from model.structured import nutrition_totals
+from model.worker_pool import ModelWorkerPool
+from model.telemetry import (CONTENT_TYPE, ERRORS, HTTP_REQUEST_SECONDS, METRICS, QUEUE_DEPTH,
+                             configure_logging)
+
+# Structured logging; NUTRIMIND_LOG_LEVEL=off silences it, NUTRIMIND_LOG_FORMAT=json emits JSON lines
+configure_logging()
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -8,8 +24,244 @@ app = Flask(__name__)
 # Enable CORS for the Flask app
 CORS(app)
 
-# Initialize MealPlanGenerator instance
-generator = MealPlanGenerator()
+default_model = os.environ.get('NUTRIMIND_MODEL', 'TinyLlama/TinyLlama-1.1B-Chat-v1.0')
+num_workers = int(os.environ.get('NUTRIMIND_WORKERS', 0))
+
+def build_generator(model_name):
+    """
+    Create an unloaded MealPlanGenerator with its own inference scheduler for a registry model.
+    NUTRIMIND_DRAFT_MODEL names a small draft model for assisted (speculative) generation and
+    NUTRIMIND_WORKERS>0 runs model calls in that many pinned worker processes; both apply to
+    the default model only, since a draft and a worker fleet are sized for one model.
+    """
+    is_default = model_name == default_model
+    model_generator = MealPlanGenerator(
+        model_name=model_name,
+        lazy_load=True,
+        mmap_weights=os.environ.get('NUTRIMIND_MMAP_WEIGHTS', '0') == '1',
+        precision=os.environ.get('NUTRIMIND_PRECISION', 'auto'),
+        section_stopping=os.environ.get('NUTRIMIND_SECTION_STOPPING', '1') == '1',
+        draft_model=(os.environ.get('NUTRIMIND_DRAFT_MODEL') or None) if is_default else None,
+        recipe_index_dir=None,
+        # NUTRIMIND_BACKEND=compile decodes through a torch.compile'd graph (see model/compiled.py),
+        # =fake answers from a deterministic stand-in without loading any weights
+        inference_backend=os.environ.get('NUTRIMIND_BACKEND', 'eager'),
+        plan_writer=plan_writer,
+        fake_backend=fake_backend
+    )
+    # Every model reads and extends the same index of saved meals; fake plans stay out of it
+    if model_generator.fake is None:
+        model_generator.recipe_index = recipe_index
+    workers = num_workers if is_default else 0
+    if workers > 0:
+        # With NUTRIMIND_WORKER_SHARING=fork (default) the model is loaded here first and the
+        # workers share it copy-on-write, with =mmap the workers memory-map the weights themselves
+        model_generator.worker_pool = ModelWorkerPool(
+            model_generator,
+            num_workers=workers,
+            threads_per_worker=int(os.environ.get('NUTRIMIND_WORKER_THREADS', 0)) or None,
+            sharing=os.environ.get('NUTRIMIND_WORKER_SHARING', 'fork')
+        )
+
+    # Queue prompts from concurrent requests and run them through the model in micro-batches
+    model_generator.scheduler = InferenceScheduler(
+        model_generator,
+        max_batch_size=int(os.environ.get('NUTRIMIND_MAX_BATCH_SIZE', 8)),
+        batch_window_ms=float(os.environ.get('NUTRIMIND_BATCH_WINDOW_MS', 20)),
+        max_queue_size=int(os.environ.get('NUTRIMIND_MAX_QUEUE_SIZE', 64)),
+        timeout=float(os.environ.get('NUTRIMIND_REQUEST_TIMEOUT', 600)),
+        # Keep every worker process busy with its own batch
+        max_concurrent_batches=max(1, workers)
+    )
+    return model_generator
+
+recipe_index = RecipeIndex()
+
+# Timing of the fake backend, for capacity planning without model weights (benchmarks/loadtest.py)
+fake_backend = FakeBackend(
+    tokens_per_sec=float(os.environ.get('NUTRIMIND_FAKE_TOKENS_PER_SEC', 200)),
+    latency_ms=float(os.environ.get('NUTRIMIND_FAKE_LATENCY_MS', 50)),
+    latency_sigma=float(os.environ.get('NUTRIMIND_FAKE_LATENCY_SIGMA', 0.25)),
+    max_concurrency=int(os.environ.get('NUTRIMIND_FAKE_CONCURRENCY', 1)),
+    error_rate=float(os.environ.get('NUTRIMIND_FAKE_ERROR_RATE', 0))
+)
+
+# Plans are saved by one background writer shared by every model. NUTRIMIND_PLAN_ARCHIVE names
+# a SQLite file plans are also appended to, compressed and indexed by metadata (see /plans);
+# NUTRIMIND_PLAN_FILES=0 then keeps them only there instead of one markdown file each.
+plan_archive_path = os.environ.get('NUTRIMIND_PLAN_ARCHIVE')
+plan_writer = PlanWriter(
+    archive=PlanArchive(plan_archive_path) if plan_archive_path else None,
+    write_files=os.environ.get('NUTRIMIND_PLAN_FILES', '1') == '1'
+)
+
+# Models are loaded on demand by name. NUTRIMIND_MODELS lists the models requests may choose
+# besides NUTRIMIND_MODEL (comma-separated); NUTRIMIND_MODEL_MEMORY_MB caps the memory of the
+# loaded models together, unloading the least recently used idle ones (0 for no limit).
+registry = ModelRegistry(
+    build_generator,
+    default_model,
+    models=[name.strip() for name in os.environ.get('NUTRIMIND_MODELS', '').split(',') if name.strip()],
+    memory_budget_mb=float(os.environ.get('NUTRIMIND_MODEL_MEMORY_MB', 0))
+)
+
+# The default model's generator, built without blocking startup on the model load.
+# NUTRIMIND_LAZY_LOAD=1 defers loading to the first request instead of a background thread.
+generator = registry.get()
+if num_workers == 0 and os.environ.get('NUTRIMIND_LAZY_LOAD', '0') != '1':
+    registry.start_background_load()
+
+# Background workers for submit-now, fetch-later meal plan jobs; the registry runs each
+# job on the model it names
+jobs = JobManager(
+    registry,
+    max_workers=int(os.environ.get('NUTRIMIND_JOB_WORKERS', 2)),
+    result_ttl=float(os.environ.get('NUTRIMIND_JOB_TTL', 3600)),
+    max_pending=int(os.environ.get('NUTRIMIND_MAX_PENDING_JOBS', 100))
+)
+
+# Report queue depths at scrape time
+QUEUE_DEPTH.set_function(lambda: generator.scheduler.stats()['queue_depth'], queue='scheduler')
+QUEUE_DEPTH.set_function(lambda: jobs.stats()['queued'], queue='jobs')
+
+# HTTP status codes for generation errors that are not server faults
+ERROR_STATUS_CODES = {
+    'QueueFullError': 429,
+    'RequestTimeoutError': 504,
+    # Client closed the request before the plan was ready
+    'GenerationCancelled': 499,
+    # The request's free-text fields are over the prompt's token budget
+    'PromptTooLongError': 400
+}
+
+def parse_plan_request(data):
+    """
+    Extract generate_meal_plan arguments from a request payload, applying defaults.
+    Raises ValueError for invalid fields.
+    """
+    decoding_profile = data.get('decoding_profile', generator.decoding_profile)
+    if decoding_profile not in DECODING_PROFILES:
+        raise ValueError(f"Unknown decoding_profile '{decoding_profile}'. Choose from: {', '.join(DECODING_PROFILES)}")
+
+    return {
+        'model': registry.resolve(data.get('model')),
+        'goal': data.get('goal', 'muscle gain'),
+        'days': data.get('days', 3),
+        'dietary_preference': data.get('dietary_preference', 'non-vegetarian'),
+        'cuisine_style': data.get('cuisine_style', 'indian'),
+        'allergies': data.get('allergies', []),
+        'calories': data.get('calories', '2500-3000'),
+        'decoding_profile': decoding_profile
+    }
+
+def parse_output_format(data):
+    """
+    Return True if the request asks for the structured (format=json) plan.
+    Raises ValueError for an unknown format.
+    """
+    output_format = data.get('format', 'markdown')
+    if output_format not in ('markdown', 'json'):
+        raise ValueError("format must be 'markdown' or 'json'")
+    return output_format == 'json'
+
+def format_sse(event):
+    """Serialize a stream_meal_plan event as a server-sent event frame."""
+    payload = {k: v for k, v in event.items() if k != 'event'}
+    return f"event: {event['event']}\ndata: {json.dumps(payload)}\n\n"
+
+def job_status(job):
+    """Build the /jobs/<job_id> response body, adding the status code a failed job's error maps to."""
+    if job['status'] == 'failed':
+        job['error_status'] = ERROR_STATUS_CODES.get(job['error_type'], 500)
+    return job
+
+def plan_response(result, structured):
+    """Build the /generate_meal_plan response body and status code for a generate_meal_plan result."""
+    if result['status'] != 'success':
+        return {
+            'status': 'error',
+            'message': result.get('error', 'Failed to generate meal plan')
+        }, ERROR_STATUS_CODES.get(result.get('error_type'), 500)
+
+    response = {
+        'status': 'success',
+        'file_path': result['file_path'],
+        'metadata': result['metadata'],
+        'cache': result['cache']
+    }
+    if structured:
+        response['plan'] = result['structured']
+    else:
+        response['meal_plan'] = result['meal_plan']
+    if 'trace' in result:
+        response['trace'] = result['trace']
+    if 'index' in result:
+        response['index'] = result['index']
+    return response, 200
+
+def readiness():
+    """Build the /readyz response body and status code."""
+    pool = generator.worker_pool
+    if pool is not None and pool.is_ready:
+        return {
+            'status': 'ready',
+            'model': generator.model_name,
+            'workers': pool.stats()
+        }, 200
+    # A default model the registry unloaded to make room is reloaded on its next request
+    if pool is None and (generator.is_ready or registry.has_loaded()):
+        return {
+            'status': 'ready',
+            'model': generator.model_name,
+            'precision': generator.active_precision
+        }, 200
+    if generator.load_error is not None:
+        return {'status': 'error', 'message': str(generator.load_error)}, 503
+    return {'status': 'loading', 'model': generator.model_name}, 503
+
+def validate_plan(data):
+    """Build the /validate_meal_plan response body and status code for a request payload."""
+    plan = data.get('plan')
+    days = plan.get('days') if isinstance(plan, dict) else plan
+    if not isinstance(days, list):
+        return {'status': 'error', 'message': 'plan must contain a list of days'}, 400
+    try:
+        nutrition = nutrition_totals(days, data.get('calories'))
+    except (KeyError, TypeError, ValueError) as e:
+        return {'status': 'error', 'message': f'Invalid plan: {str(e)}'}, 400
+    return {'status': 'success', 'nutrition': nutrition}, 200
+
+def find_plans(args):
+    """Build the /plans response body and status code from its query parameters."""
+    filters = {key: value for key, value in args.items() if key != 'limit'}
+    if plan_writer.archive is None:
+        if filters:
+            return {'status': 'error', 'message': 'Plan archive is disabled (set NUTRIMIND_PLAN_ARCHIVE)'}, 404
+        return {'plans': [], 'persistence': plan_writer.stats()}, 200
+    try:
+        plans = plan_writer.archive.find(limit=min(int(args.get('limit', 50)), 500), **filters)
+    except ValueError as e:
+        return {'status': 'error', 'message': str(e)}, 400
+    return {'plans': plans, 'persistence': plan_writer.stats()}, 200
+
+def archived_plan(plan_id):
+    """Build the /plans/<plan_id> response body and status code."""
+    plan = plan_writer.archive.get(plan_id) if plan_writer.archive is not None else None
+    if plan is None:
+        return {'status': 'error', 'message': f'Unknown plan {plan_id}'}, 404
+    return plan, 200
+
+def speculative_status():
+    """Build the /speculative response body."""
+    if generator.draft_model_name is None:
+        return {'draft_model': None}
+    if generator.worker_pool is not None:
+        # Each worker measures its own draft; plan metadata carries the per-call numbers
+        return {'draft_model': generator.draft_model_name, 'measured_in': 'workers'}
+    if generator.speculative is None:
+        return {'draft_model': generator.draft_model_name,
+                'status': 'loading' if not generator.is_ready else 'unavailable'}
+    return generator.speculative.stats()
 
 @app.route('/generate_meal_plan', methods=['POST'])
 def generate_meal_plan():
@@ -22,47 +274,172 @@ def generate_meal_plan():
     - cuisine_style: Preferred cuisine style (e.g., "indian")
     - allergies: List of allergies or dietary restrictions (optional)
     - calories: Target calorie range (optional)
+    - decoding_profile: Decoding strategy, one of "quality", "fast", "draft" (optional)
+    - model: Model to generate with, one of NUTRIMIND_MODEL and NUTRIMIND_MODELS (optional)
+    - stream: If true, respond with server-sent events as the plan is generated (optional)
+    - use_cache: Set to false to skip the result cache and generate fresh text (optional)
+    - trace: If true, include a per-stage timing breakdown in the response (optional)
+    - from_index: If true, assemble days from meals of earlier plans and only generate
+      the missing ones (optional)
+    - format: "markdown" (default) returns the plan text; "json" returns only the
+      structured plan (days -> meals -> ingredients and macros) with nutrition totals (optional)
     """
     try:
         # Parse input JSON
         data = request.get_json()
-        goal = data.get('goal', 'muscle gain')
-        days = data.get('days', 3)
-        dietary_preference = data.get('dietary_preference', 'non-vegetarian')
-        cuisine_style = data.get('cuisine_style', 'indian')
-        allergies = data.get('allergies', [])
-        calories = data.get('calories', '2500-3000')
+        try:
+            plan_kwargs = parse_plan_request(data)
+            structured = parse_output_format(data)
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+
+        if data.get('stream', False):
+            events = registry.stream_meal_plan(trace=bool(data.get('trace', False)), structured=structured,
+                                               **plan_kwargs)
+            return Response(
+                stream_with_context(format_sse(event) for event in events),
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+            )
 
         # Generate meal plan
-        result = generator.generate_meal_plan(
-            goal=goal,
-            days=days,
-            dietary_preference=dietary_preference,
-            cuisine_style=cuisine_style,
-            allergies=allergies,
-            calories=calories
-        )
+        result = registry.generate_meal_plan(use_cache=bool(data.get('use_cache', True)),
+                                             trace=bool(data.get('trace', False)),
+                                             from_index=bool(data.get('from_index', False)),
+                                             structured=structured, **plan_kwargs)
 
         # Return result as JSON
-        if result['status'] == 'success':
-            return jsonify({
-                'status': 'success',
-                'meal_plan': result['meal_plan'],
-                'file_path': result['file_path'],
-                'metadata': result['metadata']
-            }), 200
-        else:
-            return jsonify({
-                'status': 'error',
-                'message': result.get('error', 'Failed to generate meal plan')
-            }), 500
+        response, status = plan_response(result, structured)
+        return jsonify(response), status
 
     except Exception as e:
+        ERRORS.inc(type=type(e).__name__)
         return jsonify({
             'status': 'error',
             'message': f'An error occurred: {str(e)}'
         }), 500
 
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """
+    Queue a meal plan for background generation and return its job id immediately.
+    Accepts the same JSON payload as /generate_meal_plan (except stream).
+    """
+    try:
+        data = request.get_json()
+        try:
+            plan_kwargs = parse_plan_request(data)
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+
+        job_id = jobs.submit(use_cache=bool(data.get('use_cache', True)),
+                             from_index=bool(data.get('from_index', False)), **plan_kwargs)
+        return jsonify({
+            'status': 'queued',
+            'job_id': job_id,
+            'status_url': f'/jobs/{job_id}'
+        }), 202
+
+    except QueueFullError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 429
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'An error occurred: {str(e)}'
+        }), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Return a job's status, per-day progress and, once finished, its result."""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': f'Unknown or expired job {job_id}'}), 404
+    return jsonify(job_status(job)), 200
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    """Observe request latency per route; streamed responses are timed until their first byte."""
+    if 'request_start' in g:
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - g.request_start,
+                                     endpoint=request.url_rule.rule if request.url_rule else 'unmatched',
+                                     method=request.method, status=response.status_code)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint."""
+    return Response(METRICS.render(), content_type=CONTENT_TYPE)
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness probe: the process is up and serving HTTP."""
+    return jsonify({'status': 'ok'}), 200
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness probe: 200 once the model is loaded, 503 while loading or after a failed load."""
+    response, status = readiness()
+    return jsonify(response), status
+
+@app.route('/scheduler', methods=['GET'])
+def scheduler_stats():
+    """Report inference queue depth and batching statistics."""
+    return jsonify(generator.scheduler.stats()), 200
+
+@app.route('/workers', methods=['GET'])
+def worker_stats():
+    """Report model worker process readiness and load."""
+    if generator.worker_pool is None:
+        return jsonify({'workers': 0}), 200
+    return jsonify(generator.worker_pool.stats()), 200
+
+@app.route('/validate_meal_plan', methods=['POST'])
+def validate_meal_plan():
+    """
+    Recompute nutrition totals of a structured plan and check them against a calorie target.
+    Expects a JSON payload with ``plan`` (as returned with format=json, or just its ``days``)
+    and ``calories``.
+    """
+    response, status = validate_plan(request.get_json(silent=True) or {})
+    return jsonify(response), status
+
+@app.route('/models', methods=['GET'])
+def model_stats():
+    """Report the models requests may choose, which are loaded, their memory and load/evict counts."""
+    return jsonify(registry.stats()), 200
+
+@app.route('/recipe_index', methods=['GET'])
+def recipe_index_stats():
+    """Report how many meals from saved plans are indexed, per slot and cuisine."""
+    if generator.recipe_index is None:
+        return jsonify({'records': 0}), 200
+    return jsonify(generator.recipe_index.stats()), 200
+
+@app.route('/plans', methods=['GET'])
+def list_plans():
+    """
+    Find archived plans by metadata, newest first, and report plan writer statistics.
+    Query parameters filter on goal, days, dietary_preference, cuisine_style, calories,
+    model or decoding_profile; limit caps the number returned (default 50).
+    """
+    response, status = find_plans(request.args)
+    return jsonify(response), status
+
+@app.route('/plans/<plan_id>', methods=['GET'])
+def get_plan(plan_id):
+    """Return an archived plan's text and metadata."""
+    response, status = archived_plan(plan_id)
+    return jsonify(response), status
+
+@app.route('/speculative', methods=['GET'])
+def speculative_stats():
+    """Report draft model acceptance rate, measured speedup and whether it is in use."""
+    return jsonify(speculative_status()), 200
+
 if __name__ == '__main__':
-    # Run the Flask app
+    # Run the Flask app; asgi.py serves the same API from an asyncio server
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault("NUTRIMIND_LOG_LEVEL", "off")
+
+
+@pytest.fixture(scope="session")
+def tiny_model_dir(tmp_path_factory):
+    """Directory of the tiny offline model from benchmarks/tiny_model.py, built once per session."""
+    from benchmarks.tiny_model import ensure_tiny_model
+    return ensure_tiny_model(str(tmp_path_factory.mktemp("tiny_model")))
+
+
+@pytest.fixture
+def scratch_dir(tmp_path, monkeypatch):
+    """Run a test from an empty directory, so plans and caches written to relative paths stay out of the repo."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,46 @@
+import time
+
+from model.jobs import JobManager
+from model.prompt_compiler import PromptTooLongError
+
+
+class PlanStub:
+    """Generator stand-in that fails plans for over-long goals, the way generate_meal_plan reports it."""
+
+    def generate_meal_plan(self, progress_callback=None, goal="muscle gain", **plan_kwargs):
+        if goal == "raise":
+            raise RuntimeError("worker crashed")
+        if len(goal) > 100:
+            return {"status": "error", "error": "The request needs 900 prompt tokens",
+                    "error_type": PromptTooLongError.__name__}
+        progress_callback(1, 2)
+        progress_callback(2, 2)
+        return {"status": "success", "meal_plan": "## Day 1"}
+
+
+def wait_for(jobs, job_id):
+    deadline = time.monotonic() + 10
+    while jobs.get(job_id)["status"] in ("queued", "running"):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    return jobs.get(job_id)
+
+
+def test_completed_job_keeps_result_and_progress():
+    jobs = JobManager(PlanStub())
+    job = wait_for(jobs, jobs.submit(days=1))
+    jobs.shutdown()
+    assert job["status"] == "completed"
+    assert job["result"]["meal_plan"] == "## Day 1"
+    assert job["progress"]["completed_days"] == 1 and job["error_type"] is None
+
+
+def test_failed_job_keeps_its_error_type():
+    jobs = JobManager(PlanStub())
+    too_long = wait_for(jobs, jobs.submit(goal="muscle gain " * 40))
+    crashed = wait_for(jobs, jobs.submit(goal="raise"))
+    jobs.shutdown()
+    assert too_long["status"] == "failed"
+    assert too_long["error_type"] == "PromptTooLongError"
+    assert too_long["error"].startswith("The request needs")
+    assert (crashed["status"], crashed["error_type"]) == ("failed", "RuntimeError")
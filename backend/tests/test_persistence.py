@@ -0,0 +1,96 @@
+import os
+
+import pytest
+
+from model import persistence
+from model.persistence import PlanArchive, PlanWriter, write_atomic
+from model.recipe_index import parse_plan
+
+METADATA = {"goal": "muscle gain", "days": 1, "dietary_preference": "vegan", "cuisine_style": "indian"}
+
+
+@pytest.fixture
+def fallback_dir(scratch_dir, monkeypatch):
+    fallback = scratch_dir / "fallback"
+    monkeypatch.setattr(persistence, "FALLBACK_DIR", str(fallback))
+    return fallback
+
+
+def test_wait_returns_the_saved_path(scratch_dir, fallback_dir):
+    saved = []
+    writer = PlanWriter(output_dir=str(scratch_dir / "plans"))
+    path = writer.save_plan("## Day 1\n\nOats", METADATA, on_saved=lambda p, text: saved.append(p))
+    assert writer.wait(path, timeout=10) == path
+    assert parse_plan(open(path, encoding="utf-8").read())["metadata"]["cuisine_style"] == "indian"
+    assert saved == [path]
+    # The same plan is named after its content, so saving it again writes the same file
+    assert writer.save_plan("## Day 1\n\nOats", METADATA) == path
+
+
+def test_flush_drains_every_queued_write(scratch_dir, fallback_dir):
+    writer = PlanWriter(output_dir=str(scratch_dir / "plans"), max_batch=4)
+    paths = [writer.save_plan(f"## Day 1\n\nMeal {i}", METADATA) for i in range(20)]
+    writer.save_file(str(scratch_dir / "plans" / "extra.json"), "{}")
+    assert writer.flush(timeout=10)
+    assert all(os.path.exists(path) for path in paths)
+    assert os.path.exists(scratch_dir / "plans" / "extra.json")
+    assert writer.stats()["saved"] == 20 and writer.stats()["pending"] == 0
+
+
+def test_unwritable_directory_falls_back_when_queued(scratch_dir, fallback_dir):
+    (scratch_dir / "blocked").write_text("a file, not a directory")
+    writer = PlanWriter(output_dir=str(scratch_dir / "blocked" / "plans"))
+    path = writer.save_plan("## Day 1\n\nOats", METADATA)
+    assert os.path.dirname(path) == str(fallback_dir)
+    assert writer.wait(path, timeout=10) == path and os.path.exists(path)
+
+
+def test_wait_reports_where_a_failed_write_ended_up(scratch_dir, fallback_dir, monkeypatch):
+    def failing_write(path, text):
+        if not path.startswith(str(fallback_dir)):
+            raise OSError("disk full")
+        write_atomic(path, text)
+
+    monkeypatch.setattr(persistence, "write_atomic", failing_write)
+    writer = PlanWriter(output_dir=str(scratch_dir / "plans"))
+    path = writer.save_plan("## Day 1\n\nOats", METADATA)
+    final = writer.wait(path, timeout=10)
+    assert final == str(fallback_dir / os.path.basename(path))
+    assert os.path.exists(final) and not os.path.exists(path)
+
+
+def test_wait_returns_none_for_plans_that_were_not_saved(scratch_dir, fallback_dir, monkeypatch):
+    def failing_write(path, text):
+        raise OSError("read-only file system")
+
+    monkeypatch.setattr(persistence, "write_atomic", failing_write)
+    writer = PlanWriter(output_dir=str(scratch_dir / "plans"))
+    assert writer.wait(writer.save_plan("## Day 1\n\nOats", METADATA), timeout=10) is None
+    assert writer.stats()["failed"] == 1
+
+
+def test_archive_only_plans(scratch_dir):
+    archive = PlanArchive(str(scratch_dir / "archive.sqlite"))
+    writer = PlanWriter(output_dir=str(scratch_dir / "plans"), archive=archive, write_files=False)
+    key = writer.save_plan("## Day 1\n\nOats", METADATA)
+    assert writer.wait(key, timeout=10) == key
+    pid = key.rsplit("#", 1)[1]
+    assert archive.get(pid)["meal_plan"].endswith("## Day 1\n\nOats")
+    assert [plan["id"] for plan in archive.find(cuisine_style="Indian", days=1)] == [pid]
+    assert not os.path.exists(scratch_dir / "plans")
+    with pytest.raises(ValueError):
+        archive.find(calories_per_meal=500)
+
+
+def test_atomic_write_keeps_the_old_file_on_failure(scratch_dir, monkeypatch):
+    path = str(scratch_dir / "plan.md")
+    write_atomic(path, "old")
+
+    def failing_replace(source, target):
+        raise OSError("interrupted")
+
+    monkeypatch.setattr(os, "replace", failing_replace)
+    with pytest.raises(OSError):
+        write_atomic(path, "new")
+    assert open(path, encoding="utf-8").read() == "old"
+    assert os.listdir(scratch_dir) == ["plan.md"]
@@ -0,0 +1,93 @@
+import pytest
+
+from model.meal_planner import CHAT_HEAD, MealPlanGenerator
+from model.prompt_compiler import PromptCompiler, PromptTooLongError, segment_lines
+from model.scheduler import InferenceScheduler
+
+
+@pytest.fixture(scope="module")
+def generator(tiny_model_dir):
+    generator = MealPlanGenerator(model_name=tiny_model_dir, lazy_load=True, prefix_cache_mb=0,
+                                  result_cache_size=0, recipe_index_dir=None)
+    generator.load_model()
+    return generator
+
+
+def plan_prompts(generator, cuisine, diet, goal="muscle gain", allergies=("nuts", "dairy")):
+    """Every formatted prompt of a 2-day plan: days, guidance and a single meal."""
+    prompts = generator.build_plan_prompts(goal, 2, diet, cuisine, list(allergies), "between 2000-2200 kcal")
+    raw = prompts["day_prompts"] + [prompts["guidance_prompt"],
+                                    generator.build_meal_prompt(prompts["shared_prefix"], 2, "Lunch")]
+    return [generator.format_prompt(prompt) for prompt in raw]
+
+
+def all_prompts(generator):
+    cuisines = [(cuisine, diet) for cuisine, diets in generator.cuisine_guidelines.items() for diet in diets]
+    # An unknown cuisine falls back to the default guidelines
+    for cuisine, diet in cuisines + [("nordic", "pescatarian")]:
+        yield from plan_prompts(generator, cuisine, diet)
+
+
+def test_compiled_ids_equal_whole_prompt_ids(generator):
+    compiler = generator.prompt_compiler
+    assert compiler.exact
+    for prompt in all_prompts(generator):
+        assert compiler.compile(prompt).input_ids == generator.tokenizer(prompt)["input_ids"]
+    assert compiler.exact
+
+
+def test_usage_counts_every_token(generator):
+    for prompt in plan_prompts(generator, "indian", "vegetarian"):
+        compiled = generator.prompt_compiler.compile(prompt)
+        assert sum(compiled.usage.values()) == len(compiled.input_ids)
+        assert compiled.usage["structure"] > 0 and compiled.usage["guidelines"] > 0
+
+
+def test_over_budget_request_is_rejected_not_cut(generator):
+    prompt = plan_prompts(generator, "indian", "vegetarian", goal="muscle gain " * 400)[0]
+    with pytest.raises(PromptTooLongError):
+        generator.prompt_compiler.compile(prompt)
+
+
+def test_over_budget_request_fails_the_plan_with_its_error_type(generator, scratch_dir):
+    result = generator.generate_meal_plan(goal="muscle gain " * 400, days=1, decoding_profile="draft",
+                                          use_cache=False)
+    assert result["status"] == "error"
+    assert result["error_type"] == "PromptTooLongError"
+
+
+def test_whole_prompt_fallback_keeps_budgets_and_never_cuts(generator):
+    compiler = generator._build_prompt_compiler(generator.tokenizer)
+    # As for a tokenizer whose assembled ids differ from whole-prompt ids
+    compiler.exact = False
+    for prompt in plan_prompts(generator, "asian", "vegan"):
+        compiled = compiler.compile(prompt)
+        assert compiled.input_ids == generator.tokenizer(prompt)["input_ids"]
+        assert sum(compiled.usage.values()) == len(compiled.input_ids)
+    with pytest.raises(PromptTooLongError):
+        compiler.compile(plan_prompts(generator, "asian", "vegan", allergies=["peanuts"] * 600)[0])
+
+
+def test_long_guideline_is_shortened_by_lines(generator):
+    compiler = PromptCompiler(generator.tokenizer, CHAT_HEAD, budgets={"chat": 64, "structure": 640,
+                                                                       "guidelines": 24, "request": 512})
+    guideline = "\n" + "".join(f"    - Guideline line number {i} about seasonal vegetables\n" for i in range(20))
+    registered = compiler.register("guidelines", guideline)
+    assert segment_lines(guideline).startswith(registered)
+    assert len(generator.tokenizer(registered, add_special_tokens=False)["input_ids"]) <= 24
+
+
+def test_scheduled_plans_report_prompt_usage(generator, scratch_dir):
+    # The server sends every request through the scheduler
+    generator.scheduler = InferenceScheduler(generator, max_batch_size=4, batch_window_ms=5)
+    try:
+        result = generator.generate_meal_plan(days=2, decoding_profile="draft", max_tokens=16, use_cache=False)
+    finally:
+        generator.scheduler.shutdown()
+        generator.scheduler = None
+    assert result["status"] == "success"
+    metadata = result["metadata"]
+    segments = metadata["prompt_segments"]
+    assert metadata["prompt_tokens"] > 0
+    assert segments["structure"] > 0 and segments["guidelines"] > 0 and segments["request"] > 0
+    assert sum(segments.values()) == metadata["prompt_tokens"]
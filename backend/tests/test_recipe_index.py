@@ -0,0 +1,118 @@
+import pytest
+
+from model.persistence import render_plan
+from model.recipe_index import GUIDANCE_SLOT, RecipeIndex, allergen_tags, unmapped_allergies
+from model.stopping import DAY_SECTIONS
+
+
+def meal(slot, dish, calories=450):
+    return (f"### {slot}\n\n**Recipe Name:** {dish}\n\nA filling {dish.lower()} with seasonal vegetables "
+            f"and spices, portioned for the day's target.\n\n- Calories: {calories} kcal")
+
+
+def guidance(days):
+    return (f"### Weekly Shopping List\n\n- Rice, lentils, onions, tomatoes and spinach for {days} days of "
+            "meals\n\n### Meal Prep Strategy\n\n- Cook the lentils in one batch")
+
+
+def write_plan(directory, name, dishes, days=1, diet="vegetarian", cuisine="indian"):
+    """Save a plan whose days list ``dishes`` (one per slot) and add the guidance section."""
+    body = ""
+    for day in range(1, days + 1):
+        body += f"## Day {day}\n\n" + "\n\n".join(meal(slot, dish) for slot, dish in zip(DAY_SECTIONS, dishes))
+        body += "\n\n---\n\n"
+    body += "## Additional Guidance\n\n" + guidance(days)
+    metadata = {"goal": "muscle gain", "days": days, "dietary_preference": diet, "cuisine_style": cuisine,
+                "calories": "2500-3000"}
+    path = directory / name
+    path.write_text(render_plan(body, metadata), encoding="utf-8")
+    return str(path)
+
+
+@pytest.fixture
+def index(scratch_dir):
+    plans = scratch_dir / "plans"
+    plans.mkdir()
+    write_plan(plans, "paneer.md", ["Paneer Bhurji", "Cashew Chikki", "Dal Rice", "Roasted Chana", "Veg Pulao"])
+    return RecipeIndex(index_dir=str(scratch_dir / "index"), plans_dir=str(plans))
+
+
+@pytest.mark.parametrize("allergy, tags", [
+    ("lactose", {"dairy"}),
+    ("Dairy products", {"dairy"}),
+    ("tree nuts", {"nuts"}),
+    ("shellfish allergy", {"shellfish"}),
+    ("Peanuts", {"peanuts"}),
+    ("seafood", {"fish", "shellfish"}),
+    ("milk and eggs", {"dairy", "eggs"}),
+])
+def test_allergy_synonyms_map_to_tags(allergy, tags):
+    assert allergen_tags([allergy]) == tags
+    assert unmapped_allergies([allergy]) == []
+
+
+def test_allergies_without_a_tag_are_reported():
+    assert unmapped_allergies(["chicken", "wheat and corn", "nuts", ""]) == ["chicken", "wheat and corn"]
+
+
+def test_allergen_meals_are_excluded(index):
+    assert index.match("indian", "vegetarian", "Breakfast", [])["name"] == "Paneer Bhurji"
+    for allergy in ("dairy", "lactose", "Dairy products"):
+        assert index.match("indian", "vegetarian", "Breakfast", [allergy]) is None
+    assert index.match("indian", "vegetarian", "Mid-Morning Snack", ["tree nuts"]) is None
+    assert index.match("indian", "vegetarian", "Lunch", ["tree nuts"])["name"] == "Dal Rice"
+
+
+def test_unmapped_allergy_matches_nothing(index):
+    # Indexed meals cannot be checked against an allergen they are not tagged with
+    assert index.match("indian", "vegetarian", "Lunch", ["mustard"]) is None
+
+
+def test_diet_and_cuisine_filter(index):
+    assert index.match("indian", "vegan", "Lunch", []) is None
+    assert index.match("mediterranean", "vegetarian", "Lunch", []) is None
+    assert index.match("indian", "non-vegetarian", "Lunch", [])["name"] == "Dal Rice"
+
+
+def test_guidance_only_matches_plans_of_the_same_length(index):
+    assert index.match("indian", "vegetarian", GUIDANCE_SLOT, [], days=1) is not None
+    assert index.match("indian", "vegetarian", GUIDANCE_SLOT, [], days=7) is None
+
+
+def test_index_survives_reload_and_picks_up_new_plans(index, scratch_dir):
+    assert len(index) == len(DAY_SECTIONS) + 1
+    write_plan(scratch_dir / "plans", "week.md", ["Poha", "Fruit Chaat", "Rajma Rice", "Sprouts", "Khichdi"],
+               days=7)
+    reloaded = RecipeIndex(index_dir=index.index_dir, plans_dir=index.plans_dir)
+    guidance = reloaded.match("indian", "vegetarian", GUIDANCE_SLOT, [], days=7)
+    assert guidance is not None and guidance["days"] == "7"
+    assert reloaded.match("indian", "vegetarian", "Breakfast", [], avoid={index.match(
+        "indian", "vegetarian", "Breakfast", [])["id"]})["name"] == "Poha"
+
+
+@pytest.fixture
+def fake_generator(index):
+    from model.fake_backend import FakeBackend
+    from model.meal_planner import MealPlanGenerator
+    generator = MealPlanGenerator(inference_backend="fake", result_cache_size=0,
+                                  fake_backend=FakeBackend(tokens_per_sec=1e6, latency_ms=0, latency_sigma=0))
+    generator.recipe_index = index
+    return generator
+
+
+def test_plans_only_reuse_guidance_of_the_same_length(fake_generator, scratch_dir):
+    plan_kwargs = dict(goal="muscle gain", dietary_preference="vegetarian", cuisine_style="indian",
+                       use_cache=False, from_index=True, output_file=str(scratch_dir / "plan.md"))
+    assert fake_generator.generate_meal_plan(days=1, **plan_kwargs)["index"]["guidance"] == "indexed"
+    result = fake_generator.generate_meal_plan(days=3, **plan_kwargs)
+    assert result["index"]["guidance"] == "generated"
+    assert result["index"]["indexed_meals"] == 3 * len(DAY_SECTIONS)
+
+
+def test_plans_skip_the_index_for_allergies_without_a_tag(fake_generator, scratch_dir):
+    result = fake_generator.generate_meal_plan(days=1, dietary_preference="vegetarian", cuisine_style="indian",
+                                               allergies=["mustard"], use_cache=False, from_index=True,
+                                               output_file=str(scratch_dir / "plan.md"))
+    assert result["status"] == "success"
+    assert "index" not in result
+    assert "Paneer Bhurji" not in result["meal_plan"]
@@ -0,0 +1,74 @@
+import pytest
+
+from model.fake_backend import FakeBackend
+from model.meal_planner import DECODING_PROFILES, MealPlanGenerator
+from model.result_cache import ResultCache
+
+REQUEST = ("muscle gain", "vegetarian", "indian", ["Nuts", "dairy"], "2500-3000", "tiny")
+DECODING = {"profile": "fast", **DECODING_PROFILES["fast"], "section_stopping": True}
+
+
+def sections(days, tag="a"):
+    return [f"{tag} day {day}" for day in range(1, days + 1)] + [f"{tag} guidance for {days} days"]
+
+
+def test_lookup_counts_hits_misses_and_partial_hits(scratch_dir):
+    cache = ResultCache(disk_dir=None)
+    key = ResultCache.make_key(*REQUEST, DECODING)
+    assert cache.lookup(key, 2) == [None, None, None]
+    cache.store(key, 2, sections(2))
+    assert cache.lookup(key, 2) == sections(2)
+    assert cache.lookup(key, 3) == ["a day 1", "a day 2", None, None]
+    assert cache.stats() == {"entries": 1, "hits": 1, "partial_hits": 1, "misses": 1}
+
+
+def test_days_are_reused_across_plan_lengths_but_guidance_is_not(scratch_dir):
+    cache = ResultCache(disk_dir=None)
+    key = ResultCache.make_key(*REQUEST, DECODING)
+    cache.store(key, 5, sections(5))
+    cache.store(key, 2, sections(2, tag="b"))
+    looked_up = cache.lookup(key, 7)
+    # The 2-day plan replaced days 1-2; days 3-5 still come from the 5-day plan
+    assert looked_up[:5] == ["b day 1", "b day 2", "a day 3", "a day 4", "a day 5"]
+    assert looked_up[5:] == [None, None, None]
+    assert cache.lookup(key, 5)[-1] == "a guidance for 5 days"
+
+
+def test_disk_tier_survives_restarts(scratch_dir):
+    key = ResultCache.make_key(*REQUEST, DECODING)
+    ResultCache(disk_dir=str(scratch_dir / "cache")).store(key, 1, sections(1))
+    assert ResultCache(disk_dir=str(scratch_dir / "cache")).lookup(key, 1) == sections(1)
+    assert ResultCache(disk_dir=str(scratch_dir / "cache"), max_entries=0).lookup(key, 1) == sections(1)
+
+
+def test_key_ignores_formatting_of_the_request():
+    key = ResultCache.make_key(*REQUEST, DECODING)
+    assert key == ResultCache.make_key("Muscle  Gain", " Vegetarian", "INDIAN", ["dairy", " nuts", ""],
+                                       "2500 - 3000", "tiny", dict(DECODING))
+
+
+@pytest.mark.parametrize("change", [
+    {"model_name": "other"},
+    {"allergies": ["nuts"]},
+    {"decoding": {**DECODING, "max_new_tokens": 16}},
+    {"decoding": {**DECODING, "section_stopping": False}},
+    {"inference_backend": "compile"},
+    {"precision": "int8"},
+])
+def test_key_changes_with_everything_that_shapes_the_text(change):
+    arguments = dict(zip(("goal", "dietary_preference", "cuisine_style", "allergies", "calories", "model_name"),
+                         REQUEST), decoding=DECODING, inference_backend="eager", precision="fp32")
+    assert ResultCache.make_key(**arguments) != ResultCache.make_key(**{**arguments, **change})
+
+
+def test_plans_capped_by_max_tokens_are_cached_apart(scratch_dir):
+    generator = MealPlanGenerator(inference_backend="fake", recipe_index_dir=None,
+                                  fake_backend=FakeBackend(tokens_per_sec=1e6, latency_ms=0, latency_sigma=0))
+    plan_kwargs = dict(days=1, decoding_profile="fast", output_file=str(scratch_dir / "plan.md"))
+    capped = generator.generate_meal_plan(max_tokens=8, **plan_kwargs)
+    assert capped["cache"]["status"] == "miss"
+    full = generator.generate_meal_plan(**plan_kwargs)
+    assert full["cache"]["status"] == "miss"
+    assert len(full["meal_plan"]) > len(capped["meal_plan"])
+    assert generator.generate_meal_plan(**plan_kwargs)["cache"]["status"] == "hit"
+    assert generator.generate_meal_plan(max_tokens=8, **plan_kwargs)["meal_plan"] == capped["meal_plan"]
@@ -0,0 +1,100 @@
+import time
+import threading
+
+import pytest
+
+from model.fake_backend import FakeBackend
+from model.meal_planner import MealPlanGenerator
+from model.scheduler import InferenceScheduler, QueueFullError, RequestTimeoutError
+from model.stopping import GenerationCancelled
+
+
+def fake_generator(latency_ms=0.0):
+    return MealPlanGenerator(inference_backend="fake", recipe_index_dir=None, result_cache_size=0,
+                             decoding_profile="fast",
+                             fake_backend=FakeBackend(tokens_per_sec=1e6, latency_ms=latency_ms, latency_sigma=0))
+
+
+@pytest.fixture
+def day_prompts():
+    prompts = fake_generator().build_plan_prompts("muscle gain", 4, "vegan", "indian", [], "between 2000-2200 kcal")
+    return prompts["day_prompts"]
+
+
+@pytest.fixture
+def scheduler_factory():
+    schedulers = []
+
+    def make(generator, **kwargs):
+        scheduler = InferenceScheduler(generator, **kwargs)
+        schedulers.append(scheduler)
+        return scheduler
+
+    yield make
+    for scheduler in schedulers:
+        scheduler.shutdown()
+
+
+def test_concurrent_prompts_share_one_batch(day_prompts, scheduler_factory):
+    scheduler = scheduler_factory(fake_generator(), max_batch_size=8, batch_window_ms=200)
+    texts, stats = scheduler.generate_many(day_prompts, max_tokens=64)
+    assert len(texts) == 4 and all(texts)
+    assert all(row["generated_tokens"] > 0 and row["prompt_tokens"] > 0 for row in stats)
+    assert scheduler.stats()["batches"] == 1
+    assert scheduler.stats()["average_batch_size"] == 4.0
+
+
+def test_batches_are_capped_and_split_by_decoding_settings(day_prompts, scheduler_factory):
+    scheduler = scheduler_factory(fake_generator(), max_batch_size=3, batch_window_ms=200)
+    futures = [scheduler.submit(prompt, max_tokens=64) for prompt in day_prompts]
+    futures.append(scheduler.submit(day_prompts[0], max_tokens=32))
+    for future in futures:
+        future.result(timeout=10)
+    # [3 prompts] then [1 prompt at 64 tokens + 1 at 32 tokens], which cannot share a call
+    assert scheduler.stats()["batches"] == 3
+
+
+def test_full_queue_rejects_prompts(day_prompts, scheduler_factory):
+    scheduler = scheduler_factory(fake_generator(latency_ms=500), max_batch_size=1, batch_window_ms=0,
+                                  max_queue_size=1)
+    running = scheduler.submit(day_prompts[0])
+    # Let the worker take the first prompt so the next one fills the queue
+    time.sleep(0.1)
+    queued = scheduler.submit(day_prompts[1])
+    with pytest.raises(QueueFullError):
+        scheduler.submit(day_prompts[2])
+    running.result(timeout=10)
+    queued.result(timeout=10)
+    assert scheduler.stats()["rejected"] == 1
+
+
+def test_cancelled_prompts_are_dropped(day_prompts, scheduler_factory):
+    scheduler = scheduler_factory(fake_generator(latency_ms=300), max_batch_size=1, batch_window_ms=0)
+    cancel_event = threading.Event()
+    running = scheduler.submit(day_prompts[0])
+    time.sleep(0.05)
+    cancelled = scheduler.submit(day_prompts[1], cancel_event=cancel_event)
+    cancel_event.set()
+    running.result(timeout=10)
+    with pytest.raises(GenerationCancelled):
+        cancelled.result(timeout=10)
+    assert scheduler.stats()["cancelled"] == 1
+
+
+def test_waiting_callers_stop_once_cancelled(day_prompts, scheduler_factory):
+    scheduler = scheduler_factory(fake_generator(latency_ms=2000), max_batch_size=1, batch_window_ms=0)
+    cancel_event = threading.Event()
+    threading.Timer(0.1, cancel_event.set).start()
+    start = time.monotonic()
+    with pytest.raises(GenerationCancelled):
+        scheduler.generate_many(day_prompts[:2], cancel_event=cancel_event)
+    assert time.monotonic() - start < 1.5
+
+
+def test_expired_prompts_time_out(day_prompts, scheduler_factory):
+    scheduler = scheduler_factory(fake_generator(latency_ms=300), max_batch_size=1, batch_window_ms=0)
+    running = scheduler.submit(day_prompts[0])
+    time.sleep(0.05)
+    with pytest.raises(RequestTimeoutError):
+        scheduler.generate_many(day_prompts[1:2], timeout=0.1)
+    running.result(timeout=10)
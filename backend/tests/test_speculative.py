@@ -0,0 +1,48 @@
+import pytest
+
+from model import speculative
+from model.meal_planner import MealPlanGenerator
+from model.speculative import SpeculativeDecoder
+
+
+def record(decoder, assisted, tokens, main_passes, decode_seconds, draft_passes=0):
+    speculative._forward_counts.main = main_passes
+    speculative._forward_counts.draft = draft_passes
+    return decoder.finish(assisted, tokens, decode_seconds)
+
+
+def test_rates_leave_out_the_prefill_pass():
+    decoder = SpeculativeDecoder("draft", min_samples=1)
+    # Plain decoding: one token per main pass, the first of them the prefill
+    record(decoder, False, 101, 101, 1.0)
+    # Assisted: 20 main passes over 100 tokens, so the prefill pass accounts for 5 of them
+    assert record(decoder, True, 100, 20, 1.0, draft_passes=120) == (120, 80)
+    stats = decoder.stats()
+    assert stats["plain_tokens_per_sec"] == 100.0
+    assert stats["assisted_tokens_per_sec"] == 95.0
+    assert stats["speedup"] == 0.95 and not stats["using_draft"]
+
+
+def test_calls_without_decoding_steps_leave_rates_alone():
+    decoder = SpeculativeDecoder("draft", min_samples=1)
+    record(decoder, True, 1, 1, 0.5)
+    stats = decoder.stats()
+    assert stats["assisted_calls"] == 1 and stats["assisted_tokens_per_sec"] is None
+
+
+@pytest.fixture(scope="module")
+def generator(tiny_model_dir):
+    # The tiny model drafts for itself, which is enough to run both modes
+    generator = MealPlanGenerator(model_name=tiny_model_dir, draft_model=tiny_model_dir, lazy_load=True,
+                                  result_cache_size=0, recipe_index_dir=None, decoding_profile="draft")
+    generator.load_model()
+    return generator
+
+
+def test_both_modes_are_measured(generator):
+    prompts = generator.build_plan_prompts("muscle gain", 1, "vegan", "indian", [], "between 2000-2200 kcal")
+    for _ in range(3):
+        generator._generate([prompts["day_prompts"][0]], 32, batch_size=1, prefix=prompts["shared_prefix"])
+    stats = generator.speculative.stats()
+    assert stats["assisted_calls"] >= 1 and stats["plain_calls"] >= 1
+    assert stats["assisted_tokens_per_sec"] and stats["plain_tokens_per_sec"]